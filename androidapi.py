@@ -1,44 +1,209 @@
+from __future__ import annotations
+
 import requests
 import datetime
+import functools
 import logging
 import asyncio
+import os
 import time
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CallbackQueryHandler, ContextTypes
-from apscheduler.schedulers.background import BackgroundScheduler
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.logging import RichHandler
-from config import Config
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+from config import Config, ENV_FILE, current_config, reload_config, update_config
 from auth import get_hife_token
+from lazy import service_console
+from logqueue import QueuedConsole, start_logging, stop_logging
+from watcher import RequestBudget, next_poll_interval
+from store import LocalStore
+from callbacks import CallbackRegistry, PurchaseIntent
+from singleflight import SingleFlight
+from workqueue import DeadlineQueue
+from netcache import install_dns_cache, uninstall_dns_cache
+from deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+from profiling import profiled
+from loopwatch import LoopMonitor
+import tracing
+from tracing import traced
+from outbox import Outbox
+from warmup import warm_trips_cache
+
+# telegram, apscheduler y rich se importan bajo demanda (ver lazy.py): el
+# import de este módulo debe ser rápido para reinicios y comandos de un uso.
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import Application, ContextTypes
 
-# Configurar logging con Rich
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    datefmt="[%X]",
-    handlers=[RichHandler(rich_tracebacks=True, show_path=False, markup=True)])
 logger = logging.getLogger(__name__)
 
-console = Console()
+console = QueuedConsole(service_console())
 
 # Timeout for all HTTP requests (in seconds)
 # Prevents requests from hanging indefinitely
 REQUEST_TIMEOUT = 60
 
+# Timeout for the OAuth token request (in seconds)
+AUTH_TIMEOUT = 15
+
 # Retry configuration for server errors
 MAX_RETRIES = 3
 RETRY_DELAY_BASE = 2  # Base delay in seconds for exponential backoff
 
+# Seconds between countdown refreshes of auto-confirm notifications
+COUNTDOWN_UPDATE_SECONDS = 30
+
+# Pooled HTTP connections to the HIFE API (purchase workers + warm-up)
+HTTP_POOL_SIZE = 8
+
+# RUN_MODE=service: fewer threads and connections for small hosts
+SERVICE_HTTP_POOL_SIZE = 2
+SERVICE_TELEGRAM_POOL_SIZE = 4
+
+# Pending auto-confirm purchases: "tipo|hora|fecha" -> (countdown job, deadline job)
+_pending_auto_confirm = {}
+
+# Availability watches: "tipo|hora|fecha" -> next poll job; one shared budget
+_active_watches = {}
+_watch_budget = None
+
+_store = None
+_outbox = None
+_callbacks = None
+
+# Compras en curso por clave (perfil, fecha, tipo, hora): un segundo toque se
+# une a la compra que ya corre en lugar de lanzar otra
+_purchases_in_flight = SingleFlight()
+
+# Los registros de compra (idempotencia) se conservan este número de días
+PURCHASE_RECORD_DAYS = 30
+
+# Un registro 'pending' de hace menos de estas horas bloquea otra compra del
+# mismo viaje: o hay otra en curso (p. ej. desde cli.py) o una se interrumpió
+# (reinicio, caída) sin saber si llegó a pagarse
+PURCHASE_PENDING_HOURS = 24
+
+# Tiempo reservado para la compra automática antes del plazo de la compra
+# (salida menos PURCHASE_DEADLINE_MARGIN_MINUTES): si no cabe, se pregunta
+AUTO_CONFIRM_PURCHASE_SECONDS = 120
+
+# Cola de compras por orden de salida (ver workqueue.py)
+_purchase_queue = None
+
+# Lag del event loop, bloqueos y latido (ver loopwatch.py)
+_loop_monitor = None
+
+
+def _get_outbox(context: ContextTypes.DEFAULT_TYPE) -> Outbox:
+    """Cola de salida única para todos los mensajes al usuario"""
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(context.bot)
+    return _outbox
+
+
+def _get_store() -> LocalStore:
+    """Almacén local compartido (se abre en el primer uso)"""
+    global _store
+    if _store is None:
+        _store = LocalStore(Config.STORE_PATH)
+    return _store
+
+
+def _get_purchase_queue() -> DeadlineQueue:
+    global _purchase_queue
+    if _purchase_queue is None:
+        _purchase_queue = DeadlineQueue(Config.PURCHASE_WORKERS,
+                                        Config.PURCHASE_QUEUE_SIZE)
+    return _purchase_queue
+
+
+def _get_callbacks() -> CallbackRegistry:
+    """Registro de botones pendientes, respaldado por el almacén local"""
+    global _callbacks
+    if _callbacks is None:
+        _callbacks = CallbackRegistry(_get_store(),
+                                      Config.CALLBACK_TTL_HOURS * 3600)
+    return _callbacks
+
+
+def _departure_timestamp(t_date: str, t_time: str) -> float:
+    return datetime.datetime.strptime(f"{t_date} {t_time}",
+                                      "%Y-%m-%d %H:%M").timestamp()
+
+
+def _purchase_deadline(t_date: str, t_time: str) -> Deadline:
+    """Plazo de la compra: la salida menos PURCHASE_DEADLINE_MARGIN_MINUTES"""
+    return Deadline(
+        _departure_timestamp(t_date, t_time) -
+        Config.PURCHASE_DEADLINE_MARGIN_MINUTES * 60)
+
+
+def _raise_if_late(deadline: Deadline, error: Exception, step: str):
+    """Un timeout provocado por el plazo de la compra se convierte en DeadlineExceeded"""
+    if deadline.expired:
+        raise DeadlineExceeded(f"Plazo agotado durante {step}") from error
+
 
 class HifeAutomator:
 
     def __init__(self):
-        self.api_url = Config.HIFE_API_URL
-        self.headers = Config.get_headers()
-
-    def refresh_token(self):
+        # Una sola sesión: las conexiones TCP/TLS se reutilizan entre peticiones
+        self.session = requests.Session()
+        pool_size = (SERVICE_HTTP_POOL_SIZE
+                     if Config.RUN_MODE == 'service' else HTTP_POOL_SIZE)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2,
+                                                pool_maxsize=pool_size)
+        if Config.HTTP_CASSETTE_MODE:
+            # Grabación/reproducción de peticiones (ver cassette.py)
+            from cassette import CassetteAdapter
+            adapter = CassetteAdapter(Config.HTTP_CASSETTE_PATH,
+                                      Config.HTTP_CASSETTE_MODE,
+                                      Config.HTTP_CASSETTE_TIMING,
+                                      inner=adapter)
+            console.print(
+                f"[yellow]📼[/yellow] Cassette HTTP en modo [cyan]{Config.HTTP_CASSETTE_MODE}[/cyan]: "
+                f"{Config.HTTP_CASSETTE_PATH}")
+        if Config.TRACING:
+            # Un span por petición, también las reproducidas (ver tracing.py)
+            adapter = tracing.TracingAdapter(adapter)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Peticiones independientes de una misma compra en paralelo
+        self._pool = ThreadPoolExecutor(max_workers=pool_size,
+                                        thread_name_prefix='hife-http')
+        # Búsquedas de viajes con segunda petición si la primera se retrasa
+        self._hedger = None
+        self.configure_hedging()
+        # Último listado de viajes por (origen, destino, fecha): permite ofrecer
+        # alternativas sin repetir la llamada a la API
+        self._last_trips = {}
+
+    def configure_hedging(self):
+        """(Re)crea el hedger con HEDGE_*, conservando las latencias observadas"""
+        previous = self._hedger
+        if not Config.HEDGE_PERCENTILE:
+            self._hedger = None
+            return
+        from hedging import Hedger
+        hedger = Hedger(self._pool, Config.HEDGE_PERCENTILE,
+                        Config.HEDGE_MAX_PERCENT)
+        if previous is not None:
+            with previous.lock:
+                hedger.latencies.extend(previous.latencies)
+        self._hedger = hedger
+
+    @property
+    def api_url(self) -> str:
+        return Config.HIFE_API_URL
+
+    @property
+    def headers(self):
+        # Precalculados en el snapshot vigente: siguen al token renovado y a
+        # las recargas del .env sin copiar nada aquí
+        return Config.headers
+
+    @traced('hife.refresh_token')
+    def refresh_token(self, deadline: Deadline = NO_DEADLINE):
         """Intenta renovar el token JWT y actualizar los headers"""
         if not Config.HIFE_EMAIL or not Config.HIFE_PASSWORD or not Config.HIFE_CLIENT_SECRET:
             console.print(
@@ -47,19 +212,98 @@ class HifeAutomator:
             return False
 
         console.print("[cyan]🔄[/cyan] Renovando token de acceso...")
-        new_token = get_hife_token(Config.HIFE_EMAIL, Config.HIFE_PASSWORD,
-                                   Config.HIFE_CLIENT_SECRET)
+        new_token = get_hife_token(Config.HIFE_EMAIL,
+                                   Config.HIFE_PASSWORD,
+                                   Config.HIFE_CLIENT_SECRET,
+                                   timeout=deadline.timeout(AUTH_TIMEOUT))
 
         if new_token:
-            Config.HIFE_AUTH_TOKEN = new_token
-            self.headers = Config.get_headers()
+            update_config(HIFE_AUTH_TOKEN=new_token)
             console.print("[green]✅ Token renovado correctamente[/green]")
             return True
 
         console.print("[red]✗[/red] Falló la renovación del token")
         return False
 
-    def get_trip_id(self, origin, dest, date_str, target_time):
+    def warm_connection(self) -> bool:
+        """Abre (o mantiene viva) una conexión con la API para que la compra no pague DNS/TCP/TLS"""
+        try:
+            # Cualquier respuesta sirve: solo interesa la conexión en el pool
+            self.session.head(self.api_url, timeout=REQUEST_TIMEOUT)
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"No se pudo precalentar la conexión: {e}")
+            return False
+
+    # La compra la hace el worker de la cola, no handle_callback (que solo la
+    # encola): se perfilan sus pasos bloqueantes, la búsqueda y el pago
+    @profiled('get_trip_id')
+    @traced('hife.get_trip_id')
+    def get_trip_id(self,
+                    origin,
+                    dest,
+                    date_str,
+                    target_time,
+                    use_cache=True,
+                    deadline: Deadline = NO_DEADLINE):
+        tracing.set_attribute('trip.time', target_time)
+        tracing.set_attribute('trip.date', date_str)
+        # Primero el listado precalentado por la tarea nocturna, si está fresco
+        match = self.find_cached_trip(origin, dest, date_str,
+                                      target_time) if use_cache else None
+        tracing.set_attribute('trips.cache_hit', match is not None)
+        if match:
+            return match
+
+        trips = self.fetch_trips(origin, dest, date_str, deadline)
+        if isinstance(trips, dict):
+            return trips
+
+        match = _match_trip(trips, target_time)
+        if match:
+            console.print(
+                f"[green]✓[/green] Viaje encontrado: [cyan]{target_time}[/cyan] -> ID: [magenta]{match[0]}[/magenta] "
+                f"(tarifa [dim]{match[1]}[/dim])")
+            return match
+
+        # Trip not found in response
+        console.print(
+            f"[yellow]⚠[/yellow] No se encontró viaje para [cyan]{target_time}[/cyan] el [cyan]{date_str}[/cyan]"
+        )
+        return None
+
+    def find_cached_trip(self, origin, dest, date_str, target_time):
+        """(schedule_id, going_rate) desde el listado precalentado, si está fresco, o None"""
+        cached = _get_store().get_trips(origin, dest, date_str,
+                                        Config.TRIPS_CACHE_MAX_AGE_HOURS * 3600)
+        if not cached:
+            return None
+        self._last_trips_put(origin, dest, date_str, cached)
+        match = _match_trip(cached, target_time)
+        if match:
+            console.print(
+                f"[green]✓[/green] Viaje encontrado en caché local: [cyan]{target_time}[/cyan] -> "
+                f"ID: [magenta]{match[0]}[/magenta] (tarifa [dim]{match[1]}[/dim])"
+            )
+        return match
+
+    def _get_trips(self, url, params, deadline: Deadline):
+        """GET del listado de viajes; con HEDGE_PERCENTILE, con segunda petición si tarda"""
+        request = functools.partial(self.session.get,
+                                    url,
+                                    headers=self.headers,
+                                    params=params,
+                                    timeout=deadline.timeout(REQUEST_TIMEOUT))
+        if self._hedger is None:
+            return request()
+        return self._hedger.call(tracing.bind(request))
+
+    def fetch_trips(self, origin, dest, date_str,
+                    deadline: Deadline = NO_DEADLINE):
+        """Descarga el listado de viajes de la ruta (lista) o devuelve un dict de error.
+
+        Lanza DeadlineExceeded si el plazo se agota antes de tener respuesta.
+        """
         url = f"{self.api_url}/route/{origin}/{dest}/{date_str}/trips"
         params = {
             'pmrsr':
@@ -77,23 +321,18 @@ class HifeAutomator:
 
         # Retry logic for server errors (5xx)
         for attempt in range(MAX_RETRIES):
+            tracing.set_attribute('hife.attempts', attempt + 1)
             try:
-                res = requests.get(url,
-                                   headers=self.headers,
-                                   params=params,
-                                   timeout=REQUEST_TIMEOUT)
+                res = self._get_trips(url, params, deadline)
 
                 # Handle unauthorized (401) - attempt token refresh
                 if res.status_code == 401:
                     console.print(
                         "[yellow]⚠[/yellow] Token expirado (401). Intentando renovar..."
                     )
-                    if self.refresh_token():
+                    if self.refresh_token(deadline):
                         # Retry immediately with new token
-                        res = requests.get(url,
-                                           headers=self.headers,
-                                           params=params,
-                                           timeout=REQUEST_TIMEOUT)
+                        res = self._get_trips(url, params, deadline)
                     else:
                         return {
                             'error': 'auth_error',
@@ -112,7 +351,7 @@ class HifeAutomator:
                         logger.warning(
                             f"Server error 500 al buscar viaje (intento {attempt + 1}/{MAX_RETRIES}): {res.url}"
                         )
-                        time.sleep(delay)
+                        deadline.sleep(delay)
                         continue
                     else:
                         # Last attempt failed
@@ -129,21 +368,12 @@ class HifeAutomator:
 
                 # Success - parse response
                 trips = res.json()
+                self._last_trips_put(origin, dest, date_str, trips)
+                _get_store().put_trips(origin, dest, date_str, trips)
+                return trips
 
-                for trip in trips:
-                    if trip.get('departure_time') == target_time:
-                        going_rate = _resolve_going_rate_from_trip(trip)
-                        console.print(
-                            f"[green]✓[/green] Viaje encontrado: [cyan]{target_time}[/cyan] -> ID: [magenta]{trip['id']}[/magenta] "
-                            f"(tarifa [dim]{going_rate}[/dim])"
-                        )
-                        return (trip["id"], going_rate)
-
-                # Trip not found in response
-                console.print(
-                    f"[yellow]⚠[/yellow] No se encontró viaje para [cyan]{target_time}[/cyan] el [cyan]{date_str}[/cyan]"
-                )
-                return None
+            except DeadlineExceeded:
+                raise
 
             except requests.exceptions.HTTPError as e:
                 # Handle other HTTP errors (4xx, etc.)
@@ -156,6 +386,7 @@ class HifeAutomator:
                 return {'error': 'http_error', 'status_code': status_code}
 
             except requests.exceptions.Timeout as e:
+                _raise_if_late(deadline, e, "la búsqueda del viaje")
                 console.print(
                     f"[red]✗[/red] Timeout al buscar viaje: [red]{e}[/red]")
                 logger.error(f"Timeout al buscar viaje: {e}")
@@ -185,14 +416,67 @@ class HifeAutomator:
         # Should not reach here, but just in case
         return {'error': 'max_retries_exceeded'}
 
-    def buy_ticket(self, schedule_id, date_str, trip_type, going_rate: str):
+    def _last_trips_put(self, origin, dest, date_str, trips):
+        if len(self._last_trips) >= 16:
+            self._last_trips.clear()
+        self._last_trips[(str(origin), str(dest), date_str)] = trips
+
+    def find_alternatives(self, origin, dest, date_str, target_time):
+        """Alternativas al horario pedido a partir del último listado ya descargado (sin llamar a la API)"""
+        trips = self._last_trips.get(
+            (str(origin), str(dest), date_str)) or _get_store().get_trips(
+                origin, dest, date_str)
+        if not trips:
+            return []
+        return rank_alternative_trips(trips, target_time,
+                                      Config.FALLBACK_TOLERANCE_MINUTES,
+                                      Config.FALLBACK_MAX_OPTIONS)
+
+    def _get_available_bonus(self, date_str, trip_type,
+                             deadline: Deadline = NO_DEADLINE):
+        """GET /bonus/available para la fecha y el sentido (no depende de la operación)"""
+        if trip_type == "ida":
+            origin_stop_code = Config.ORIGIN_STOP_CODE
+            destination_stop_code = Config.DESTINATION_STOP_CODE
+        else:  # vuelta
+            origin_stop_code = Config.DESTINATION_STOP_CODE
+            destination_stop_code = Config.ORIGIN_STOP_CODE
+
+        bonus_url = (f"{self.api_url}/bonus/available?"
+                     f"bonus_id={Config.BONUS_ID}&"
+                     f"trip_date={date_str}&"
+                     f"origin_stop_code={origin_stop_code}&"
+                     f"destination_stop_code={destination_stop_code}")
+        return self.session.get(bonus_url,
+                                headers=self.headers,
+                                timeout=deadline.timeout(REQUEST_TIMEOUT))
+
+    @profiled('buy_ticket')
+    @traced('hife.buy_ticket')
+    def buy_ticket(self,
+                   schedule_id,
+                   date_str,
+                   trip_type,
+                   going_rate: str,
+                   quantity: int = 1,
+                   deadline: Deadline = NO_DEADLINE):
+        """Compra `quantity` billetes en una sola operación, un bono por viajero.
+
+        Lanza DeadlineExceeded si el plazo se agota antes de pagar.
+        """
+        tracing.set_attribute('hife.quantity', quantity)
         try:
             console.print(
                 f"[cyan]🔄[/cyan] Iniciando compra de billete: [yellow]{trip_type}[/yellow] para [cyan]{date_str}[/cyan]"
-            )
+                + (f" ({quantity} viajeros)" if quantity > 1 else ""))
+            # La consulta del bono no depende de token_id: va en paralelo con
+            # la creación de la operación y ahorra un viaje de ida y vuelta
+            bonus_future = self._pool.submit(
+                tracing.bind(self._get_available_bonus), date_str, trip_type,
+                deadline)
             # Use YYYY-MM-DD format (same as used in bonus API)
             op_data = {
-                "quantity": 1,
+                "quantity": quantity,
                 "quantity_childs": 0,
                 "quantity_childs_without_seat": 0,
                 "insurance": 0,
@@ -203,24 +487,25 @@ class HifeAutomator:
                 "operation_type": 0
             }
             try:
-                op_res = requests.post(f"{self.api_url}/route/operation",
-                                       headers=self.headers,
-                                       json=op_data,
-                                       timeout=REQUEST_TIMEOUT)
+                op_res = self.session.post(f"{self.api_url}/route/operation",
+                                           headers=self.headers,
+                                           json=op_data,
+                                           timeout=deadline.timeout(REQUEST_TIMEOUT))
 
                 # Handle unauthorized (401)
                 if op_res.status_code == 401:
                     console.print(
                         "[yellow]⚠[/yellow] Token expirado (401) al crear operación. Intentando renovar..."
                     )
-                    if self.refresh_token():
-                        op_res = requests.post(f"{self.api_url}/route/operation",
-                                               headers=self.headers,
-                                               json=op_data,
-                                               timeout=REQUEST_TIMEOUT)
+                    if self.refresh_token(deadline):
+                        op_res = self.session.post(f"{self.api_url}/route/operation",
+                                                   headers=self.headers,
+                                                   json=op_data,
+                                                   timeout=deadline.timeout(REQUEST_TIMEOUT))
                     else:
                         return False
             except requests.exceptions.RequestException as e:
+                _raise_if_late(deadline, e, "la creación de la operación")
                 console.print(
                     f"[red]✗[/red] Error de red/timeout en operación: [red]{e}[/red]"
                 )
@@ -249,86 +534,102 @@ class HifeAutomator:
             # Extract token_id from list if it's a list
             if isinstance(token_id, list):
                 token_id = token_id[0]
+            tracing.set_attribute('hife.token_id', token_id)
             console.print(
                 f"[green]✓[/green] Operación creada: token_id=[magenta]{token_id}[/magenta]"
             )
 
-            if trip_type == "ida":
-                origin_stop_code = Config.ORIGIN_STOP_CODE
-                destination_stop_code = Config.DESTINATION_STOP_CODE
-            else:  # vuelta
-                origin_stop_code = Config.DESTINATION_STOP_CODE
-                destination_stop_code = Config.ORIGIN_STOP_CODE
-
-            bonus_url = (f"{self.api_url}/bonus/available?"
-                         f"bonus_id={Config.BONUS_ID}&"
-                         f"trip_date={date_str}&"
-                         f"origin_stop_code={origin_stop_code}&"
-                         f"destination_stop_code={destination_stop_code}")
-            bonus_res = requests.get(bonus_url,
-                                     headers=self.headers,
-                                     timeout=REQUEST_TIMEOUT)
-            bonus_res.raise_for_status()
-            bonus_data = bonus_res.json()
+            try:
+                bonus_res = bonus_future.result()
+                if bonus_res.status_code == 401:
+                    # El token caducó y se renovó al crear la operación
+                    bonus_res = self._get_available_bonus(
+                        date_str, trip_type, deadline)
+                bonus_res.raise_for_status()
+                bonus_data = bonus_res.json()
+            except requests.exceptions.RequestException as e:
+                _raise_if_late(deadline, e, "la consulta del bono")
+                console.print(
+                    f"[red]✗[/red] Error consultando el bono disponible: [red]{e}[/red]"
+                )
+                logger.error(f"Request exception al consultar bono: {e}")
+                return False
 
             if not bonus_data or len(bonus_data) == 0:
                 console.print("[red]✗[/red] No se encontró bono disponible")
                 return False
+            if len(bonus_data) < quantity:
+                console.print(
+                    f"[red]✗[/red] Solo hay {len(bonus_data)} bonos disponibles para {quantity} viajeros"
+                )
+                return False
 
-            bonus_item_id = bonus_data[0]['id']
+            # Un bono distinto por viajero
+            bonus_item_ids = [item['id'] for item in bonus_data[:quantity]]
             console.print(
-                f"[green]✓[/green] Bono disponible: ID=[magenta]{bonus_item_id}[/magenta]"
+                f"[green]✓[/green] Bono disponible: ID=[magenta]{', '.join(map(str, bonus_item_ids))}[/magenta]"
             )
 
             traveler_data = {
                 "travelers": {
                     "1": {
-                        "1": {
+                        str(number): {
                             "form_bonus": str(bonus_item_id)
-                        }
+                        } for number, bonus_item_id in enumerate(
+                            bonus_item_ids, start=1)
                     }
                 },
                 "_method": "PATCH"
             }
-            traveler_res = requests.post(
+            traveler_res = self.session.post(
                 f"{self.api_url}/route/operation/{token_id}/travelers",
                 headers=self.headers,
                 json=traveler_data,
-                timeout=REQUEST_TIMEOUT)
+                timeout=deadline.timeout(REQUEST_TIMEOUT))
             traveler_res.raise_for_status()
-            console.print("[green]✓[/green] Viajero asignado")
+            console.print(f"[green]✓[/green] Viajeros asignados: {quantity}"
+                          if quantity > 1 else "[green]✓[/green] Viajero asignado")
 
-            reservation_res = requests.post(
+            reservation_res = self.session.post(
                 f"{self.api_url}/route/operation/{token_id}/proceed-reservation",
                 headers=self.headers,
                 json={
                     "payment_method_id": 7,
                     "_method": "PATCH"
                 },
-                timeout=REQUEST_TIMEOUT)
+                timeout=deadline.timeout(REQUEST_TIMEOUT))
             reservation_res.raise_for_status()
             console.print("[green]✓[/green] Reserva confirmada")
 
-            pay_res = requests.post(
+            pay_res = self.session.post(
                 f"{self.api_url}/route/operation/{token_id}/payment/bonus-item",
                 headers=self.headers,
                 json={"_method": "PATCH"},
-                timeout=REQUEST_TIMEOUT)
+                timeout=deadline.timeout(REQUEST_TIMEOUT))
             pay_res.raise_for_status()
             pay_data = pay_res.json()
 
             success = pay_data.get('success', False)
+            tracing.set_attribute('hife.payment_success', bool(success))
             if success:
-                console.print("[green]✅ Billete comprado con éxito[/green]")
+                console.print(
+                    f"[green]✅ {quantity} billetes comprados con éxito[/green]"
+                    if quantity > 1 else
+                    "[green]✅ Billete comprado con éxito[/green]")
             else:
                 console.print(f"[red]✗[/red] Error en el pago: {pay_data}")
 
             return success
+        except DeadlineExceeded:
+            raise
         except requests.exceptions.RequestException as e:
+            _raise_if_late(deadline, e, "la compra")
             console.print(f"[red]✗[/red] Error HTTP en compra: [red]{e}[/red]")
+            tracing.set_error(str(e))
             return False
         except Exception as e:
             console.print(f"[red]✗[/red] Error en compra: [red]{e}[/red]")
+            tracing.set_error(f"{type(e).__name__}: {e}")
             logger.exception("Error en compra")
             return False
 
@@ -358,10 +659,10 @@ def _resolve_going_rate_from_trip(trip: dict) -> str:
     return "512"
 
 
-async def ask_confirmation(context: ContextTypes.DEFAULT_TYPE):
-    job = context.job
-    data = job.data
-
+def _confirmation_text(data: dict,
+                       deadline: datetime.datetime = None,
+                       auto_skipped: bool = False) -> str:
+    """Texto de la notificación de viaje, con cuenta atrás si hay compra automática"""
     # Formatear fecha de forma legible
     trip_date = datetime.datetime.strptime(data['date'], "%Y-%m-%d")
     date_formatted = trip_date.strftime("%d/%m/%Y")
@@ -385,65 +686,632 @@ async def ask_confirmation(context: ContextTypes.DEFAULT_TYPE):
         origin = Config.DESTINATION_NAME or f"Estación {Config.DESTINATION_ID}"
         destination = Config.ORIGIN_NAME or f"Estación {Config.ORIGIN_ID}"
 
-    keyboard = [[
-        InlineKeyboardButton(
-            "✅ Sí, comprar",
-            callback_data=f"buy|{data['type']}|{data['time']}|{data['date']}"),
-        InlineKeyboardButton("❌ No, ignorar", callback_data="cancel")
-    ]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     message_text = (f"🚌 *Notificación de Viaje*\n\n"
                     f"📅 *Fecha:* {day_display}, {date_formatted}\n"
                     f"⏰ *Hora:* {data['time']}\n"
                     f"📍 *Ruta:* {origin} → {destination}\n"
-                    f"🎫 *Tipo:* {data['type'].capitalize()}\n\n"
-                    f"¿Deseas que compre el billete ahora?")
+                    f"🎫 *Tipo:* {data['type'].capitalize()}\n\n")
+
+    if deadline is None:
+        if auto_skipped:
+            message_text += ("⚠️ Ya no da tiempo a la compra automática: "
+                             "solo se compra si lo confirmas.\n\n")
+        return message_text + "¿Deseas que compre el billete ahora?"
+
+    remaining = max(0, int((deadline - datetime.datetime.now()).total_seconds()))
+    minutes, seconds = divmod(remaining, 60)
+    return message_text + (
+        f"⏱️ *Compra automática en {minutes} min {seconds:02d} s*\n"
+        f"Pulsa \"❌ No\" para cancelarla o \"✅ Sí\" para comprar ya.")
+
 
-    await context.bot.send_message(Config.TELEGRAM_USER_ID,
-                                   text=message_text,
-                                   reply_markup=reply_markup,
-                                   parse_mode='Markdown')
+def _processing_text(t_type: str, t_time: str, t_date: str) -> str:
+    date_formatted = datetime.datetime.strptime(
+        t_date, "%Y-%m-%d").strftime("%d/%m/%Y")
+    text = (f"⏳ *Procesando compra...*\n\n"
+            f"📅 Fecha: {date_formatted}\n"
+            f"⏰ Hora: {t_time}\n"
+            f"🎫 Tipo: {t_type.capitalize()}\n\n"
+            f"Por favor, espera un momento...")
+    depth = _get_purchase_queue().depth
+    if depth:
+        text += f"\n\n📥 Compras en cola: {depth}"
+    return text
+
+
+def _match_trip(trips: list, target_time: str):
+    """(schedule_id, going_rate) del viaje que sale a `target_time`, o None"""
+    for trip in trips:
+        if trip.get('departure_time') == target_time:
+            return (trip["id"], _resolve_going_rate_from_trip(trip))
+    return None
+
+
+def _same_trip(a: tuple, b: tuple) -> bool:
+    """Si dos (schedule_id, going_rate) coinciden; la API da los IDs como números y el .env como texto"""
+    return tuple(map(str, a)) == tuple(map(str, b))
+
+
+def _available_trip(trips: list, target_time: str):
+    """(schedule_id, going_rate) del viaje de `target_time` si tiene la tarifa del bono habilitada.
+
+    Que el viaje aparezca en el listado no basta: uno lleno sigue listado.
+    """
+    for trip in trips:
+        if (trip.get('departure_time') == target_time and 'id' in trip and
+                _bonus_rate_available(trip)):
+            return trip['id'], _resolve_going_rate_from_trip(trip)
+    return None
+
+
+def _bonus_rate_available(trip: dict) -> bool:
+    """Si el viaje tiene una tarifa habilitada para el BONUS_ID configurado"""
+    try:
+        bonus_id = int(Config.BONUS_ID)
+    except ValueError:
+        return False
+    rows = trip.get("tripPrices", {}).get("going", [])
+    return any(
+        r.get("bonusTypeId") == bonus_id and not r.get("disabled", False)
+        for r in rows)
+
+
+def rank_alternative_trips(trips: list, target_time: str,
+                           tolerance_minutes: int, limit: int) -> list:
+    """Ordena los viajes cercanos a `target_time` (dentro de la tolerancia).
+
+    Primero los que tienen tarifa disponible para el bono configurado y, a
+    igualdad, los más próximos en hora. Devuelve dicts con id, departure_time,
+    going_rate, rate_available y delta_minutes.
+    """
+    if tolerance_minutes <= 0 or limit <= 0:
+        return []
+    try:
+        target = datetime.datetime.strptime(target_time, "%H:%M")
+    except ValueError:
+        return []
+
+    candidates = []
+    for trip in trips:
+        departure_time = trip.get('departure_time')
+        if not departure_time or departure_time == target_time or 'id' not in trip:
+            continue
+        try:
+            departure = datetime.datetime.strptime(departure_time, "%H:%M")
+        except ValueError:
+            continue
+        delta = (departure - target).total_seconds() / 60
+        if abs(delta) > tolerance_minutes:
+            continue
+        candidates.append({
+            'id': trip['id'],
+            'departure_time': departure_time,
+            'going_rate': _resolve_going_rate_from_trip(trip),
+            'rate_available': _bonus_rate_available(trip),
+            'delta_minutes': int(delta)
+        })
+
+    candidates.sort(
+        key=lambda c: (not c['rate_available'], abs(c['delta_minutes'])))
+    return candidates[:limit]
+
+
+async def ask_confirmation(context: ContextTypes.DEFAULT_TYPE):
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    job = context.job
+    data = job.data
+    key = f"{data['type']}|{data['time']}|{data['date']}"
+
+    # Los botones solo llevan un identificador; la compra se guarda en el registro
+    group, (buy_token, cancel_token) = _get_callbacks().register(
+        [
+            PurchaseIntent('buy', data['type'], data['time'], data['date']),
+            PurchaseIntent('cancel', data['type'], data['time'], data['date'])
+        ],
+        expires_at=_departure_timestamp(data['date'], data['time']))
+    keyboard = [[
+        InlineKeyboardButton("✅ Sí, comprar", callback_data=buy_token),
+        InlineKeyboardButton("❌ No, ignorar", callback_data=cancel_token)
+    ]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    # Modo compra automática: plazo configurable, pero con tiempo para comprar
+    # antes del plazo de la compra
+    deadline = _auto_confirm_time(data)
+    auto_skipped = (deadline is None and
+                    bool(Config.get_auto_confirm_minutes(data['type'])))
+
+    # Conexión lista para el POST de la compra mientras se espera respuesta
+    _arm_connection_warmup(context.job_queue, deadline)
+
+    # Mientras se espera respuesta, confirmar que el ID configurado sigue valiendo
+    weekday = datetime.datetime.strptime(data['date'], "%Y-%m-%d").weekday()
+    if Config.get_trip_id(data['type'], weekday):
+        asyncio.get_running_loop().run_in_executor(None,
+                                                   validate_configured_trip,
+                                                   data['type'], data['time'],
+                                                   data['date'])
+
+    message = await _get_outbox(context).send(Config.TELEGRAM_USER_ID,
+                                              text=_confirmation_text(
+                                                  data, deadline,
+                                                  auto_skipped),
+                                              reply_markup=reply_markup,
+                                              parse_mode='Markdown')
     console.print(
         f"[cyan]📱[/cyan] Notificación enviada: [yellow]{data['type']}[/yellow] a las [cyan]{data['time']}[/cyan]"
     )
 
+    if deadline is not None:
+        auto_data = {
+            **data, 'key': key,
+            'callback_group': group,
+            'deadline': deadline,
+            'message_id': message.message_id,
+            'reply_markup': reply_markup
+        }
+        countdown_job = context.job_queue.run_repeating(
+            _auto_confirm_countdown,
+            interval=COUNTDOWN_UPDATE_SECONDS,
+            first=COUNTDOWN_UPDATE_SECONDS,
+            data=auto_data,
+            name=f"countdown|{key}")
+        deadline_job = context.job_queue.run_once(
+            _auto_confirm_deadline,
+            when=_seconds_until(deadline),
+            data=auto_data,
+            name=f"auto_confirm|{key}")
+        _pending_auto_confirm[key] = (countdown_job, deadline_job)
+        console.print(
+            f"[cyan]⏱️[/cyan] Compra automática programada para las [magenta]{deadline:%H:%M:%S}[/magenta] "
+            f"si no se cancela")
+
+
+def _auto_confirm_time(data: dict):
+    """Hora de la compra automática, o None si está desactivada o ya no cabe"""
+    auto_minutes = Config.get_auto_confirm_minutes(data['type'])
+    if not auto_minutes:
+        return None
+    now = datetime.datetime.now()
+    # La compra se encola con el plazo de _purchase_deadline: lanzarla más tarde
+    # la descartaría sin ejecutarse
+    latest = datetime.datetime.fromtimestamp(
+        _purchase_deadline(data['date'], data['time']).at -
+        AUTO_CONFIRM_PURCHASE_SECONDS)
+    if latest <= now:
+        return None
+    return min(now + datetime.timedelta(minutes=auto_minutes), latest)
+
+
+def _seconds_until(when: datetime.datetime) -> float:
+    """Segundos hasta `when` (hora local sin zona) para el JobQueue.
+
+    PTB interpreta un datetime sin zona como UTC: en España el trabajo se
+    ejecutaría una o dos horas tarde. Un retraso relativo no depende de la zona.
+    """
+    return max(0.0, (when - datetime.datetime.now()).total_seconds())
+
+
+def _arm_connection_warmup(job_queue, until: datetime.datetime = None):
+    """Mantiene caliente la conexión con la API hasta `until` (o CONNECTION_WARM_MINUTES)"""
+    if Config.CONNECTION_WARM_MINUTES <= 0 or job_queue is None:
+        return
+    until = max(
+        until or datetime.datetime.min,
+        datetime.datetime.now() +
+        datetime.timedelta(minutes=Config.CONNECTION_WARM_MINUTES))
+    for job in job_queue.get_jobs_by_name('keep_warm'):
+        # Ya hay una: basta con ampliar su plazo
+        job.data['until'] = max(job.data['until'], until)
+        return
+    job_queue.run_repeating(_keep_connection_warm,
+                            interval=Config.CONNECTION_KEEPALIVE_SECONDS,
+                            first=0,
+                            data={'until': until},
+                            name='keep_warm')
+
+
+async def _keep_connection_warm(context: ContextTypes.DEFAULT_TYPE):
+    if datetime.datetime.now() > context.job.data['until']:
+        context.job.schedule_removal()
+        return
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, automator.warm_connection)
+
+
+def _cancel_auto_confirm(key: str) -> bool:
+    """Desarma la compra automática pendiente de `key`. Devuelve si había una"""
+    jobs = _pending_auto_confirm.pop(key, None)
+    if jobs is None:
+        return False
+    for job in jobs:
+        job.schedule_removal()
+    return True
+
+
+async def _auto_confirm_countdown(context: ContextTypes.DEFAULT_TYPE):
+    """Actualiza la cuenta atrás del mensaje de confirmación"""
+    from telegram.error import TelegramError
+
+    data = context.job.data
+    if data['deadline'] <= datetime.datetime.now():
+        return
+    try:
+        await _get_outbox(context).edit(Config.TELEGRAM_USER_ID,
+                                        data['message_id'],
+                                        _confirmation_text(
+                                            data, data['deadline']),
+                                        reply_markup=data['reply_markup'],
+                                        parse_mode='Markdown')
+    except TelegramError as e:
+        # Un fallo al refrescar la cuenta atrás no debe afectar a la compra
+        logger.debug(f"No se pudo actualizar la cuenta atrás: {e}")
+
+
+async def _auto_confirm_deadline(context: ContextTypes.DEFAULT_TYPE):
+    """Plazo vencido sin un "❌ No": se compra el billete automáticamente"""
+    from telegram.error import TelegramError
+
+    data = context.job.data
+    if not _cancel_auto_confirm(data['key']):
+        # El usuario ya respondió
+        return
+    # Los botones del mensaje dejan de ser válidos
+    _get_callbacks().revoke(data['callback_group'])
 
+    console.print(
+        f"[cyan]⏱️[/cyan] Plazo vencido sin respuesta - comprando automáticamente [yellow]{data['type']}[/yellow] "
+        f"a las [cyan]{data['time']}[/cyan]")
+    try:
+        await _get_outbox(context).edit(Config.TELEGRAM_USER_ID,
+                                        data['message_id'],
+                                        _processing_text(data['type'],
+                                                         data['time'],
+                                                         data['date']),
+                                        parse_mode='Markdown')
+    except TelegramError as e:
+        # Nadie va a reintentar: el aviso no puede impedir la compra
+        logger.warning(f"No se pudo editar el mensaje de la compra automática: {e}")
+    await enqueue_purchase(context, data['type'], data['time'], data['date'])
+
+
+async def _edit_query_message(context: ContextTypes.DEFAULT_TYPE, query,
+                              text: str):
+    """Edita el mensaje del botón pulsado a través de la cola de salida"""
+    await _get_outbox(context).edit(query.message.chat_id,
+                                    query.message.message_id,
+                                    text,
+                                    parse_mode='Markdown')
+
+
+@traced('telegram.callback')
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+
+    # callback_data es un identificador del registro de botones; una sola
+    # consulta devuelve la intención e invalida el resto de botones del mensaje
+    intent = _get_callbacks().consume(query.data)
+    if intent is None:
+        tracing.set_attribute('callback.expired', True)
+        await query.answer("⌛ Este botón ha caducado o ya se ha usado",
+                           show_alert=True)
+        return
+    tracing.set_attribute('callback.action', intent.action)
+    tracing.set_attribute('trip.type', intent.trip_type)
+    tracing.set_attribute('trip.time', intent.time)
+    tracing.set_attribute('trip.date', intent.date)
+    if (intent.action != "cancel" and
+            _departure_timestamp(intent.date, intent.time) <= time.time()):
+        await query.answer("⌛ Este viaje ya ha salido", show_alert=True)
+        return
     await query.answer()
 
-    if query.data == "cancel":
-        await query.edit_message_text(
-            "❌ *Operación cancelada*\n\n"
-            "No se realizará ninguna compra.",
-            parse_mode='Markdown')
+    if intent.action == "alt":
+        await _edit_query_message(
+            context, query,
+            _processing_text(intent.trip_type, intent.time, intent.date))
+        await enqueue_purchase(context,
+                               intent.trip_type,
+                               intent.time,
+                               intent.date,
+                               trip_lookup=(intent.schedule_id,
+                                            intent.going_rate))
+        return
+
+    _cancel_auto_confirm(intent.key)
+
+    if intent.action == "cancel":
+        await _edit_query_message(
+            context, query, "❌ *Operación cancelada*\n\n"
+            "No se realizará ninguna compra.")
         return
 
-    _, t_type, t_time, t_date = query.data.split('|')
+    await _edit_query_message(
+        context, query,
+        _processing_text(intent.trip_type, intent.time, intent.date))
+    await enqueue_purchase(context, intent.trip_type, intent.time,
+                           intent.date)
+
+
+async def enqueue_purchase(context: ContextTypes.DEFAULT_TYPE,
+                           t_type: str,
+                           t_time: str,
+                           t_date: str,
+                           trip_lookup=None,
+                           from_watch: bool = False) -> bool:
+    """Encola la compra (primero la salida más próxima). Devuelve si se aceptó"""
+    deadline = _purchase_deadline(t_date, t_time)
+    # Los workers de la cola no heredan el contexto: el span de la compra
+    # cuelga explícitamente del callback (o del tick) que la encoló
+    parent = tracing.current_span()
+    enqueued = time.monotonic()
+
+    async def run():
+        with tracing.span('purchase',
+                          parent=parent,
+                          **{
+                              'trip.type': t_type,
+                              'trip.time': t_time,
+                              'trip.date': t_date,
+                              'purchase.from_watch': from_watch,
+                          }) as current:
+            if current is not None:
+                current.set_attribute(
+                    'queue.wait_ms',
+                    round((time.monotonic() - enqueued) * 1000, 1))
+            outcome = await process_purchase(context, t_type, t_time,
+                                             t_date, trip_lookup, from_watch)
+            tracing.set_attribute('purchase.outcome', outcome)
+            return outcome
+
+    async def expired():
+        console.print(
+            f"[yellow]⌛[/yellow] Compra descartada: [yellow]{t_type}[/yellow] a las [cyan]{t_time}[/cyan] "
+            f"ya no llega a tiempo")
+        await _get_outbox(context).send(
+            Config.TELEGRAM_USER_ID,
+            text=(f"⌛ *Compra descartada*\n\n"
+                  f"⏰ Hora: {t_time}\n"
+                  f"🎫 Tipo: {t_type.capitalize()}\n\n"
+                  f"El plazo para comprar este viaje terminó antes de que le "
+                  f"llegara el turno en la cola."),
+            parse_mode='Markdown')
+        return 'expired'
+
+    queue = _get_purchase_queue()
+    try:
+        queue.submit(deadline.at, run, expired)
+    except asyncio.QueueFull:
+        console.print(
+            f"[red]✗[/red] Cola de compras llena ([magenta]{queue.depth}[/magenta]): "
+            f"rechazada [yellow]{t_type}[/yellow] a las [cyan]{t_time}[/cyan]")
+        await _get_outbox(context).send(
+            Config.TELEGRAM_USER_ID,
+            text=(f"🚦 *Demasiadas compras pendientes*\n\n"
+                  f"⏰ Hora: {t_time}\n"
+                  f"🎫 Tipo: {t_type.capitalize()}\n\n"
+                  f"La cola de compras está llena; inténtalo de nuevo en unos minutos."),
+            parse_mode='Markdown')
+        return False
+
+    console.print(
+        f"[cyan]📥[/cyan] Compra encolada: [yellow]{t_type}[/yellow] a las [cyan]{t_time}[/cyan] "
+        f"(en cola: [magenta]{queue.depth}[/magenta])")
+    return True
+
+
+def _configured_trip(t_type: str, t_time: str, t_date: str):
+    """(schedule_id, going_rate) del ID de viaje configurado si está comprobado, o None"""
+    weekday = datetime.datetime.strptime(t_date, "%Y-%m-%d").weekday()
+    trip_id = Config.get_trip_id(t_type, weekday)
+    # El ID corresponde a la hora configurada de ese día, no a otras
+    if not trip_id or Config.schedule.get(weekday, {}).get(t_type) != t_time:
+        return None
+    check = _get_store().get_trip_check(trip_id)
+    if check is None:
+        return None
+    departure_time, going_rate, valid = check
+    going_rate = Config.HIFE_GOING_RATE or going_rate
+    if not valid or departure_time != t_time or not going_rate:
+        return None
+    console.print(
+        f"[green]✓[/green] Usando ID de viaje configurado: [cyan]{t_time}[/cyan] -> ID: [magenta]{trip_id}[/magenta] "
+        f"(tarifa [dim]{going_rate}[/dim])")
+    return trip_id, going_rate
+
 
-    # Formatear fecha
+def validate_configured_trip(t_type: str, t_time: str, t_date: str) -> bool:
+    """Comprueba el ID de viaje configurado contra el listado y guarda su tarifa.
+
+    Devuelve si el ID sigue correspondiendo a `t_time`. Si no, las compras de
+    ese viaje vuelven a buscarlo en el listado. Es bloqueante (usa la API si el
+    listado en caché no está fresco).
+    """
     trip_date = datetime.datetime.strptime(t_date, "%Y-%m-%d")
-    date_formatted = trip_date.strftime("%d/%m/%Y")
+    trip_id = Config.get_trip_id(t_type, trip_date.weekday())
+    if not trip_id:
+        return False
+    origin, dest = _route_ids(t_type)
+    date_search = trip_date.strftime("%d-%m-%Y")
+    trips = _get_store().get_trips(
+        origin, dest, date_search,
+        Config.TRIPS_CACHE_MAX_AGE_HOURS * 3600) or automator.fetch_trips(
+            origin, dest, date_search)
+    if isinstance(trips, dict):
+        # Error de la API: se mantiene la comprobación anterior
+        return False
 
-    await query.edit_message_text(
-        f"⏳ *Procesando compra...*\n\n"
-        f"📅 Fecha: {date_formatted}\n"
-        f"⏰ Hora: {t_time}\n"
-        f"🎫 Tipo: {t_type.capitalize()}\n\n"
-        f"Por favor, espera un momento...",
-        parse_mode='Markdown')
+    trip = next((t for t in trips if str(t.get('id')) == trip_id), None)
+    valid = trip is not None and trip.get('departure_time') == t_time
+    _get_store().put_trip_check(
+        trip_id,
+        trip.get('departure_time') if trip else None,
+        _resolve_going_rate_from_trip(trip) if trip else None, valid)
+    if not valid:
+        logger.warning(
+            f"El ID de viaje {trip_id} ({t_type}) ya no corresponde a las {t_time} del {t_date}; "
+            f"se buscará el viaje en el listado")
+    return valid
+
+
+async def _validate_configured_trips(days: int):
+    """Comprueba en segundo plano los IDs configurados de hoy y los próximos `days` días"""
+    loop = asyncio.get_running_loop()
+    today = datetime.date.today()
+    schedule = Config.get_schedule()
+    for offset in range(days + 1):
+        day = today + datetime.timedelta(days=offset)
+        for t_type, t_time in schedule.get(day.weekday(), {}).items():
+            if t_time and Config.get_trip_id(t_type, day.weekday()):
+                await loop.run_in_executor(None, validate_configured_trip,
+                                           t_type, t_time,
+                                           day.strftime("%Y-%m-%d"))
+
+
+def _purchase_key(t_type: str, t_time: str, t_date: str) -> str:
+    """Clave de idempotencia de una compra: perfil|fecha|tipo|hora.
+
+    El bot atiende a un único usuario, así que el perfil es su TELEGRAM_USER_ID.
+    """
+    return f"{Config.TELEGRAM_USER_ID}|{t_date}|{t_type}|{t_time}"
+
+
+async def process_purchase(context: ContextTypes.DEFAULT_TYPE,
+                           t_type: str,
+                           t_time: str,
+                           t_date: str,
+                           trip_lookup=None,
+                           from_watch: bool = False) -> str:
+    """Busca el viaje, compra el billete y notifica el resultado por Telegram.
+
+    `trip_lookup` permite pasar un (schedule_id, going_rate) ya resuelto, y
+    `from_watch` indica que la compra la lanza una vigilancia de disponibilidad
+    (en ese caso un fallo no vuelve a armar otra vigilancia).
+
+    Una sola compra por viaje: si ya hay una en curso se espera a su resultado,
+    y si ya se compró (registro persistido) no se vuelve a comprar. Si hay un
+    registro 'pending' reciente que no es de esta ejecución (otro proceso, o
+    una compra interrumpida) el resultado es desconocido: se avisa y no se
+    compra. Si se agota el plazo (salida menos el margen configurado) la
+    compra se abandona.
+    Devuelve 'success', 'failed', 'not_found', 'late', 'unknown' o 'error'.
+    """
+    key = _purchase_key(t_type, t_time, t_date)
+    store = _get_store()
+
+    async def run():
+        blocked_by = store.claim_purchase(key, PURCHASE_PENDING_HOURS * 3600)
+        if blocked_by == 'success':
+            console.print(
+                f"[yellow]⚠[/yellow] Compra repetida ignorada: [yellow]{t_type}[/yellow] a las "
+                f"[cyan]{t_time}[/cyan] del [cyan]{t_date}[/cyan] ya está comprado")
+            await _get_outbox(context).send(
+                Config.TELEGRAM_USER_ID,
+                text=(f"ℹ️ *Billete ya comprado*\n\n"
+                      f"⏰ Hora: {t_time}\n"
+                      f"🎫 Tipo: {t_type.capitalize()}\n\n"
+                      f"No se realizará una segunda compra."),
+                parse_mode='Markdown',
+                coalesce_key=f"already|{key}")
+            return 'success'
+        if blocked_by is not None:
+            console.print(
+                f"[yellow]⚠[/yellow] Compra no repetida: [yellow]{t_type}[/yellow] a las "
+                f"[cyan]{t_time}[/cyan] del [cyan]{t_date}[/cyan] tiene otra compra en curso o interrumpida")
+            await _get_outbox(context).send(
+                Config.TELEGRAM_USER_ID,
+                text=(f"❔ *Compra sin confirmar*\n\n"
+                      f"⏰ Hora: {t_time}\n"
+                      f"🎫 Tipo: {t_type.capitalize()}\n\n"
+                      f"Hay otra compra de este viaje en curso, o una anterior se "
+                      f"interrumpió y no se sabe si llegó a pagarse. Compruébalo "
+                      f"en la app de HIFE; no se realizará otra compra."),
+                parse_mode='Markdown',
+                coalesce_key=f"unknown|{key}")
+            return 'unknown'
 
-    if t_type == "ida":
-        origin = Config.ORIGIN_ID
-        dest = Config.DESTINATION_ID
-    else:
-        origin = Config.DESTINATION_ID
-        dest = Config.ORIGIN_ID
+        try:
+            outcome = await _process_purchase(context, t_type, t_time, t_date,
+                                              trip_lookup, from_watch)
+        except DeadlineExceeded as e:
+            outcome = 'late'
+            await _notify_late(context, t_type, t_time, t_date, e)
+        except Exception:
+            # Un fallo después de pagar no debe borrar el 'success' ya guardado
+            if store.get_purchase(key) != 'success':
+                store.put_purchase(key, 'error')
+            raise
+        store.put_purchase(key, outcome)
+        return outcome
+
+    outcome, shared = await _purchases_in_flight.do(key, run)
+    if shared:
+        console.print(
+            f"[cyan]🔗[/cyan] Compra ya en curso para [yellow]{t_type}[/yellow] a las [cyan]{t_time}[/cyan]: "
+            f"resultado compartido [magenta]{outcome}[/magenta]")
+    return outcome
 
+
+async def _notify_late(context: ContextTypes.DEFAULT_TYPE, t_type: str,
+                       t_time: str, t_date: str, reason: Exception):
+    """Avisa de una compra abandonada porque ya no daba tiempo antes de la salida"""
+    console.print(
+        f"[yellow]⌛[/yellow] Compra abandonada: [yellow]{t_type}[/yellow] a las [cyan]{t_time}[/cyan] "
+        f"del [cyan]{t_date}[/cyan] ({reason})")
+    tracing.set_error(f"DeadlineExceeded: {reason}")
+    margin = Config.PURCHASE_DEADLINE_MARGIN_MINUTES
+    limit = (f"{margin} minutos antes de la salida"
+             if margin > 0 else "la hora de salida")
+    await _get_outbox(context).send(
+        Config.TELEGRAM_USER_ID,
+        text=(f"⌛ *Compra abandonada*\n\n"
+              f"⏰ Hora: {t_time}\n"
+              f"🎫 Tipo: {t_type.capitalize()}\n\n"
+              f"La API de HIFE no respondió a tiempo y la compra no se pudo "
+              f"completar antes de {limit}. Comprueba en la app de HIFE si "
+              f"necesitas comprarlo manualmente."),
+        parse_mode='Markdown',
+        coalesce_key=f"late|{t_type}|{t_time}|{t_date}")
+
+
+async def _process_purchase(context: ContextTypes.DEFAULT_TYPE, t_type: str,
+                            t_time: str, t_date: str, trip_lookup,
+                            from_watch: bool) -> str:
+    origin, dest = _route_ids(t_type)
     date_search = datetime.datetime.strptime(t_date,
                                              "%Y-%m-%d").strftime("%d-%m-%Y")
-    trip_lookup = automator.get_trip_id(origin, dest, date_search, t_time)
+    # Las llamadas a la API son bloqueantes: fuera del event loop, para que un
+    # segundo toque pueda unirse a esta compra mientras está en curso
+    loop = asyncio.get_running_loop()
+    # Un único plazo para búsquedas, compras, reintentos y renovaciones del token
+    deadline = _purchase_deadline(t_date, t_time)
+    find_trip = tracing.bind(
+        functools.partial(automator.get_trip_id, deadline=deadline))
+    quantity = Config.TICKET_QUANTITY
+    buy_ticket = tracing.bind(
+        functools.partial(automator.buy_ticket,
+                          quantity=quantity,
+                          deadline=deadline))
+    fast_path = False
+    if trip_lookup is None:
+        # Atajo: ID de viaje del .env ya comprobado contra el horario
+        trip_lookup = _configured_trip(t_type, t_time, t_date)
+        fast_path = trip_lookup is not None
+    tracing.set_attribute('purchase.fast_path', fast_path)
+    # Listado precalentado: sin red, pero puede tener horas de antigüedad
+    cached = False
+    if trip_lookup is None:
+        trip_lookup = automator.find_cached_trip(origin, dest, date_search,
+                                                 t_time)
+        cached = trip_lookup is not None
+    tracing.set_attribute('trips.cache_hit', cached)
+    if trip_lookup is None:
+        trip_lookup = await loop.run_in_executor(None, find_trip, origin, dest,
+                                                 date_search, t_time, False)
+
+    # Los avisos de error repetidos para el mismo viaje se fusionan en la cola
+    error_key = f"error|{t_type}|{t_time}|{t_date}"
 
     # Formatear fecha para mensajes
     trip_date = datetime.datetime.strptime(t_date, "%Y-%m-%d")
@@ -508,23 +1376,78 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"Ocurrió un error inesperado al buscar el viaje.\n\n"
                 f"Por favor, intenta de nuevo más tarde.")
 
-        await context.bot.send_message(Config.TELEGRAM_USER_ID,
-                                       text=error_message,
-                                       parse_mode='Markdown')
+        await _get_outbox(context).send(Config.TELEGRAM_USER_ID,
+                                        text=error_message,
+                                        parse_mode='Markdown',
+                                        coalesce_key=error_key)
+        return 'error'
     elif trip_lookup:
         # Valid trip: (schedule_id, going_rate)
         schedule_id, going_rate = trip_lookup
-        success = automator.buy_ticket(schedule_id, t_date, t_type, going_rate)
+        success = await loop.run_in_executor(None, buy_ticket, schedule_id,
+                                             t_date, t_type, going_rate)
+        if not success and fast_path:
+            # El ID configurado puede haber dejado de valer: se busca el viaje en
+            # el listado actual y, solo si es otro, se descarta el configurado y
+            # se repite la compra con el encontrado
+            console.print(
+                f"[yellow]⚠[/yellow] Compra fallida con el ID configurado [magenta]{schedule_id}[/magenta]; "
+                f"buscando el viaje en el listado")
+            trip_lookup = await loop.run_in_executor(None, find_trip, origin,
+                                                     dest, date_search, t_time,
+                                                     False)
+            if (isinstance(trip_lookup, tuple) and
+                    str(trip_lookup[0]) != str(schedule_id)):
+                _get_store().put_trip_check(schedule_id, t_time, going_rate,
+                                            False)
+                schedule_id, going_rate = trip_lookup
+                success = await loop.run_in_executor(None, buy_ticket,
+                                                     schedule_id, t_date,
+                                                     t_type, going_rate)
+        elif not success and cached:
+            # El viaje o la tarifa pueden haber cambiado desde el precalentado:
+            # se consulta el listado actual y se reintenta una vez si difiere
+            console.print(
+                f"[yellow]⚠[/yellow] Compra fallida con el viaje en caché [magenta]{schedule_id}[/magenta]; "
+                f"consultando el listado actual")
+            trip_lookup = await loop.run_in_executor(None, find_trip, origin,
+                                                     dest, date_search, t_time,
+                                                     False)
+            if (isinstance(trip_lookup, tuple) and
+                    not _same_trip(trip_lookup, (schedule_id, going_rate))):
+                schedule_id, going_rate = trip_lookup
+                success = await loop.run_in_executor(None, buy_ticket,
+                                                     schedule_id, t_date,
+                                                     t_type, going_rate)
         if success:
-            success_message = (f"✅ *¡Billete comprado con éxito!*\n\n"
+            # Pagado: se registra antes de cualquier aviso, para que un fallo de
+            # Telegram no deje el viaje como pendiente de compra
+            _get_store().put_purchase(_purchase_key(t_type, t_time, t_date),
+                                      'success')
+            if quantity > 1:
+                title = f"¡{quantity} billetes comprados con éxito!"
+                travelers_line = f"👥 *Viajeros:* {quantity}\n"
+                ready = "Tus billetes están listos"
+            else:
+                title = "¡Billete comprado con éxito!"
+                travelers_line = ""
+                ready = "Tu billete está listo"
+            success_message = (f"✅ *{title}*\n\n"
                                f"📅 *Fecha:* {date_formatted}\n"
                                f"⏰ *Hora:* {t_time}\n"
                                f"📍 *Ruta:* {origin_name} → {dest_name}\n"
-                               f"🎫 *Tipo:* {t_type.capitalize()}\n\n"
-                               f"Tu billete está listo. ¡Buen viaje! 🚌")
-            await context.bot.send_message(Config.TELEGRAM_USER_ID,
-                                           text=success_message,
-                                           parse_mode='Markdown')
+                               f"🎫 *Tipo:* {t_type.capitalize()}\n"
+                               f"{travelers_line}\n"
+                               f"{ready}. ¡Buen viaje! 🚌")
+            from telegram.error import TelegramError
+
+            try:
+                await _get_outbox(context).send(Config.TELEGRAM_USER_ID,
+                                                text=success_message,
+                                                parse_mode='Markdown')
+            except TelegramError as e:
+                logger.warning(f"No se pudo enviar el aviso de compra realizada: {e}")
+            return 'success'
         else:
             error_message = (
                 f"⚠️ *Error al procesar la compra*\n\n"
@@ -537,9 +1460,18 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"• Bono expirado\n"
                 f"• Problema temporal con la API\n\n"
                 f"Por favor, intenta comprar manualmente o revisa tu bono.")
-            await context.bot.send_message(Config.TELEGRAM_USER_ID,
-                                           text=error_message,
-                                           parse_mode='Markdown')
+            # Si el listado actual muestra el viaje sin la tarifa del bono (lleno
+            # o agotado), vigilar por si se liberan plazas
+            if not from_watch and await _sold_out(origin, dest, date_search,
+                                                  t_time):
+                if start_availability_watch(context.job_queue, t_type, t_time,
+                                            t_date):
+                    error_message += _WATCHING_NOTE
+            await _get_outbox(context).send(Config.TELEGRAM_USER_ID,
+                                            text=error_message,
+                                            parse_mode='Markdown',
+                                            coalesce_key=error_key)
+            return 'failed'
     else:
         # trip_lookup is None - trip not found
         not_found_message = (
@@ -553,23 +1485,241 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"• Cambios en los horarios de la línea\n"
             f"• El viaje ya no está disponible\n\n"
             f"Por favor, verifica los horarios disponibles.")
-        await context.bot.send_message(Config.TELEGRAM_USER_ID,
-                                       text=not_found_message,
-                                       parse_mode='Markdown')
+        if not from_watch and start_availability_watch(
+                context.job_queue, t_type, t_time, t_date):
+            not_found_message += _WATCHING_NOTE
+
+        # Ofrecer los horarios más cercanos del mismo listado ya descargado
+        reply_markup = None
+        alternatives = automator.find_alternatives(origin, dest, date_search,
+                                                   t_time)
+        if alternatives:
+            not_found_message += "\n\n🔁 *Horarios cercanos disponibles:*"
+            reply_markup = _alternatives_keyboard(alternatives, t_type, t_date)
+
+        await _get_outbox(context).send(Config.TELEGRAM_USER_ID,
+                                        text=not_found_message,
+                                        reply_markup=reply_markup,
+                                        parse_mode='Markdown',
+                                        coalesce_key=error_key)
+        return 'not_found'
+
+
+async def _sold_out(origin, dest, date_search: str, t_time: str) -> bool:
+    """Si el listado actual tiene el viaje de `t_time` pero sin tarifa del bono disponible"""
+    loop = asyncio.get_running_loop()
+    trips = await loop.run_in_executor(None, automator.fetch_trips, origin,
+                                       dest, date_search)
+    if isinstance(trips, dict):
+        return False
+    listed = any(trip.get('departure_time') == t_time for trip in trips)
+    return listed and _available_trip(trips, t_time) is None
+
+
+def _alternatives_keyboard(alternatives: list, t_type: str, t_date: str):
+    """Un botón por horario alternativo, con el viaje y la tarifa ya resueltos"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    # Un solo grupo: elegir una alternativa invalida las demás. El grupo caduca
+    # con la última salida ofrecida (handle_callback descarta las ya salidas)
+    intents = [
+        PurchaseIntent('alt', t_type, alt['departure_time'], t_date,
+                       str(alt['id']), str(alt['going_rate']))
+        for alt in alternatives
+    ]
+    _, tokens = _get_callbacks().register(
+        intents,
+        expires_at=max(
+            _departure_timestamp(t_date, alt['departure_time'])
+            for alt in alternatives))
+
+    keyboard = []
+    for alt, token in zip(alternatives, tokens):
+        label = f"🚌 {alt['departure_time']} ({alt['delta_minutes']:+d} min)"
+        if not alt['rate_available']:
+            label += " ⚠️ sin tarifa de bono"
+        keyboard.append([InlineKeyboardButton(label, callback_data=token)])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def _route_ids(t_type: str):
+    """(origen, destino) de la API para 'ida' o 'vuelta'"""
+    if t_type == "ida":
+        return Config.ORIGIN_ID, Config.DESTINATION_ID
+    return Config.DESTINATION_ID, Config.ORIGIN_ID
+
+
+_WATCHING_NOTE = ("\n\n👀 *Vigilando disponibilidad:* te avisaré en cuanto el "
+                  "viaje esté disponible (hasta la hora de salida).")
+
+
+def _get_watch_budget() -> RequestBudget:
+    global _watch_budget
+    if _watch_budget is None:
+        _watch_budget = RequestBudget(Config.WATCH_REQUESTS_PER_MINUTE)
+    return _watch_budget
+
+
+def start_availability_watch(job_queue, t_type: str, t_time: str,
+                             t_date: str) -> bool:
+    """Arma una vigilancia de disponibilidad (si está activada). Devuelve si queda activa"""
+    if not Config.AVAILABILITY_WATCH or job_queue is None:
+        return False
+
+    key = f"{t_type}|{t_time}|{t_date}"
+    if key in _active_watches:
+        return True
+
+    departure = datetime.datetime.strptime(f"{t_date} {t_time}",
+                                           "%Y-%m-%d %H:%M")
+    remaining = (departure - datetime.datetime.now()).total_seconds()
+    if remaining <= 0:
+        return False
+
+    data = {
+        'key': key,
+        'type': t_type,
+        'time': t_time,
+        'date': t_date,
+        'departure': departure
+    }
+    _schedule_watch_tick(job_queue, data, remaining)
+    console.print(
+        f"[cyan]👀[/cyan] Vigilando disponibilidad de [yellow]{t_type}[/yellow] a las [cyan]{t_time}[/cyan] "
+        f"del [cyan]{t_date}[/cyan]")
+    return True
+
+
+def _schedule_watch_tick(job_queue, data: dict, seconds_to_departure: float,
+                         delay: float = None):
+    if delay is None:
+        delay = next_poll_interval(seconds_to_departure,
+                                   Config.WATCH_MIN_INTERVAL_SECONDS,
+                                   Config.WATCH_MAX_INTERVAL_SECONDS)
+    # Nunca sondear después de la salida
+    delay = min(delay, seconds_to_departure)
+    _active_watches[data['key']] = job_queue.run_once(
+        _availability_watch_tick,
+        when=delay,
+        data=data,
+        name=f"watch|{data['key']}")
+
+
+async def _availability_watch_tick(context: ContextTypes.DEFAULT_TYPE):
+    """Sondeo de una vigilancia: compra/avisa si el viaje aparece, si no reprograma"""
+    data = context.job.data
+    remaining = (data['departure'] - datetime.datetime.now()).total_seconds()
+
+    if remaining <= 0:
+        _active_watches.pop(data['key'], None)
+        console.print(
+            f"[yellow]⌛[/yellow] Vigilancia finalizada sin disponibilidad: [yellow]{data['type']}[/yellow] "
+            f"a las [cyan]{data['time']}[/cyan]")
+        await _get_outbox(context).send(
+            Config.TELEGRAM_USER_ID,
+            text=(f"⌛ *Vigilancia finalizada*\n\n"
+                  f"⏰ Hora: {data['time']}\n"
+                  f"🎫 Tipo: {data['type'].capitalize()}\n\n"
+                  f"El viaje no llegó a estar disponible antes de la salida."),
+            parse_mode='Markdown')
+        return
+
+    budget = _get_watch_budget()
+    if not budget.try_acquire():
+        # Presupuesto compartido agotado: esperar al siguiente token
+        _schedule_watch_tick(context.job_queue, data, remaining,
+                             budget.wait_time())
+        return
+
+    origin, dest = _route_ids(data['type'])
+    date_search = datetime.datetime.strptime(data['date'],
+                                             "%Y-%m-%d").strftime("%d-%m-%Y")
+    # La consulta es bloqueante: se ejecuta fuera del event loop
+    loop = asyncio.get_running_loop()
+    # Sin caché: interesa el estado actual del viaje, no el precalentado
+    trips = await loop.run_in_executor(None, automator.fetch_trips, origin,
+                                       dest, date_search)
+    trip_lookup = None if isinstance(trips, dict) else _available_trip(
+        trips, data['time'])
+
+    if trip_lookup is None:
+        # Sigue sin estar disponible (o error transitorio): volver a sondear
+        remaining = (data['departure'] -
+                     datetime.datetime.now()).total_seconds()
+        _schedule_watch_tick(context.job_queue, data, max(0, remaining))
+        return
+
+    _active_watches.pop(data['key'], None)
+    console.print(
+        f"[green]🎉[/green] Viaje disponible: [yellow]{data['type']}[/yellow] a las [cyan]{data['time']}[/cyan]"
+    )
+    if Config.WATCH_ACTION == 'buy':
+        from telegram.error import TelegramError
+
+        try:
+            await _get_outbox(context).send(
+                Config.TELEGRAM_USER_ID,
+                text=_processing_text(data['type'], data['time'], data['date']),
+                parse_mode='Markdown')
+        except TelegramError as e:
+            # La vigilancia ya terminó: el aviso no puede impedir la compra
+            logger.warning(f"No se pudo enviar el aviso de compra: {e}")
+        await enqueue_purchase(context,
+                               data['type'],
+                               data['time'],
+                               data['date'],
+                               trip_lookup=trip_lookup,
+                               from_watch=True)
+    else:
+        context.job_queue.run_once(ask_confirmation,
+                                   when=0,
+                                   data={
+                                       'type': data['type'],
+                                       'time': data['time'],
+                                       'date': data['date']
+                                   })
+
+
+async def trips_warmup_job(context: ContextTypes.DEFAULT_TYPE):
+    """Tarea nocturna: precalienta los listados de viajes de los próximos días"""
+    console.print(
+        f"[cyan]🌙[/cyan] Precalentando viajes de los próximos [magenta]{Config.WARMUP_DAYS}[/magenta] días..."
+    )
+    loop = asyncio.get_running_loop()
+    summary = await loop.run_in_executor(
+        None, lambda: warm_trips_cache(automator, _get_store(),
+                                       Config.get_schedule(), _route_ids,
+                                       Config.WARMUP_DAYS,
+                                       Config.WARMUP_CONCURRENCY))
+    console.print(
+        f"[green]✓[/green] Precalentado completado: [magenta]{summary['fetched']}[/magenta] listados, "
+        f"[red]{summary['errors']}[/red] errores, [yellow]{len(summary['changes'])}[/yellow] cambios de horario"
+    )
+    for change in summary['changes']:
+        console.print(f"[yellow]⚠[/yellow] {change}")
+
+    # Con los listados recién descargados, comprobar los IDs configurados
+    await _validate_configured_trips(Config.WARMUP_DAYS)
+
+    _get_store().purge_purchases_before(
+        (datetime.datetime.now() -
+         datetime.timedelta(days=PURCHASE_RECORD_DAYS)).timestamp())
 
 
 def check_immediate_notification(app):
     """Verifica si estamos dentro de la ventana de 2 horas y pregunta inmediatamente"""
     now = datetime.datetime.now()
     weekday = now.weekday()
-    schedule = Config.get_schedule()
+    # Un único snapshot por pasada: horario y antelación siempre coherentes
+    cfg = current_config()
+    schedule = cfg.schedule
 
     if weekday not in schedule:
         return False
 
     times = schedule[weekday]
     buy_date_str = now.strftime("%Y-%m-%d")
-    advance_minutes = Config.NOTIFICATION_ADVANCE_MINUTES
+    advance_minutes = cfg.NOTIFICATION_ADVANCE_MINUTES
 
     for trip_type in ['ida', 'vuelta']:
         if trip_type not in times:
@@ -603,10 +1753,14 @@ def check_immediate_notification(app):
     return False
 
 
-def schedule_checker(app):
+@profiled('schedule_checker')
+async def schedule_checker(context: ContextTypes.DEFAULT_TYPE):
+    """Job periódico del JobQueue: arma las notificaciones que entran en ventana"""
     now = datetime.datetime.now()
     weekday = now.weekday()
-    schedule = Config.get_schedule()
+    # Un único snapshot por pasada: horario y antelación siempre coherentes
+    cfg = current_config()
+    schedule = cfg.schedule
 
     if weekday not in schedule:
         return
@@ -614,7 +1768,7 @@ def schedule_checker(app):
     times = schedule[weekday]
     buy_date_str = now.strftime("%Y-%m-%d")
 
-    advance_minutes = Config.NOTIFICATION_ADVANCE_MINUTES
+    advance_minutes = cfg.NOTIFICATION_ADVANCE_MINUTES
     window_start = advance_minutes - 5
     window_end = advance_minutes + 5
 
@@ -636,34 +1790,187 @@ def schedule_checker(app):
             console.print(
                 f"[cyan]🔔[/cyan] Notificando sobre viaje [yellow]{trip_type}[/yellow] a las [cyan]{time_value}[/cyan] "
                 f"(faltan [magenta]{diff_minutes:.1f}[/magenta] minutos)")
-            app.job_queue.run_once(ask_confirmation,
-                                   when=0,
-                                   data={
-                                       'type': trip_type,
-                                       'time': time_value,
-                                       'date': buy_date_str
-                                   })
+            context.job_queue.run_once(ask_confirmation,
+                                       when=0,
+                                       data={
+                                           'type': trip_type,
+                                           'time': time_value,
+                                           'date': buy_date_str
+                                       })
+
+
+def setup_logging():
+    """Configura logging con Rich, o texto plano en modo service (se llama al arrancar, no al importar)"""
+    if Config.RUN_MODE == 'service':
+        # Sin rich: texto plano con fecha, apto para archivos y journald
+        handler = logging.StreamHandler()
+        handler.setFormatter(
+            logging.Formatter(
+                "%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        from rich.logging import RichHandler
+
+        handler = RichHandler(rich_tracebacks=True,
+                              show_path=False,
+                              markup=True)
+        handler.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+
+    # Los handlers (y la consola) escriben desde un hilo propio: registrar un
+    # mensaje durante una compra solo lo encola (ver logqueue.py)
+    start_logging(handler, json_path=Config.LOG_JSON_FILE or None)
+
+
+def _remove_jobs(job_queue, name: str):
+    for job in job_queue.get_jobs_by_name(name):
+        job.schedule_removal()
+
+
+def _arm_schedule_checker(job_queue):
+    _remove_jobs(job_queue, 'schedule_checker')
+    check_interval = Config.CHECK_INTERVAL_MINUTES
+    job_queue.run_repeating(schedule_checker,
+                            interval=check_interval * 60,
+                            first=check_interval * 60,
+                            name='schedule_checker')
+
+
+def _arm_trips_warmup(job_queue):
+    _remove_jobs(job_queue, 'trips_warmup')
+    if Config.WARMUP_DAYS <= 0:
+        return
+    warmup_time = datetime.datetime.strptime(Config.WARMUP_TIME,
+                                             "%H:%M").time()
+    # PTB usa UTC para horas sin zona
+    job_queue.run_daily(trips_warmup_job,
+                        time=warmup_time.replace(tzinfo=_local_zone()),
+                        name='trips_warmup')
+
+
+def _local_zone() -> datetime.tzinfo:
+    """Zona horaria local con sus cambios de hora (no un desfase fijo).
+
+    TIMEZONE, si no TZ o el enlace /etc/localtime. Si no se puede resolver, el
+    desfase actual: tras un cambio de hora la tarea se desplazaría una hora.
+    """
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+    name = Config.TIMEZONE or os.environ.get('TZ', '').lstrip(':')
+    if not name:
+        target = os.path.realpath('/etc/localtime')
+        if '/zoneinfo/' in target:
+            name = target.split('/zoneinfo/', 1)[1]
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Zona horaria desconocida '{name}'; se usa el desfase actual")
+    return datetime.datetime.now().astimezone().tzinfo
+
+
+def _install_dns_cache():
+    if Config.DNS_CACHE_SECONDS > 0:
+        install_dns_cache([urlparse(Config.HIFE_API_URL).hostname],
+                          Config.DNS_CACHE_SECONDS)
+    else:
+        uninstall_dns_cache()
+
+
+def _env_file_signature():
+    try:
+        stat = os.stat(ENV_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _arm_config_watch(job_queue):
+    _remove_jobs(job_queue, 'config_watch')
+    if Config.CONFIG_WATCH_SECONDS <= 0:
+        return
+    job_queue.run_repeating(config_watch_job,
+                            interval=Config.CONFIG_WATCH_SECONDS,
+                            first=Config.CONFIG_WATCH_SECONDS,
+                            data={'signature': _env_file_signature()},
+                            name='config_watch')
+
+
+# Qué hay que rearmar cuando cambia cada opción del .env
+_REARM_ON_CHANGE = {
+    'CHECK_INTERVAL_MINUTES': _arm_schedule_checker,
+    'WARMUP_TIME': _arm_trips_warmup,
+    'TIMEZONE': _arm_trips_warmup,
+    'WARMUP_DAYS': _arm_trips_warmup,
+    'CONFIG_WATCH_SECONDS': _arm_config_watch,
+}
+
+
+async def config_watch_job(context: ContextTypes.DEFAULT_TYPE):
+    """Detecta cambios en el .env (por mtime) y aplica la nueva configuración en caliente"""
+    global _watch_budget, _store, _callbacks, _purchase_queue
+    signature = _env_file_signature()
+    if signature is None or signature == context.job.data['signature']:
+        return
+    context.job.data['signature'] = signature
+
+    is_valid, errors, changed = reload_config()
+    if not is_valid:
+        console.print(
+            "[red]✗[/red] .env modificado pero no es válido; se mantiene la configuración anterior:"
+        )
+        for error in errors:
+            console.print(f"  [red]✗[/red] {error}")
+        return
+    if not changed:
+        return
+
+    console.print(
+        f"[green]🔄[/green] Configuración recargada: [cyan]{', '.join(sorted(changed))}[/cyan]"
+    )
+
+    if changed & {'HIFE_API_URL', 'DNS_CACHE_SECONDS'}:
+        _install_dns_cache()
+    if changed & {'HEDGE_PERCENTILE', 'HEDGE_MAX_PERCENT'}:
+        automator.configure_hedging()
+    if 'WATCH_REQUESTS_PER_MINUTE' in changed:
+        _watch_budget = None
+    if 'STORE_PATH' in changed:
+        _store = None
+    if changed & {'STORE_PATH', 'CALLBACK_TTL_HOURS'}:
+        _callbacks = None
+    if changed & {'PURCHASE_WORKERS', 'PURCHASE_QUEUE_SIZE'}:
+        if _purchase_queue is None or _purchase_queue.depth == 0:
+            if _purchase_queue is not None:
+                await _purchase_queue.stop()
+            _purchase_queue = None
+        else:
+            console.print(
+                "[yellow]⚠[/yellow] Hay compras en cola: el nuevo tamaño de la cola se aplicará al reiniciar"
+            )
+    if 'TELEGRAM_TOKEN' in changed:
+        console.print(
+            "[yellow]⚠[/yellow] TELEGRAM_TOKEN ha cambiado: reinicia el bot para aplicarlo"
+        )
+
+    # Rearmar solo los jobs afectados (cada uno una vez)
+    for arm in {_REARM_ON_CHANGE[key] for key in changed & _REARM_ON_CHANGE.keys()}:
+        arm(context.job_queue)
 
 
 def show_startup_banner():
     """Muestra un banner de inicio con información de configuración"""
     schedule = Config.get_schedule()
 
-    # Crear tabla con información de configuración
-    config_table = Table(show_header=False, box=None, padding=(0, 1))
-    config_table.add_column(style="cyan", width=25)
-    config_table.add_column(style="green")
-
-    config_table.add_row("📱 Notificaciones a:", Config.TELEGRAM_USER_ID)
     origin_display = f"{Config.ORIGIN_NAME} (ID: {Config.ORIGIN_ID})" if Config.ORIGIN_NAME else f"ID: {Config.ORIGIN_ID}"
-    config_table.add_row("🚉 Estación Origen:", origin_display)
     dest_display = f"{Config.DESTINATION_NAME} (ID: {Config.DESTINATION_ID})" if Config.DESTINATION_NAME else f"ID: {Config.DESTINATION_ID}"
-    config_table.add_row("🚉 Estación Destino:", dest_display)
-    config_table.add_row("🎫 Bono ID:", Config.BONUS_ID)
-    config_table.add_row("⏰ Intervalo de revisión:",
-                         f"{Config.CHECK_INTERVAL_MINUTES} minutos")
-    config_table.add_row("🔔 Antelación notificación:",
-                         f"{Config.NOTIFICATION_ADVANCE_MINUTES} minutos")
+    rows = [
+        ("📱 Notificaciones a:", Config.TELEGRAM_USER_ID),
+        ("🚉 Estación Origen:", origin_display),
+        ("🚉 Estación Destino:", dest_display),
+        ("🎫 Bono ID:", Config.BONUS_ID),
+        ("⏰ Intervalo de revisión:", f"{Config.CHECK_INTERVAL_MINUTES} minutos"),
+        ("🔔 Antelación notificación:",
+         f"{Config.NOTIFICATION_ADVANCE_MINUTES} minutos"),
+    ]
 
     # Mostrar horarios configurados
     day_names = {
@@ -682,6 +1989,24 @@ def show_startup_banner():
             vuelta_time = times.get('vuelta') or 'N/A'
             schedule_text += f"\n[cyan]{day_name}:[/cyan] Ida: [yellow]{ida_time}[/yellow] | Vuelta: [yellow]{vuelta_time}[/yellow]"
 
+    if Config.RUN_MODE == 'service':
+        # Las mismas líneas en texto plano, sin importar rich
+        console.print("🤖 HIFE Bot está en marcha")
+        for label, value in rows:
+            console.print(f"{label} {value}")
+        console.print(f"📅 Horarios configurados:{schedule_text}")
+        return
+
+    from rich.panel import Panel
+    from rich.table import Table
+
+    # Crear tabla con información de configuración
+    config_table = Table(show_header=False, box=None, padding=(0, 1))
+    config_table.add_column(style="cyan", width=25)
+    config_table.add_column(style="green")
+    for label, value in rows:
+        config_table.add_row(label, value)
+
     console.print()
     console.print(
         Panel.fit(f"[bold cyan]🤖 HIFE Bot está en marcha[/bold cyan]",
@@ -695,8 +2020,16 @@ def show_startup_banner():
 
 
 def main():
+    setup_logging()
+
     is_valid, errors = Config.validate()
+    if not is_valid and Config.RUN_MODE == 'service':
+        for error in errors:
+            logger.error(f"Error en la configuración: {error}")
+        return
     if not is_valid:
+        from rich.panel import Panel
+
         console.print()
         error_panel = Panel("\n".join(
             [f"[red]✗[/red] {error}" for error in errors]),
@@ -715,37 +2048,75 @@ def main():
 
     console.print("[green]✅ Configuración validada correctamente[/green]")
 
+    _install_dns_cache()
+
+    from telegram.ext import Application, CallbackQueryHandler
+
     # Función que se ejecuta después de que la aplicación se inicializa
     async def post_init(app: Application) -> None:
+        if Config.RUN_MODE == 'service':
+            # El executor por defecto crearía hasta cpu+4 hilos; basta con uno
+            # por worker de compras y otro para validaciones y precalentado
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=Config.PURCHASE_WORKERS + 1,
+                                   thread_name_prefix='bot'))
+        global _loop_monitor
+        if Config.LOOP_LAG_WARN_MS > 0:
+            _loop_monitor = LoopMonitor(Config.LOOP_LAG_WARN_MS,
+                                        Config.LOOP_STALL_SECONDS,
+                                        Config.HEARTBEAT_FILE,
+                                        Config.HEALTH_PORT)
+            _loop_monitor.start()
         # Pequeño delay para asegurar que todo esté listo
         await asyncio.sleep(2)
         # Verificar si estamos dentro de la ventana de 2 horas al iniciar
         immediate_notification = check_immediate_notification(app)
+        # IDs de viaje del .env: comprobarlos para hoy y mañana sin bloquear
+        app.create_task(_validate_configured_trips(1))
         if immediate_notification:
             console.print(
                 "[cyan]⏰[/cyan] Notificación inmediata enviada - esperando respuesta del usuario..."
             )
 
+    async def post_shutdown(app: Application) -> None:
+        if _loop_monitor is not None:
+            await _loop_monitor.stop()
+        if _purchase_queue is not None:
+            await _purchase_queue.stop()
+        if _outbox is not None:
+            await _outbox.stop()
+        # Los últimos spans (compras interrumpidas incluidas) no se pierden
+        tracing.flush()
+
     # Usar post_init como callback del builder
-    application = Application.builder().token(
-        Config.TELEGRAM_TOKEN).post_init(post_init).build()
+    builder = Application.builder().token(
+        Config.TELEGRAM_TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+    if Config.RUN_MODE == 'service':
+        builder = builder.connection_pool_size(SERVICE_TELEGRAM_POOL_SIZE)
+    application = builder.build()
     application.add_handler(CallbackQueryHandler(handle_callback))
 
-    scheduler = BackgroundScheduler()
-    check_interval = Config.CHECK_INTERVAL_MINUTES
-    scheduler.add_job(lambda: schedule_checker(application),
-                      'interval',
-                      minutes=check_interval)
-    scheduler.start()
+    if application.job_queue is None:
+        console.print(
+            "[red]✗[/red] JobQueue no disponible. Instala las dependencias con: "
+            "[cyan]pip install \"python-telegram-bot[job-queue]\"[/cyan]")
+        return
+
+    # Todo el trabajo periódico corre en el JobQueue asyncio de PTB, dentro del
+    # mismo event loop que los handlers: sin hilos extra ni llamadas cruzadas.
+    _arm_schedule_checker(application.job_queue)
+    _arm_trips_warmup(application.job_queue)
+    _arm_config_watch(application.job_queue)
 
     console.print(
-        f"[cyan]🤖[/cyan] Bot iniciado - Revisando horarios cada [magenta]{check_interval}[/magenta] minutos"
+        f"[cyan]🤖[/cyan] Bot iniciado - Revisando horarios cada [magenta]{Config.CHECK_INTERVAL_MINUTES}[/magenta] minutos"
     )
 
     # Mostrar banner de inicio
     show_startup_banner()
 
     application.run_polling()
+    stop_logging()
 
 
 if __name__ == '__main__':
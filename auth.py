@@ -1,12 +1,13 @@
 import requests
 import logging
-from rich.console import Console
+from lazy import service_console
+from logqueue import QueuedConsole
 
-console = Console()
+console = QueuedConsole(service_console())
 logger = logging.getLogger(__name__)
 
 
-def get_hife_token(email, password, client_secret=None):
+def get_hife_token(email, password, client_secret=None, timeout=15):
     """
     Obtiene un nuevo token JWT de la API de HIFE.
     """
@@ -33,7 +34,7 @@ def get_hife_token(email, password, client_secret=None):
         response = requests.post('https://middleware.hife.es/oauth/token',
                                  headers=headers,
                                  json=data,
-                                 timeout=15)
+                                 timeout=timeout)
         response.raise_for_status()
         result = response.json()
 
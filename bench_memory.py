@@ -0,0 +1,281 @@
+"""
+HIFE BOT - Benchmark de memoria
+
+Simula una semana de revisiones del horario (`schedule_checker` cada
+CHECK_INTERVAL_MINUTES, con las notificaciones que dispara) adelantando el
+reloj, sin red ni Telegram, y mide el RSS del proceso y las reservas de
+tracemalloc. Cada modo (RUN_MODE) se mide en un proceso nuevo. Falla (código
+de salida 1) si la memoria crece durante la semana más de lo permitido o si el
+RSS final del modo service supera su presupuesto.
+
+Uso:
+    python bench_memory.py                   # modos service e interactive
+    python bench_memory.py --mode service    # solo uno
+    python bench_memory.py --days 14         # más días simulados
+    MEMORY_BUDGET_MB=60 python bench_memory.py
+
+El crecimiento se mide desde el final del primer día simulado, cuando los
+imports diferidos (telegram) y las cachés ya están cargados.
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
+import types
+
+# RSS final (MB) del modo service y crecimiento (KiB) tras el primer día
+DEFAULT_RSS_BUDGET_MB = 80
+DEFAULT_GROWTH_BUDGET_KB = 512
+
+MODES = ('service', 'interactive')
+
+# Líneas del informe de tracemalloc con mayor crecimiento
+TOP_GROWTH = 5
+
+
+def rss_kb() -> int:
+	"""RSS actual del proceso (KiB); en sistemas sin /proc, el máximo alcanzado"""
+	try:
+		with open('/proc/self/status') as f:
+			for line in f:
+				if line.startswith('VmRSS:'):
+					return int(line.split()[1])
+	except OSError:
+		pass
+	import resource
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# macOS lo da en bytes, Linux en KiB
+	return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _isolated_env(mode: str, workdir: str) -> dict:
+	"""Entorno del proceso hijo: horario fijo, sin IDs de viaje ni diagnósticos"""
+	env = dict(os.environ)
+	env.update({
+	    'RUN_MODE': mode,
+	    'TELEGRAM_USER_ID': '1',
+	    'STORE_PATH': os.path.join(workdir, 'bench.db'),
+	    'OUTWARD_TIME_DEFAULT': '08:00',
+	    'RETURN_TIME_DEFAULT': '15:00',
+	    'AUTO_CONFIRM_MINUTES': '0',
+	    'OUTWARD_AUTO_CONFIRM_MINUTES': '',
+	    'RETURN_AUTO_CONFIRM_MINUTES': '',
+	    'DNS_CACHE_SECONDS': '0',
+	    'HTTP_CASSETTE_MODE': '',
+	    'PROFILE_MODE': '',
+	    'TRACING': '',
+	})
+	for trip_type in ('OUTWARD', 'RETURN'):
+		for day in ('DEFAULT', 'MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY',
+		            'FRIDAY'):
+			env[f'{trip_type}_TRIP_ID_{day}'] = ''
+	return env
+
+
+class _Job:
+
+	def __init__(self, callback, data, name):
+		self.callback = callback
+		self.data = data
+		self.name = name
+
+	def schedule_removal(self):
+		pass
+
+
+class _JobQueue:
+	"""JobQueue mínimo: los run_once inmediatos se ejecutan tras cada revisión"""
+
+	def __init__(self):
+		self.due = []
+		self.repeating = {}
+
+	def run_once(self, callback, when, data=None, name=None):
+		job = _Job(callback, data, name)
+		if not when:
+			self.due.append(job)
+		return job
+
+	def run_repeating(self, callback, interval, first=None, data=None,
+	                  name=None):
+		job = _Job(callback, data, name)
+		self.repeating[name] = job
+		return job
+
+	def get_jobs_by_name(self, name):
+		job = self.repeating.get(name)
+		return [job] if job else []
+
+
+class _Bot:
+
+	def __init__(self):
+		self.sent = 0
+
+	async def send_message(self, **kwargs):
+		self.sent += 1
+		return types.SimpleNamespace(message_id=self.sent)
+
+	async def edit_message_text(self, **kwargs):
+		return True
+
+
+def _frozen_datetime(module, clock: list):
+	"""Copia del módulo datetime cuyo datetime.now() devuelve clock[0]"""
+
+	class FrozenDatetime(datetime.datetime):
+
+		@classmethod
+		def now(cls, tz=None):
+			return clock[0]
+
+	namespace = types.SimpleNamespace(**{
+	    name: getattr(module, name)
+	    for name in dir(module) if not name.startswith('_')
+	})
+	namespace.datetime = FrozenDatetime
+	return namespace
+
+
+async def _simulate(days: int) -> dict:
+	import androidapi
+	from outbox import Outbox
+
+	androidapi.setup_logging()
+	baseline_kb = rss_kb()
+
+	# Desde el próximo lunes a las 00:00
+	today = datetime.date.today()
+	start = datetime.datetime.combine(
+	    today + datetime.timedelta(days=7 - today.weekday()), datetime.time(0, 0))
+	clock = [start]
+	androidapi.datetime = _frozen_datetime(datetime, clock)
+
+	bot = _Bot()
+	job_queue = _JobQueue()
+	context = types.SimpleNamespace(bot=bot, job_queue=job_queue, job=None)
+	# Sin la pausa de 1 s por chat: la semana se simula en segundos
+	androidapi._outbox = Outbox(bot, per_chat_interval=0)
+
+	interval = datetime.timedelta(
+	    minutes=androidapi.Config.CHECK_INTERVAL_MINUTES)
+	ticks_per_day = int(datetime.timedelta(days=1) / interval)
+	samples = []
+	snapshot = None
+	ticks = 0
+	for day in range(days):
+		for _ in range(ticks_per_day):
+			clock[0] += interval
+			await androidapi.schedule_checker(context)
+			ticks += 1
+			while job_queue.due:
+				context.job = job_queue.due.pop(0)
+				await context.job.callback(context)
+		# Que la cola de salida entregue lo pendiente antes de medir
+		await asyncio.sleep(0)
+		gc.collect()
+		if day == 0:
+			tracemalloc.start()
+			snapshot = tracemalloc.take_snapshot()
+		samples.append({
+		    'rss_kb': rss_kb(),
+		    'traced_kb': tracemalloc.get_traced_memory()[0] // 1024
+		})
+
+	growth = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+	traced_peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+	tracemalloc.stop()
+	await androidapi._outbox.stop()
+	# La salida encolada del bot, antes de la línea con el resultado
+	androidapi.stop_logging()
+
+	return {
+	    'ticks': ticks,
+	    'notifications': bot.sent,
+	    'threads': threading.active_count(),
+	    'rich_loaded': 'rich' in sys.modules,
+	    'baseline_kb': baseline_kb,
+	    'rss_kb': samples[-1]['rss_kb'],
+	    'rss_growth_kb': samples[-1]['rss_kb'] - samples[0]['rss_kb'],
+	    'traced_growth_kb': samples[-1]['traced_kb'] - samples[0]['traced_kb'],
+	    'traced_peak_kb': traced_peak_kb,
+	    'top_growth': [str(stat) for stat in growth[:TOP_GROWTH]],
+	}
+
+
+def run_child(days: int) -> int:
+	result = asyncio.run(_simulate(days))
+	# Última línea de la salida: el resultado (antes va lo que imprima el bot)
+	print(json.dumps(result))
+	return 0
+
+
+def measure(mode: str, days: int) -> dict:
+	with tempfile.TemporaryDirectory() as workdir:
+		result = subprocess.run(
+		    [sys.executable,
+		     os.path.abspath(__file__), '--child', '--days',
+		     str(days)],
+		    capture_output=True,
+		    text=True,
+		    cwd=os.path.dirname(os.path.abspath(__file__)),
+		    env=_isolated_env(mode, workdir))
+	if result.returncode != 0:
+		raise RuntimeError(f"Falló la simulación en modo {mode}:\n{result.stderr}")
+	return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+	parser.add_argument('--mode', choices=MODES, action='append')
+	parser.add_argument('--days', type=int, default=7)
+	parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	days = max(2, args.days)
+
+	if args.child:
+		return run_child(days)
+
+	rss_budget_kb = float(os.getenv('MEMORY_BUDGET_MB',
+	                                DEFAULT_RSS_BUDGET_MB)) * 1024
+	growth_budget_kb = float(
+	    os.getenv('MEMORY_GROWTH_BUDGET_KB', DEFAULT_GROWTH_BUDGET_KB))
+	failures = []
+
+	for mode in args.mode or MODES:
+		r = measure(mode, days)
+		print(f"{mode:<12} RSS inicial {r['baseline_kb'] / 1024:6.1f} MB  "
+		      f"final {r['rss_kb'] / 1024:6.1f} MB  "
+		      f"crecimiento RSS {r['rss_growth_kb']:+6d} KiB  "
+		      f"tracemalloc {r['traced_growth_kb']:+5d} KiB "
+		      f"(pico {r['traced_peak_kb']} KiB)  hilos {r['threads']}  "
+		      f"{r['ticks']} revisiones, {r['notifications']} avisos")
+		if r['traced_growth_kb'] > growth_budget_kb:
+			failures.append(
+			    f"{mode}: la memoria crece {r['traced_growth_kb']} KiB en "
+			    f"{days - 1} días (presupuesto {growth_budget_kb:.0f} KiB)")
+			failures.extend(f"    {line}" for line in r['top_growth'])
+		if mode == 'service':
+			if r['rss_kb'] > rss_budget_kb:
+				failures.append(f"service: RSS final {r['rss_kb'] / 1024:.1f} MB > "
+				                f"{rss_budget_kb / 1024:.0f} MB")
+			if r['rich_loaded']:
+				failures.append("service: se ha importado rich")
+
+	if failures:
+		print()
+		for failure in failures:
+			print(f"✗ {failure}")
+		return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
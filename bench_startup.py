@@ -0,0 +1,93 @@
+"""
+HIFE BOT - Benchmark de tiempo de arranque
+
+Mide el coste de importar los módulos del bot con `python -X importtime` y
+falla (código de salida 1) si alguno supera su presupuesto o si arrastra
+dependencias pesadas que deberían cargarse de forma diferida.
+
+Uso:
+    python bench_startup.py                # presupuestos por defecto
+    python bench_startup.py --runs 7       # más repeticiones (mediana)
+    STARTUP_BUDGET_MS=400 python bench_startup.py
+
+Pensado para ejecutarse en la propia placa antes de desplegar: los
+presupuestos por defecto tienen margen para una Raspberry Pi o similar.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Presupuesto (ms) del import acumulado de cada módulo
+DEFAULT_BUDGETS_MS = {
+    'config': 150,
+    'auth': 600,
+    'androidapi': 800,
+    'setup_wizard': 800,
+    'cli': 100,
+}
+
+# Módulos que no deben importarse al cargar los módulos anteriores
+HEAVY_MODULES = ('telegram', 'apscheduler', 'rich', 'questionary')
+
+
+def measure_import(module: str) -> tuple:
+	"""Importa `module` en un proceso nuevo y devuelve (ms acumulados, módulos pesados cargados)"""
+	probe = (f"import sys, {module}; "
+	         f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+	result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe],
+	                        capture_output=True,
+	                        text=True,
+	                        cwd=os.path.dirname(os.path.abspath(__file__)))
+	if result.returncode != 0:
+		raise RuntimeError(f"No se pudo importar {module}:\n{result.stderr}")
+
+	cumulative_us = None
+	for line in result.stderr.splitlines():
+		# Formato: "import time: self [us] | cumulative | imported package"
+		parts = [p.strip() for p in line.split('|')]
+		if len(parts) == 3 and parts[2] == module:
+			cumulative_us = int(parts[1])
+	if cumulative_us is None:
+		raise RuntimeError(f"No se encontró {module} en la salida de importtime")
+
+	loaded = [m for m in result.stdout.strip().split(',') if m]
+	return cumulative_us / 1000, loaded
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+	parser.add_argument('--runs', type=int, default=5)
+	parser.add_argument('modules', nargs='*', default=list(DEFAULT_BUDGETS_MS))
+	args = parser.parse_args()
+
+	global_budget = os.getenv('STARTUP_BUDGET_MS')
+	failures = []
+
+	for module in args.modules:
+		budget = float(global_budget) if global_budget else DEFAULT_BUDGETS_MS.get(
+		    module, 800)
+		samples = []
+		loaded = []
+		for _ in range(args.runs):
+			ms, loaded = measure_import(module)
+			samples.append(ms)
+		median = statistics.median(samples)
+		status = 'OK' if median <= budget and not loaded else 'FALLO'
+		print(f"{module:<14} {median:8.1f} ms  (presupuesto {budget:.0f} ms)  {status}")
+		if median > budget:
+			failures.append(f"{module}: {median:.1f} ms > {budget:.0f} ms")
+		if loaded:
+			failures.append(f"{module}: importa en el arranque {', '.join(loaded)}")
+
+	if failures:
+		print()
+		for failure in failures:
+			print(f"✗ {failure}")
+		return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
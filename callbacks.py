@@ -0,0 +1,120 @@
+"""
+Registro de botones (callback_data) del lado del servidor.
+
+Telegram limita `callback_data` a 64 bytes, así que los botones solo llevan un
+identificador corto y opaco; la intención de compra completa se guarda aquí.
+Los botones de un mismo mensaje forman un grupo: al pulsar uno se invalidan
+todos, de modo que una pulsación repetida o un botón antiguo se rechazan.
+Las entradas caducan (TTL) y se guardan también en el almacén local para
+sobrevivir a un reinicio del bot.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Sequence
+
+# Entradas como máximo en memoria (FIFO: se descartan primero las más antiguas;
+# consultar un botón no lo renueva, porque pulsarlo ya invalida su grupo)
+MAX_ENTRIES = 256
+# Bytes aleatorios del identificador (8 caracteres en base64 url-safe)
+TOKEN_BYTES = 6
+
+
+class PurchaseIntent(NamedTuple):
+	"""Lo que representa un botón: acción y viaje (y el viaje ya resuelto si es alternativo)"""
+
+	action: str  # 'buy', 'cancel' o 'alt'
+	trip_type: str  # 'ida' o 'vuelta'
+	time: str  # HH:MM
+	date: str  # YYYY-MM-DD
+	schedule_id: Optional[str] = None
+	going_rate: Optional[str] = None
+
+	@property
+	def key(self) -> str:
+		"""Clave "tipo|hora|fecha" usada por la compra automática y las vigilancias"""
+		return f"{self.trip_type}|{self.time}|{self.date}"
+
+
+class _Entry(NamedTuple):
+	intent: PurchaseIntent
+	group: str
+	expires_at: float
+
+
+class CallbackRegistry:
+	"""Identificadores cortos -> PurchaseIntent, con límite FIFO en memoria, TTL y uso único por grupo"""
+
+	def __init__(self, store=None, ttl_seconds: float = 86400,
+	             max_entries: int = MAX_ENTRIES):
+		self.store = store
+		self.ttl_seconds = ttl_seconds
+		self.max_entries = max(1, max_entries)
+		self._entries = OrderedDict()
+		self._groups = {}
+		self.lock = threading.Lock()
+
+	def register(self,
+	             intents: Sequence[PurchaseIntent],
+	             expires_at: float = None) -> tuple:
+		"""Registra los botones de un mensaje. Devuelve (grupo, identificadores en el mismo orden).
+
+		`expires_at` (timestamp) acota la validez; nunca supera el TTL del registro.
+		"""
+		now = time.time()
+		expires = now + self.ttl_seconds
+		if expires_at is not None:
+			expires = min(expires, expires_at)
+		group = secrets.token_urlsafe(TOKEN_BYTES)
+		tokens = [secrets.token_urlsafe(TOKEN_BYTES) for _ in intents]
+
+		with self.lock:
+			for token, intent in zip(tokens, intents):
+				self._entries[token] = _Entry(intent, group, expires)
+			self._groups[group] = tokens
+			while len(self._entries) > self.max_entries:
+				evicted, entry = self._entries.popitem(last=False)
+				self._forget(evicted, entry.group)
+
+		if self.store is not None:
+			self.store.put_callbacks(group, [(token, intent._asdict())
+			                                 for token, intent in zip(tokens, intents)],
+			                         expires)
+			self.store.purge_callbacks_before(now)
+		return group, tokens
+
+	def consume(self, token: str) -> Optional[PurchaseIntent]:
+		"""Resuelve una pulsación e invalida su grupo. None si caducó, ya se usó o no existe"""
+		with self.lock:
+			entry = self._entries.get(token)
+		if entry is None and self.store is not None:
+			row = self.store.get_callback(token)
+			if row is not None:
+				payload, group, expires_at = row
+				entry = _Entry(PurchaseIntent(**payload), group, expires_at)
+		if entry is None:
+			return None
+
+		# Solo gana la primera pulsación del grupo
+		if not self.revoke(entry.group):
+			return None
+		if entry.expires_at <= time.time():
+			return None
+		return entry.intent
+
+	def revoke(self, group: str) -> bool:
+		"""Invalida todos los botones de un grupo. Devuelve si seguía activo"""
+		with self.lock:
+			tokens = self._groups.pop(group, None)
+			for token in tokens or ():
+				self._entries.pop(token, None)
+		if self.store is not None:
+			return self.store.delete_callback_group(group) > 0 or tokens is not None
+		return tokens is not None
+
+	def _forget(self, token: str, group: str):
+		# Expulsado por antigüedad: sigue disponible en el almacén local si lo hay
+		tokens = self._groups.get(group)
+		if tokens is not None and all(t not in self._entries for t in tokens):
+			del self._groups[group]
@@ -0,0 +1,154 @@
+"""
+Grabación y reproducción de peticiones HTTP ("cassettes").
+
+`CassetteAdapter` se monta en la sesión de requests del cliente de HIFE. En
+modo `record` deja pasar las peticiones y guarda cada par petición/respuesta,
+sin tokens ni contraseñas, en un archivo JSON Lines. En modo `replay` responde
+con lo grabado sin tocar la red, respetando la latencia original o sin
+latencia, de modo que una compra completa se puede repetir y perfilar siempre
+igual.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Claves (cabeceras, query o JSON) cuyo valor nunca se guarda
+SENSITIVE_KEYS = frozenset(
+    ('authorization', 'password', 'client_secret', 'access_token',
+     'refresh_token', 'token', 'email', 'username', 'cookie', 'set-cookie'))
+REDACTED = '***'
+
+# Cabeceras de respuesta que se conservan en la grabación
+KEPT_RESPONSE_HEADERS = ('content-type', )
+
+
+def sanitize(value):
+	"""Copia de `value` (dict/list JSON) con los campos sensibles ocultos"""
+	if isinstance(value, dict):
+		return {
+		    key: REDACTED if str(key).lower() in SENSITIVE_KEYS else sanitize(item)
+		    for key, item in value.items()
+		}
+	if isinstance(value, list):
+		return [sanitize(item) for item in value]
+	return value
+
+
+def sanitize_url(url: str) -> str:
+	parts = urlsplit(url)
+	query = [(key, REDACTED if key.lower() in SENSITIVE_KEYS else value)
+	         for key, value in parse_qsl(parts.query, keep_blank_values=True)]
+	return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _decode_body(body):
+	if body is None:
+		return None
+	if isinstance(body, bytes):
+		body = body.decode('utf-8', errors='replace')
+	try:
+		return sanitize(json.loads(body))
+	except ValueError:
+		return body
+
+
+def _match_key(method: str, url: str) -> str:
+	# La query se ignora: basta método + ruta y el orden de grabación
+	return f"{method.upper()} {urlsplit(url).path}"
+
+
+class CassetteAdapter(BaseAdapter):
+	"""Adaptador de transporte que graba (`record`) o reproduce (`replay`) un cassette"""
+
+	def __init__(self, path: str, mode: str, timing: str = 'original',
+	             inner: BaseAdapter = None):
+		super().__init__()
+		if mode not in ('record', 'replay'):
+			raise ValueError(f"Modo de cassette no válido: {mode}")
+		self.path = path
+		self.mode = mode
+		self.timing = timing
+		self.inner = inner or HTTPAdapter()
+		self.lock = threading.Lock()
+		self._recorded = defaultdict(deque)
+		if mode == 'replay':
+			self._load()
+		else:
+			os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+	def _load(self):
+		with open(self.path, encoding='utf-8') as f:
+			for line in f:
+				if line.strip():
+					entry = json.loads(line)
+					self._recorded[entry['key']].append(entry)
+		logger.info(f"Cassette cargado: {self.path}")
+
+	def send(self, request, **kwargs):
+		if self.mode == 'replay':
+			return self._replay(request)
+
+		# response.elapsed lo rellena la sesión después: se mide aquí
+		started = time.perf_counter()
+		response = self.inner.send(request, **kwargs)
+		content = response.content
+		elapsed = time.perf_counter() - started
+		entry = {
+		    'key': _match_key(request.method, request.url),
+		    'method': request.method,
+		    'url': sanitize_url(request.url),
+		    'request': _decode_body(request.body),
+		    'status': response.status_code,
+		    'headers': {
+		        name: response.headers[name]
+		        for name in KEPT_RESPONSE_HEADERS if name in response.headers
+		    },
+		    'body': _decode_body(content),
+		    'elapsed': round(elapsed, 4),
+		}
+		with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+			f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')))
+			f.write('\n')
+		return response
+
+	def _replay(self, request):
+		key = _match_key(request.method, request.url)
+		with self.lock:
+			entries = self._recorded.get(key)
+			if not entries:
+				raise requests.exceptions.ConnectionError(
+				    f"Sin respuesta grabada para {key}", request=request)
+			# Se consumen en orden; la última se repite si se piden más
+			entry = entries.popleft() if len(entries) > 1 else entries[0]
+
+		if self.timing == 'original':
+			time.sleep(entry.get('elapsed', 0))
+
+		response = requests.Response()
+		response.status_code = entry['status']
+		response.headers = CaseInsensitiveDict(entry.get('headers') or {})
+		body = entry.get('body')
+		if body is None:
+			response._content = b''
+		elif isinstance(body, str):
+			response._content = body.encode('utf-8')
+		else:
+			response._content = json.dumps(body).encode('utf-8')
+		response.encoding = 'utf-8'
+		response.url = request.url
+		response.request = request
+		response.reason = 'Replayed'
+		return response
+
+	def close(self):
+		self.inner.close()
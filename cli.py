@@ -0,0 +1,319 @@
+"""
+HIFE BOT - Línea de comandos
+
+Búsquedas y compras sin Telegram, para cron u otros scripts. Cada comando
+imprime un único objeto JSON (una línea) en la salida estándar; el progreso y
+los avisos van a la salida de error. Código de salida 0 si el comando tuvo
+éxito, 1 si no.
+
+Uso:
+    python cli.py check                            # configuración y acceso a la API
+    python cli.py check --offline                  # solo la configuración
+    python cli.py trips --type ida --date 2026-05-04
+    python cli.py bonus --type vuelta
+    python cli.py buy --type ida --time 06:45      # compra (TICKET_QUANTITY viajeros)
+    python cli.py buy --type ida --quantity 2 --dry-run
+
+Sin --date se usa el día de hoy y sin --time la hora configurada para ese
+día. Las compras usan el mismo registro que el bot: un viaje ya comprado no se
+vuelve a comprar, ni desde aquí ni desde Telegram.
+
+Ejemplo de cron (ida de lunes a viernes a las 06:00):
+    0 6 * * 1-5  cd /ruta/hife && venv/bin/python cli.py buy --type ida >> compras.jsonl
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import sys
+import time
+
+TRIP_TYPES = ('ida', 'vuelta')
+
+
+def _date(value: str) -> str:
+	try:
+		datetime.datetime.strptime(value, "%Y-%m-%d")
+	except ValueError:
+		raise argparse.ArgumentTypeError(
+		    f"fecha no válida '{value}' (formato YYYY-MM-DD)")
+	return value
+
+
+def _time(value: str) -> str:
+	try:
+		datetime.datetime.strptime(value, "%H:%M")
+	except ValueError:
+		raise argparse.ArgumentTypeError(
+		    f"hora no válida '{value}' (formato HH:MM)")
+	return value
+
+
+def _load_bot():
+	"""Importa el bot con la consola en texto plano (sin rich)"""
+	import androidapi
+	import auth
+	from lazy import PlainConsole
+
+	# Sin archivo fijo: escribe en sys.stdout, que main() desvía a stderr
+	androidapi.console.target = PlainConsole()
+	auth.console.target = PlainConsole()
+	return androidapi
+
+
+def _search_date(date_str: str) -> str:
+	"""YYYY-MM-DD -> DD-MM-YYYY (formato de la ruta de viajes de la API)"""
+	return datetime.datetime.strptime(date_str,
+	                                  "%Y-%m-%d").strftime("%d-%m-%Y")
+
+
+def cmd_check(args) -> dict:
+	from config import Config
+
+	valid, errors = Config.validate()
+	# Telegram no hace falta para la línea de comandos
+	warnings = [e for e in errors if e.startswith('TELEGRAM_')]
+	errors = [e for e in errors if not e.startswith('TELEGRAM_')]
+	result = {'ok': not errors, 'errors': errors, 'warnings': warnings}
+	if errors or args.offline:
+		return result
+
+	bot = _load_bot()
+	import requests
+
+	started = time.perf_counter()
+	try:
+		res = bot.automator._get_available_bonus(args.date, 'ida')
+		if res.status_code == 401 and bot.automator.refresh_token():
+			res = bot.automator._get_available_bonus(args.date, 'ida')
+	except requests.exceptions.RequestException as e:
+		result.update(ok=False, api={'error': str(e)})
+		return result
+
+	api = {
+	    'status_code': res.status_code,
+	    'elapsed_ms': round((time.perf_counter() - started) * 1000)
+	}
+	if res.status_code == 200:
+		api['bonus_available'] = len(res.json() or [])
+	result.update(ok=res.status_code == 200, api=api)
+	return result
+
+
+def cmd_trips(args) -> dict:
+	bot = _load_bot()
+	origin, dest = bot._route_ids(args.type)
+	trips = bot.automator.fetch_trips(origin, dest, _search_date(args.date))
+	result = {'type': args.type, 'date': args.date}
+	if isinstance(trips, dict):
+		result.update(ok=False, **trips)
+		return result
+	if not args.raw:
+		trips = [{
+		    'id': trip.get('id'),
+		    'departure_time': trip.get('departure_time'),
+		    'going_rate': bot._resolve_going_rate_from_trip(trip),
+		    'rate_available': bot._bonus_rate_available(trip),
+		} for trip in trips]
+	result.update(ok=True, trips=trips)
+	return result
+
+
+def cmd_bonus(args) -> dict:
+	bot = _load_bot()
+	import requests
+
+	result = {'type': args.type, 'date': args.date}
+	try:
+		res = bot.automator._get_available_bonus(args.date, args.type)
+		if res.status_code == 401 and bot.automator.refresh_token():
+			res = bot.automator._get_available_bonus(args.date, args.type)
+		res.raise_for_status()
+	except requests.exceptions.RequestException as e:
+		result.update(ok=False, error=str(e))
+		return result
+	bonus = res.json() or []
+	result.update(ok=True, available=len(bonus), bonus=bonus)
+	return result
+
+
+def cmd_buy(args) -> dict:
+	bot = _load_bot()
+	from config import Config
+	from deadline import DeadlineExceeded
+
+	weekday = datetime.datetime.strptime(args.date, "%Y-%m-%d").weekday()
+	t_time = args.time or Config.schedule.get(weekday, {}).get(args.type)
+	quantity = args.quantity or Config.TICKET_QUANTITY
+	result = {
+	    'type': args.type,
+	    'date': args.date,
+	    'time': t_time,
+	    'quantity': quantity
+	}
+	if not t_time:
+		result.update(ok=False,
+		              outcome='error',
+		              error=f"No hay hora de {args.type} configurada para ese día")
+		return result
+
+	# Mismo registro de compras que el bot (idempotencia): la compra se reclama
+	# de forma atómica, así que el bot u otra ejecución no pueden repetirla
+	key = bot._purchase_key(args.type, t_time, args.date)
+	store = bot._get_store()
+	if args.dry_run:
+		blocked_by = store.get_purchase(key)
+		if blocked_by != 'success':
+			blocked_by = None
+	else:
+		blocked_by = store.claim_purchase(key,
+		                                  bot.PURCHASE_PENDING_HOURS * 3600)
+	if blocked_by == 'success':
+		result.update(ok=True, outcome='already_bought')
+		return result
+	if blocked_by is not None:
+		# En curso en otro proceso o interrumpida sin saber si se pagó
+		result.update(ok=False,
+		              outcome='unknown',
+		              error="Hay una compra de este viaje sin confirmar")
+		return result
+
+	origin, dest = bot._route_ids(args.type)
+	deadline = bot._purchase_deadline(args.date, t_time)
+
+	def find_live():
+		# Sin caché: un cron no debe comprar con un listado de hace horas
+		return bot.automator.get_trip_id(origin,
+		                                 dest,
+		                                 _search_date(args.date),
+		                                 t_time,
+		                                 use_cache=False,
+		                                 deadline=deadline)
+
+	def buy(schedule_id, going_rate):
+		result.update(schedule_id=schedule_id, going_rate=going_rate)
+		return bot.automator.buy_ticket(schedule_id,
+		                                args.date,
+		                                args.type,
+		                                going_rate,
+		                                quantity=quantity,
+		                                deadline=deadline)
+
+	try:
+		# Igual que el bot: primero el ID de viaje configurado y comprobado
+		lookup = bot._configured_trip(args.type, t_time, args.date)
+		fast_path = lookup is not None
+		if lookup is None:
+			lookup = find_live()
+		if isinstance(lookup, dict):
+			outcome = 'error'
+			result['error'] = lookup.get('error')
+		elif not lookup:
+			outcome = 'not_found'
+		elif args.dry_run:
+			schedule_id, going_rate = lookup
+			result.update(schedule_id=schedule_id,
+			              going_rate=going_rate,
+			              ok=True,
+			              outcome='dry_run')
+			return result
+		else:
+			schedule_id, going_rate = lookup
+			success = buy(schedule_id, going_rate)
+			if not success and fast_path:
+				# El ID configurado puede haber dejado de valer: solo se descarta
+				# y se reintenta si el listado actual muestra otro viaje
+				lookup = find_live()
+				if (isinstance(lookup, tuple) and
+				    str(lookup[0]) != str(schedule_id)):
+					store.put_trip_check(schedule_id, t_time, going_rate, False)
+					success = buy(*lookup)
+			outcome = 'success' if success else 'failed'
+	except DeadlineExceeded as e:
+		outcome = 'late'
+		result['error'] = str(e)
+	except Exception:
+		if not args.dry_run:
+			store.put_purchase(key, 'error')
+		raise
+
+	if not args.dry_run:
+		store.put_purchase(key, outcome)
+	result.update(ok=outcome == 'success', outcome=outcome)
+	return result
+
+
+COMMANDS = {
+    'check': cmd_check,
+    'trips': cmd_trips,
+    'bonus': cmd_bonus,
+    'buy': cmd_buy,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+	parser.add_argument('-v',
+	                    '--verbose',
+	                    action='store_true',
+	                    help="registra también los mensajes informativos")
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	def command(name: str, help: str, trip_type: bool = True):
+		sub = commands.add_parser(name, help=help)
+		if trip_type:
+			sub.add_argument('--type', choices=TRIP_TYPES, default='ida')
+		sub.add_argument('--date',
+		                 type=_date,
+		                 default=datetime.date.today().isoformat(),
+		                 help="YYYY-MM-DD (por defecto, hoy)")
+		return sub
+
+	check = command('check',
+	                "comprueba la configuración y el acceso a la API",
+	                trip_type=False)
+	check.add_argument('--offline',
+	                   action='store_true',
+	                   help="solo la configuración, sin llamar a la API")
+
+	trips = command('trips', "lista los viajes de un día")
+	trips.add_argument('--raw',
+	                   action='store_true',
+	                   help="respuesta completa de la API")
+
+	command('bonus', "bonos disponibles para un día")
+
+	buy = command('buy', "compra el billete de un viaje")
+	buy.add_argument('--time',
+	                 type=_time,
+	                 help="HH:MM (por defecto, la hora configurada)")
+	buy.add_argument('--quantity',
+	                 type=int,
+	                 choices=range(1, 10),
+	                 metavar='N',
+	                 help="viajeros (por defecto, TICKET_QUANTITY)")
+	buy.add_argument('--dry-run',
+	                 action='store_true',
+	                 help="busca el viaje sin comprar")
+	return parser
+
+
+def main(argv=None) -> int:
+	args = build_parser().parse_args(argv)
+	logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+	                    stream=sys.stderr,
+	                    format='%(levelname)s %(name)s: %(message)s')
+
+	out = sys.stdout
+	# Todo lo que imprima el bot va a stderr: stdout es solo para el JSON
+	with contextlib.redirect_stdout(sys.stderr):
+		result = COMMANDS[args.command](args)
+		if 'tracing' in sys.modules:
+			sys.modules['tracing'].flush()
+	out.write(json.dumps(result, ensure_ascii=False) + '\n')
+	return 0 if result.get('ok') else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
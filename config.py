@@ -1,97 +1,385 @@
 import os
 import logging
-from dotenv import load_dotenv
-from typing import Dict, Optional
+import datetime
+import threading
+from dotenv import load_dotenv, dotenv_values, find_dotenv
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Archivo .env vigilado para la recarga en caliente
+ENV_FILE: str = os.getenv('ENV_FILE') or find_dotenv() or '.env'
+
+# Entorno del proceso antes de volcar el .env. load_dotenv no pisa variables ya
+# definidas, así que el entorno manda sobre el .env; las recargas aplican la
+# misma prioridad, y quitar una línea del .env la deshace en lugar de conservar
+# el valor cargado
+_startup_environ: Dict[str, str] = dict(os.environ)
+
 try:
-	load_dotenv()
+	load_dotenv(ENV_FILE)
 except (UnicodeDecodeError, Exception) as e:
 	# Intentar cargar con diferentes codificaciones si UTF-8 falla
 	try:
-		load_dotenv(encoding='latin-1')
+		load_dotenv(ENV_FILE, encoding='latin-1')
 	except:
 		try:
-			load_dotenv(encoding='cp1252')
+			load_dotenv(ENV_FILE, encoding='cp1252')
 		except:
 			# Si todo falla, continuar sin .env (usará valores por defecto)
 			pass
 
 
-class Config:
+def read_env_file(path: str) -> Dict[str, str]:
+	"""Lee un .env a un dict con los mismos reintentos de codificación que al arrancar"""
+	for encoding in ('utf-8', 'latin-1', 'cp1252'):
+		try:
+			return {
+			    k: v
+			    for k, v in dotenv_values(path, encoding=encoding).items()
+			    if v is not None
+			}
+		except UnicodeDecodeError:
+			continue
+	return {}
+
+
+def parse_int_env(name: str, default: str, env: Mapping[str, str] = None) -> int:
+	"""Safely parse an integer from an environment variable with fallback to default."""
+	env_value = (os.environ if env is None else env).get(name, default)
+	try:
+		return int(env_value)
+	except ValueError:
+		logger.warning(
+		    f"Invalid value for {name}: '{env_value}', using default: {default}")
+		return int(default)
+
+
+def parse_bool_env(name: str,
+                   default: str = 'false',
+                   env: Mapping[str, str] = None) -> bool:
+	"""Parse a boolean environment variable (true/1/yes/si)."""
+	value = (os.environ if env is None else env).get(name, default)
+	return value.strip().lower() in ('true', '1', 'yes', 'si', 'sí')
+
+
+def read_settings(env: Mapping[str, str]) -> Dict[str, object]:
+	"""Interpreta todas las opciones del bot a partir de un mapping tipo os.environ"""
+	getenv = env.get
+	parse_int = lambda name, default: parse_int_env(name, default, env)
+	parse_bool = lambda name, default='false': parse_bool_env(name, default, env)
+
+	return {
+	    # Telegram
+	    'TELEGRAM_TOKEN': getenv('TELEGRAM_TOKEN', ''),
+	    'TELEGRAM_USER_ID': getenv('TELEGRAM_USER_ID', ''),
+
+	    # HIFE API
+	    'HIFE_API_URL': getenv('HIFE_API_URL', 'https://middleware.hife.es/api'),
+	    'HIFE_AUTH_TOKEN': getenv('HIFE_AUTH_TOKEN', ''),
+	    'HIFE_EMAIL': getenv('HIFE_EMAIL', ''),
+	    'HIFE_PASSWORD': getenv('HIFE_PASSWORD', ''),
+	    'HIFE_CLIENT_SECRET': getenv('HIFE_CLIENT_SECRET', ''),
+	    'HIFE_CLIENT_ID': getenv('HIFE_CLIENT_ID', '33798'),
+	    'HIFE_APP_VERSION': getenv('HIFE_APP_VERSION', '2.0.8'),
+	    'HIFE_GOING_RATE': getenv('HIFE_GOING_RATE', '').strip(),
+
+	    # Estaciones
+	    'ORIGIN_ID': getenv('ORIGIN_ID', ''),
+	    'ORIGIN_STOP_CODE': getenv('ORIGIN_STOP_CODE', ''),
+	    'ORIGIN_NAME': getenv('ORIGIN_NAME', ''),
+	    'DESTINATION_ID': getenv('DESTINATION_ID', ''),
+	    'DESTINATION_STOP_CODE': getenv('DESTINATION_STOP_CODE', ''),
+	    'DESTINATION_NAME': getenv('DESTINATION_NAME', ''),
+
+	    # Bono
+	    'BONUS_ID': getenv('BONUS_ID', '19'),
+	    'TICKET_QUANTITY': parse_int('TICKET_QUANTITY', '1'),
+
+	    # Horarios - Ida
+	    'OUTWARD_TIME_DEFAULT': getenv('OUTWARD_TIME_DEFAULT') or None,
+	    'OUTWARD_TIME_MONDAY': getenv('OUTWARD_TIME_MONDAY') or None,
+	    'OUTWARD_TIME_TUESDAY': getenv('OUTWARD_TIME_TUESDAY') or None,
+	    'OUTWARD_TIME_WEDNESDAY': getenv('OUTWARD_TIME_WEDNESDAY') or None,
+	    'OUTWARD_TIME_THURSDAY': getenv('OUTWARD_TIME_THURSDAY') or None,
+	    'OUTWARD_TIME_FRIDAY': getenv('OUTWARD_TIME_FRIDAY') or None,
+
+	    # Horarios - Vuelta
+	    'RETURN_TIME_DEFAULT': getenv('RETURN_TIME_DEFAULT') or None,
+	    'RETURN_TIME_MONDAY': getenv('RETURN_TIME_MONDAY') or None,
+	    'RETURN_TIME_TUESDAY': getenv('RETURN_TIME_TUESDAY') or None,
+	    'RETURN_TIME_WEDNESDAY': getenv('RETURN_TIME_WEDNESDAY') or None,
+	    'RETURN_TIME_THURSDAY': getenv('RETURN_TIME_THURSDAY') or None,
+	    'RETURN_TIME_FRIDAY': getenv('RETURN_TIME_FRIDAY') or None,
+
+	    # IDs de viaje (setup_wizard.py): atajo para no buscar el viaje al comprar
+	    'OUTWARD_TRIP_ID_DEFAULT': getenv('OUTWARD_TRIP_ID_DEFAULT') or None,
+	    'OUTWARD_TRIP_ID_MONDAY': getenv('OUTWARD_TRIP_ID_MONDAY') or None,
+	    'OUTWARD_TRIP_ID_TUESDAY': getenv('OUTWARD_TRIP_ID_TUESDAY') or None,
+	    'OUTWARD_TRIP_ID_WEDNESDAY': getenv('OUTWARD_TRIP_ID_WEDNESDAY') or None,
+	    'OUTWARD_TRIP_ID_THURSDAY': getenv('OUTWARD_TRIP_ID_THURSDAY') or None,
+	    'OUTWARD_TRIP_ID_FRIDAY': getenv('OUTWARD_TRIP_ID_FRIDAY') or None,
+	    'RETURN_TRIP_ID_DEFAULT': getenv('RETURN_TRIP_ID_DEFAULT') or None,
+	    'RETURN_TRIP_ID_MONDAY': getenv('RETURN_TRIP_ID_MONDAY') or None,
+	    'RETURN_TRIP_ID_TUESDAY': getenv('RETURN_TRIP_ID_TUESDAY') or None,
+	    'RETURN_TRIP_ID_WEDNESDAY': getenv('RETURN_TRIP_ID_WEDNESDAY') or None,
+	    'RETURN_TRIP_ID_THURSDAY': getenv('RETURN_TRIP_ID_THURSDAY') or None,
+	    'RETURN_TRIP_ID_FRIDAY': getenv('RETURN_TRIP_ID_FRIDAY') or None,
+
+	    # Notificaciones
+	    'NOTIFICATION_ADVANCE_MINUTES': parse_int('NOTIFICATION_ADVANCE_MINUTES',
+	                                              '120'),
+	    'CHECK_INTERVAL_MINUTES': parse_int('CHECK_INTERVAL_MINUTES', '10'),
+	    'CONFIG_WATCH_SECONDS': parse_int('CONFIG_WATCH_SECONDS', '5'),
+
+	    # Compra automática
+	    'AUTO_CONFIRM_MINUTES': parse_int('AUTO_CONFIRM_MINUTES', '0'),
+	    'OUTWARD_AUTO_CONFIRM_MINUTES': getenv('OUTWARD_AUTO_CONFIRM_MINUTES')
+	    or None,
+	    'RETURN_AUTO_CONFIRM_MINUTES': getenv('RETURN_AUTO_CONFIRM_MINUTES')
+	    or None,
+
+	    # Almacén local y precalentado nocturno
+	    'STORE_PATH': getenv('STORE_PATH', 'hife_cache.db'),
+	    'WARMUP_TIME': getenv('WARMUP_TIME', '03:30').strip(),
+	    'TIMEZONE': getenv('TIMEZONE', '').strip(),
+	    'WARMUP_DAYS': parse_int('WARMUP_DAYS', '7'),
+	    'WARMUP_CONCURRENCY': parse_int('WARMUP_CONCURRENCY', '3'),
+	    'TRIPS_CACHE_MAX_AGE_HOURS': parse_int('TRIPS_CACHE_MAX_AGE_HOURS', '24'),
+	    'CALLBACK_TTL_HOURS': parse_int('CALLBACK_TTL_HOURS', '24'),
+
+	    # Conexión con la API
+	    'CONNECTION_WARM_MINUTES': parse_int('CONNECTION_WARM_MINUTES', '30'),
+	    'CONNECTION_KEEPALIVE_SECONDS': parse_int('CONNECTION_KEEPALIVE_SECONDS',
+	                                              '45'),
+	    'DNS_CACHE_SECONDS': parse_int('DNS_CACHE_SECONDS', '300'),
+	    'HEDGE_PERCENTILE': parse_int('HEDGE_PERCENTILE', '0'),
+	    'HEDGE_MAX_PERCENT': parse_int('HEDGE_MAX_PERCENT', '10'),
+
+	    # Grabación/reproducción de peticiones HTTP (vacío = desactivado, se
+	    # aplica al arrancar)
+	    'HTTP_CASSETTE_MODE': getenv('HTTP_CASSETTE_MODE', '').strip().lower(),
+	    'HTTP_CASSETTE_PATH': getenv('HTTP_CASSETTE_PATH',
+	                                 'cassettes/hife.jsonl'),
+	    'HTTP_CASSETTE_TIMING': getenv('HTTP_CASSETTE_TIMING',
+	                                   'original').strip().lower(),
+
+	    # Perfilado (se aplica al arrancar)
+	    'PROFILE_MODE': getenv('PROFILE_MODE', '').strip().lower(),
+	    'PROFILE_MEMORY': parse_bool('PROFILE_MEMORY'),
+	    'PROFILE_DIR': getenv('PROFILE_DIR', 'profiles'),
+	    'PROFILE_KEEP': parse_int('PROFILE_KEEP', '20'),
+
+	    # Trazas de las compras (se aplica al arrancar)
+	    'TRACING': getenv('TRACING', '').strip().lower(),
+	    'TRACE_FILE': getenv('TRACE_FILE', 'traces.jsonl'),
+	    'OTLP_ENDPOINT': getenv('OTLP_ENDPOINT', 'http://localhost:4318'),
+
+	    # Modo de ejecución y logging (se aplican al arrancar)
+	    'RUN_MODE': getenv('RUN_MODE', 'interactive').strip().lower(),
+	    'LOG_JSON_FILE': getenv('LOG_JSON_FILE', '').strip(),
+
+	    # Vigilancia del event loop y latido (se aplica al arrancar)
+	    'LOOP_LAG_WARN_MS': parse_int('LOOP_LAG_WARN_MS', '500'),
+	    'LOOP_STALL_SECONDS': parse_int('LOOP_STALL_SECONDS', '30'),
+	    'HEARTBEAT_FILE': getenv('HEARTBEAT_FILE', 'bot.heartbeat').strip(),
+	    'HEALTH_PORT': parse_int('HEALTH_PORT', '0'),
+
+	    # Cola de compras
+	    'PURCHASE_WORKERS': parse_int('PURCHASE_WORKERS', '2'),
+	    'PURCHASE_QUEUE_SIZE': parse_int('PURCHASE_QUEUE_SIZE', '20'),
+	    'PURCHASE_DEADLINE_MARGIN_MINUTES': parse_int(
+	        'PURCHASE_DEADLINE_MARGIN_MINUTES', '0'),
+
+	    # Horarios alternativos
+	    'FALLBACK_TOLERANCE_MINUTES': parse_int('FALLBACK_TOLERANCE_MINUTES',
+	                                            '30'),
+	    'FALLBACK_MAX_OPTIONS': parse_int('FALLBACK_MAX_OPTIONS', '3'),
+
+	    # Vigilancia de disponibilidad
+	    'AVAILABILITY_WATCH': parse_bool('AVAILABILITY_WATCH'),
+	    'WATCH_ACTION': getenv('WATCH_ACTION', 'notify').strip().lower(),
+	    'WATCH_REQUESTS_PER_MINUTE': parse_int('WATCH_REQUESTS_PER_MINUTE', '6'),
+	    'WATCH_MIN_INTERVAL_SECONDS': parse_int('WATCH_MIN_INTERVAL_SECONDS',
+	                                            '30'),
+	    'WATCH_MAX_INTERVAL_SECONDS': parse_int('WATCH_MAX_INTERVAL_SECONDS',
+	                                            '600'),
+	}
+
+
+_USER_AGENT = 'Dalvik/2.1.0 (Linux; U; Android 12; SM-S916U Build/9643478.0)'
+
+
+class ConfigSnapshot(NamedTuple):
+	"""Configuración inmutable del bot.
+
+	Es una tupla (sin __dict__, no se puede modificar): cada cambio crea un
+	snapshot nuevo que sustituye al anterior en una sola asignación. Las
+	cabeceras HTTP, el horario semanal y los IDs de viaje por día se calculan
+	una vez al construirlo.
+	"""
 
 	# Telegram
-	TELEGRAM_TOKEN: str = os.getenv('TELEGRAM_TOKEN', '')
-	TELEGRAM_USER_ID: str = os.getenv('TELEGRAM_USER_ID', '')
+	TELEGRAM_TOKEN: str
+	TELEGRAM_USER_ID: str
 
 	# HIFE API
-	HIFE_API_URL: str = os.getenv('HIFE_API_URL',
-	                              'https://middleware.hife.es/api')
-	HIFE_AUTH_TOKEN: str = os.getenv('HIFE_AUTH_TOKEN', '')
-	HIFE_EMAIL: str = os.getenv('HIFE_EMAIL', '')
-	HIFE_PASSWORD: str = os.getenv('HIFE_PASSWORD', '')
-	HIFE_CLIENT_SECRET: str = os.getenv('HIFE_CLIENT_SECRET', '')
-	HIFE_CLIENT_ID: Optional[str] = os.getenv('HIFE_CLIENT_ID', '33798')
-	HIFE_CLIENT_ID_VALIDATED: Optional[int] = None  # Set during validation
-	HIFE_APP_VERSION: str = os.getenv('HIFE_APP_VERSION', '2.0.8')
-	HIFE_GOING_RATE: str = os.getenv('HIFE_GOING_RATE', '').strip()
+	HIFE_API_URL: str
+	HIFE_AUTH_TOKEN: str
+	HIFE_EMAIL: str
+	HIFE_PASSWORD: str
+	HIFE_CLIENT_SECRET: str
+	HIFE_CLIENT_ID: Optional[str]
+	HIFE_APP_VERSION: str
+	HIFE_GOING_RATE: str
 
 	# Estaciones
-	ORIGIN_ID: str = os.getenv('ORIGIN_ID', '')
-	ORIGIN_STOP_CODE: str = os.getenv('ORIGIN_STOP_CODE', '')
-	ORIGIN_NAME: str = os.getenv('ORIGIN_NAME', '')
-	DESTINATION_ID: str = os.getenv('DESTINATION_ID', '')
-	DESTINATION_STOP_CODE: str = os.getenv('DESTINATION_STOP_CODE', '')
-	DESTINATION_NAME: str = os.getenv('DESTINATION_NAME', '')
+	ORIGIN_ID: str
+	ORIGIN_STOP_CODE: str
+	ORIGIN_NAME: str
+	DESTINATION_ID: str
+	DESTINATION_STOP_CODE: str
+	DESTINATION_NAME: str
 
-	# Bono
-	BONUS_ID: str = os.getenv('BONUS_ID', '19')
+	# Bono y viajeros por compra (cada uno con su propio bono)
+	BONUS_ID: str
+	TICKET_QUANTITY: int
 
 	# Horarios - Ida
-	OUTWARD_TIME_DEFAULT: Optional[str] = os.getenv(
-	    'OUTWARD_TIME_DEFAULT') or None
-	OUTWARD_TIME_MONDAY: Optional[str] = os.getenv(
-	    'OUTWARD_TIME_MONDAY') or None
-	OUTWARD_TIME_TUESDAY: Optional[str] = os.getenv(
-	    'OUTWARD_TIME_TUESDAY') or None
-	OUTWARD_TIME_WEDNESDAY: Optional[str] = os.getenv(
-	    'OUTWARD_TIME_WEDNESDAY') or None
-	OUTWARD_TIME_THURSDAY: Optional[str] = os.getenv(
-	    'OUTWARD_TIME_THURSDAY') or None
-	OUTWARD_TIME_FRIDAY: Optional[str] = os.getenv(
-	    'OUTWARD_TIME_FRIDAY') or None
+	OUTWARD_TIME_DEFAULT: Optional[str]
+	OUTWARD_TIME_MONDAY: Optional[str]
+	OUTWARD_TIME_TUESDAY: Optional[str]
+	OUTWARD_TIME_WEDNESDAY: Optional[str]
+	OUTWARD_TIME_THURSDAY: Optional[str]
+	OUTWARD_TIME_FRIDAY: Optional[str]
 
 	# Horarios - Vuelta
-	RETURN_TIME_DEFAULT: Optional[str] = os.getenv(
-	    'RETURN_TIME_DEFAULT') or None
-	RETURN_TIME_MONDAY: Optional[str] = os.getenv('RETURN_TIME_MONDAY') or None
-	RETURN_TIME_TUESDAY: Optional[str] = os.getenv(
-	    'RETURN_TIME_TUESDAY') or None
-	RETURN_TIME_WEDNESDAY: Optional[str] = os.getenv(
-	    'RETURN_TIME_WEDNESDAY') or None
-	RETURN_TIME_THURSDAY: Optional[str] = os.getenv(
-	    'RETURN_TIME_THURSDAY') or None
-	RETURN_TIME_FRIDAY: Optional[str] = os.getenv('RETURN_TIME_FRIDAY') or None
-
-	# Notificaciones - initialized via parse_int_env at module level
-	NOTIFICATION_ADVANCE_MINUTES: int = None
-	CHECK_INTERVAL_MINUTES: int = None
-
-	@staticmethod
-	def parse_int_env(name: str, default: str) -> int:
-		"""Safely parse an integer from an environment variable with fallback to default."""
-		env_value = os.getenv(name, default)
+	RETURN_TIME_DEFAULT: Optional[str]
+	RETURN_TIME_MONDAY: Optional[str]
+	RETURN_TIME_TUESDAY: Optional[str]
+	RETURN_TIME_WEDNESDAY: Optional[str]
+	RETURN_TIME_THURSDAY: Optional[str]
+	RETURN_TIME_FRIDAY: Optional[str]
+
+	# IDs de viaje - Ida / Vuelta
+	OUTWARD_TRIP_ID_DEFAULT: Optional[str]
+	OUTWARD_TRIP_ID_MONDAY: Optional[str]
+	OUTWARD_TRIP_ID_TUESDAY: Optional[str]
+	OUTWARD_TRIP_ID_WEDNESDAY: Optional[str]
+	OUTWARD_TRIP_ID_THURSDAY: Optional[str]
+	OUTWARD_TRIP_ID_FRIDAY: Optional[str]
+	RETURN_TRIP_ID_DEFAULT: Optional[str]
+	RETURN_TRIP_ID_MONDAY: Optional[str]
+	RETURN_TRIP_ID_TUESDAY: Optional[str]
+	RETURN_TRIP_ID_WEDNESDAY: Optional[str]
+	RETURN_TRIP_ID_THURSDAY: Optional[str]
+	RETURN_TRIP_ID_FRIDAY: Optional[str]
+
+	# Notificaciones
+	NOTIFICATION_ADVANCE_MINUTES: int
+	CHECK_INTERVAL_MINUTES: int
+	CONFIG_WATCH_SECONDS: int  # 0 = sin recarga en caliente del .env
+
+	# Compra automática si no hay respuesta (minutos; 0 = desactivada)
+	AUTO_CONFIRM_MINUTES: int
+	OUTWARD_AUTO_CONFIRM_MINUTES: Optional[str]
+	RETURN_AUTO_CONFIRM_MINUTES: Optional[str]
+
+	# Almacén local y precalentado nocturno de viajes
+	STORE_PATH: str
+	WARMUP_TIME: str
+	# Zona IANA de WARMUP_TIME ('' = la del sistema)
+	TIMEZONE: str
+	WARMUP_DAYS: int
+	WARMUP_CONCURRENCY: int
+	TRIPS_CACHE_MAX_AGE_HOURS: int
+	CALLBACK_TTL_HOURS: int  # validez máxima de los botones de Telegram
+
+	# Conexión precalentada tras cada aviso y caché DNS (0 = desactivados)
+	CONNECTION_WARM_MINUTES: int
+	CONNECTION_KEEPALIVE_SECONDS: int
+	DNS_CACHE_SECONDS: int
+	# Búsqueda de viajes: segunda petición si la primera supera este percentil
+	# de latencia (0 = desactivado), como máximo un HEDGE_MAX_PERCENT % extra
+	HEDGE_PERCENTILE: int
+	HEDGE_MAX_PERCENT: int
+
+	# Cassettes HTTP: 'record', 'replay' o '' y latencia 'original'/'zero'
+	HTTP_CASSETTE_MODE: str
+	HTTP_CASSETTE_PATH: str
+	HTTP_CASSETTE_TIMING: str
+
+	# Perfilado: 'cprofile' o '' (desactivado), tracemalloc y rotación
+	PROFILE_MODE: str
+	PROFILE_MEMORY: bool
+	PROFILE_DIR: str
+	PROFILE_KEEP: int
+
+	# Trazas: 'file' (JSON Lines), 'otlp' (colector OTLP/HTTP) o '' (desactivado)
+	TRACING: str
+	TRACE_FILE: str
+	OTLP_ENDPOINT: str
+
+	# 'interactive' (consola rich) o 'service' (texto plano, menos hilos y memoria)
+	RUN_MODE: str
+	# Copia del log y de la consola en JSON Lines ('' = desactivado)
+	LOG_JSON_FILE: str
+
+	# Event loop: aviso por lag (0 = sin vigilancia), bloqueo que lo marca como
+	# no sano, archivo de latido ('' = ninguno) y puerto de /health (0 = no)
+	LOOP_LAG_WARN_MS: int
+	LOOP_STALL_SECONDS: int
+	HEARTBEAT_FILE: str
+	HEALTH_PORT: int
+
+	# Cola de compras (primero la salida más próxima)
+	PURCHASE_WORKERS: int
+	PURCHASE_QUEUE_SIZE: int
+	# Toda la compra debe terminar antes de la salida menos este margen
+	PURCHASE_DEADLINE_MARGIN_MINUTES: int
+
+	# Horarios alternativos si el configurado no existe
+	FALLBACK_TOLERANCE_MINUTES: int
+	FALLBACK_MAX_OPTIONS: int
+
+	# Vigilancia de disponibilidad para viajes no encontrados o llenos
+	AVAILABILITY_WATCH: bool
+	WATCH_ACTION: str
+	WATCH_REQUESTS_PER_MINUTE: int
+	WATCH_MIN_INTERVAL_SECONDS: int
+	WATCH_MAX_INTERVAL_SECONDS: int
+
+	# Derivados (precalculados en build)
+	HIFE_CLIENT_ID_VALIDATED: Optional[int] = None
+	headers: Mapping[str, str] = MappingProxyType({})
+	schedule: Mapping[int, Mapping[str, Optional[str]]] = MappingProxyType({})
+	trip_ids: Mapping[int, Mapping[str, Optional[str]]] = MappingProxyType({})
+
+	@classmethod
+	def build(cls, settings: Mapping[str, object]) -> 'ConfigSnapshot':
+		"""Crea un snapshot a partir de read_settings() y calcula los campos derivados"""
+		base = cls(**{
+		    key: value
+		    for key, value in settings.items() if key not in _DERIVED_FIELDS
+		})
 		try:
-			return int(env_value)
+			client_id = int(base.HIFE_CLIENT_ID) if base.HIFE_CLIENT_ID else None
 		except ValueError:
-			logger.warning(
-			    f"Invalid value for {name}: '{env_value}', using default: {default}"
-			)
-			return int(default)
+			client_id = None
+		return base._replace(HIFE_CLIENT_ID_VALIDATED=client_id,
+		                     headers=MappingProxyType(base._build_headers()),
+		                     schedule=base._compile_schedule(),
+		                     trip_ids=base._compile_trip_ids())
 
-	@classmethod
-	def get_schedule(cls) -> Dict[int, Dict[str, Optional[str]]]:
+	def settings(self) -> Dict[str, object]:
+		"""Opciones de este snapshot sin los campos derivados"""
+		return {
+		    key: value
+		    for key, value in self._asdict().items() if key not in _DERIVED_FIELDS
+		}
+
+	def _compile_schedule(self) -> Mapping[int, Mapping[str, Optional[str]]]:
 		schedule = {}
 		day_map = {
 		    0: ('OUTWARD_TIME_MONDAY', 'RETURN_TIME_MONDAY'),
@@ -103,8 +391,8 @@ class Config:
 
 		for day, (outward_key, return_key) in day_map.items():
 			# Obtener valores específicos del día
-			outward_specific = getattr(cls, outward_key)
-			return_specific = getattr(cls, return_key)
+			outward_specific = getattr(self, outward_key)
+			return_specific = getattr(self, return_key)
 
 			# Normalizar valores específicos: convertir 'None' string y vacíos a None
 			if not outward_specific or outward_specific == 'None' or outward_specific == '':
@@ -113,8 +401,8 @@ class Config:
 				return_specific = None
 
 			# Usar default si el valor específico es None o está vacío
-			outward_time = outward_specific if outward_specific else cls.OUTWARD_TIME_DEFAULT
-			return_time = return_specific if return_specific else cls.RETURN_TIME_DEFAULT
+			outward_time = outward_specific if outward_specific else self.OUTWARD_TIME_DEFAULT
+			return_time = return_specific if return_specific else self.RETURN_TIME_DEFAULT
 
 			# Normalizar defaults también: convertir 'None' string y vacíos a None
 			if not outward_time or outward_time == 'None' or outward_time == '':
@@ -124,66 +412,231 @@ class Config:
 
 			# Agregar al schedule si al menos uno de los valores está configurado
 			if outward_time or return_time:
-				schedule[day] = {"ida": outward_time, "vuelta": return_time}
+				schedule[day] = MappingProxyType({
+				    "ida": outward_time,
+				    "vuelta": return_time
+				})
 
-		return schedule
+		return MappingProxyType(schedule)
 
-	@classmethod
-	def get_headers(cls) -> Dict[str, str]:
+	def _compile_trip_ids(self) -> Mapping[int, Mapping[str, Optional[str]]]:
+		"""IDs de viaje por día como get_schedule(): el del día o, si ese día usa la hora por defecto, el ID por defecto"""
+
+		def trip_id(value):
+			# Solo IDs numéricos (descarta vacíos y marcadores como IDHORARIO)
+			value = (value or '').strip()
+			return value if value.isdigit() else None
+
+		trip_ids = {}
+		days = ('MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY')
+		for day, name in enumerate(days):
+			ids = {}
+			for trip_type, prefix in (('ida', 'OUTWARD'), ('vuelta', 'RETURN')):
+				specific_time = getattr(self, f"{prefix}_TIME_{name}")
+				ids[trip_type] = trip_id(getattr(self, f"{prefix}_TRIP_ID_{name}"))
+				if ids[trip_type] is None and (not specific_time or
+				                               specific_time == 'None'):
+					ids[trip_type] = trip_id(getattr(self,
+					                                 f"{prefix}_TRIP_ID_DEFAULT"))
+			if ids['ida'] or ids['vuelta']:
+				trip_ids[day] = MappingProxyType(ids)
+		return MappingProxyType(trip_ids)
+
+	def get_trip_id(self, trip_type: str, weekday: int) -> Optional[str]:
+		"""ID de viaje configurado para 'ida'/'vuelta' ese día de la semana, o None"""
+		return self.trip_ids.get(weekday, {}).get(trip_type)
+
+	def _build_headers(self) -> Dict[str, str]:
 		return {
-		    'accept':
-		    'application/json; charset=utf-8',
-		    'app-version':
-		    cls.HIFE_APP_VERSION,
-		    'authorization':
-		    cls.HIFE_AUTH_TOKEN,
-		    'content-type':
-		    'application/json; charset=utf-8',
-		    'user-agent':
-		    'Dalvik/2.1.0 (Linux; U; Android 12; SM-S916U Build/9643478.0)'
+		    'accept': 'application/json; charset=utf-8',
+		    'app-version': self.HIFE_APP_VERSION,
+		    'authorization': self.HIFE_AUTH_TOKEN,
+		    'content-type': 'application/json; charset=utf-8',
+		    'user-agent': _USER_AGENT
 		}
 
-	@classmethod
-	def validate(cls):
-		errors = []
+	def get_schedule(self) -> Mapping[int, Mapping[str, Optional[str]]]:
+		return self.schedule
 
-		# Validate and convert HIFE_CLIENT_ID
-		if not cls.HIFE_CLIENT_ID:
-			errors.append("HIFE_CLIENT_ID no configurado")
-		else:
+	def get_headers(self) -> Mapping[str, str]:
+		return self.headers
+
+	def get_auto_confirm_minutes(self, trip_type: str) -> Optional[int]:
+		"""Minutos hasta la compra automática para 'ida'/'vuelta', o None si está desactivada"""
+		specific = self.OUTWARD_AUTO_CONFIRM_MINUTES if trip_type == "ida" else self.RETURN_AUTO_CONFIRM_MINUTES
+		minutes = self.AUTO_CONFIRM_MINUTES
+		if specific:
 			try:
-				cls.HIFE_CLIENT_ID_VALIDATED = int(cls.HIFE_CLIENT_ID)
+				minutes = int(specific)
 			except ValueError:
-				errors.append(
-				    f"HIFE_CLIENT_ID debe ser un número entero, valor recibido: '{cls.HIFE_CLIENT_ID}'"
+				logger.warning(
+				    f"Invalid auto-confirm value for {trip_type}: '{specific}', using AUTO_CONFIRM_MINUTES"
 				)
+		return minutes if minutes and minutes > 0 else None
+
+	def validate(self):
+		errors = []
+
+		# Validate HIFE_CLIENT_ID (the integer value is precomputed in build)
+		if not self.HIFE_CLIENT_ID:
+			errors.append("HIFE_CLIENT_ID no configurado")
+		elif self.HIFE_CLIENT_ID_VALIDATED is None:
+			errors.append(
+			    f"HIFE_CLIENT_ID debe ser un número entero, valor recibido: '{self.HIFE_CLIENT_ID}'"
+			)
 
-		if not cls.TELEGRAM_TOKEN:
+		if not self.TELEGRAM_TOKEN:
 			errors.append("TELEGRAM_TOKEN no configurado")
-		if not cls.TELEGRAM_USER_ID:
+		if not self.TELEGRAM_USER_ID:
 			errors.append("TELEGRAM_USER_ID no configurado")
-		if not cls.HIFE_AUTH_TOKEN and not (cls.HIFE_EMAIL and cls.HIFE_PASSWORD):
+		if not self.HIFE_AUTH_TOKEN and not (self.HIFE_EMAIL and self.HIFE_PASSWORD):
 			errors.append("HIFE_AUTH_TOKEN o credenciales de email/password no configurados")
-		if not cls.ORIGIN_ID:
+		if not self.ORIGIN_ID:
 			errors.append("ORIGIN_ID no configurado")
-		if not cls.ORIGIN_STOP_CODE:
+		if not self.ORIGIN_STOP_CODE:
 			errors.append("ORIGIN_STOP_CODE no configurado")
-		if not cls.DESTINATION_ID:
+		if not self.DESTINATION_ID:
 			errors.append("DESTINATION_ID no configurado")
-		if not cls.DESTINATION_STOP_CODE:
+		if not self.DESTINATION_STOP_CODE:
 			errors.append("DESTINATION_STOP_CODE no configurado")
-		if not cls.BONUS_ID:
+		if not self.BONUS_ID:
 			errors.append("BONUS_ID no configurado")
+		if self.TICKET_QUANTITY < 1:
+			errors.append(
+			    f"TICKET_QUANTITY debe ser al menos 1, valor recibido: {self.TICKET_QUANTITY}"
+			)
+		try:
+			datetime.datetime.strptime(self.WARMUP_TIME, "%H:%M")
+		except ValueError:
+			errors.append(
+			    f"WARMUP_TIME debe tener formato HH:MM, valor recibido: '{self.WARMUP_TIME}'"
+			)
+		if self.WATCH_ACTION not in ('notify', 'buy'):
+			errors.append(
+			    f"WATCH_ACTION debe ser 'notify' o 'buy', valor recibido: '{self.WATCH_ACTION}'"
+			)
+
+		if self.HTTP_CASSETTE_MODE not in ('', 'record', 'replay'):
+			errors.append(
+			    f"HTTP_CASSETTE_MODE debe ser 'record', 'replay' o vacío, valor recibido: '{self.HTTP_CASSETTE_MODE}'"
+			)
+		if self.HTTP_CASSETTE_TIMING not in ('original', 'zero'):
+			errors.append(
+			    f"HTTP_CASSETTE_TIMING debe ser 'original' o 'zero', valor recibido: '{self.HTTP_CASSETTE_TIMING}'"
+			)
+
+		if self.PROFILE_MODE not in ('', 'cprofile'):
+			errors.append(
+			    f"PROFILE_MODE debe ser 'cprofile' o vacío, valor recibido: '{self.PROFILE_MODE}'"
+			)
 
-		schedule = cls.get_schedule()
-		if not schedule:
+		if self.TRACING not in ('', 'file', 'otlp'):
+			errors.append(
+			    f"TRACING debe ser 'file', 'otlp' o vacío, valor recibido: '{self.TRACING}'"
+			)
+
+		if not 0 <= self.HEDGE_PERCENTILE < 100:
+			errors.append(
+			    f"HEDGE_PERCENTILE debe estar entre 0 y 99, valor recibido: {self.HEDGE_PERCENTILE}"
+			)
+		if not 0 <= self.HEDGE_MAX_PERCENT <= 100:
+			errors.append(
+			    f"HEDGE_MAX_PERCENT debe estar entre 0 y 100, valor recibido: {self.HEDGE_MAX_PERCENT}"
+			)
+
+		if self.PURCHASE_DEADLINE_MARGIN_MINUTES < 0:
+			errors.append(
+			    f"PURCHASE_DEADLINE_MARGIN_MINUTES no puede ser negativo, valor recibido: {self.PURCHASE_DEADLINE_MARGIN_MINUTES}"
+			)
+
+		if self.RUN_MODE not in ('interactive', 'service'):
+			errors.append(
+			    f"RUN_MODE debe ser 'interactive' o 'service', valor recibido: '{self.RUN_MODE}'"
+			)
+
+		if not self.schedule:
 			errors.append("No hay horarios configurados")
 
 		return len(errors) == 0, errors
 
 
-# Initialize notification settings at module level with safe parsing
-Config.NOTIFICATION_ADVANCE_MINUTES = Config.parse_int_env(
-    'NOTIFICATION_ADVANCE_MINUTES', '120')
-Config.CHECK_INTERVAL_MINUTES = Config.parse_int_env('CHECK_INTERVAL_MINUTES',
-                                                     '10')
+_DERIVED_FIELDS = frozenset(
+    ('HIFE_CLIENT_ID_VALIDATED', 'headers', 'schedule', 'trip_ids'))
+
+# Snapshot vigente. Los lectores solo leen esta referencia (sin locks); los
+# escritores construyen uno nuevo y lo sustituyen bajo _write_lock.
+_current: ConfigSnapshot = None
+_write_lock = threading.Lock()
+_file_settings: Dict[str, object] = {}
+
+
+def current_config() -> ConfigSnapshot:
+	"""Snapshot vigente; úsalo para leer varias opciones de forma coherente"""
+	return _current
+
+
+def update_config(**changes) -> ConfigSnapshot:
+	"""Sustituye el snapshot vigente por uno con `changes` aplicados"""
+	global _current
+	with _write_lock:
+		_current = ConfigSnapshot.build({**_current.settings(), **changes})
+		return _current
+
+
+class _ConfigProxy:
+	"""`Config.X` lee siempre del snapshot vigente. No admite asignaciones"""
+
+	__slots__ = ()
+
+	def __getattr__(self, name):
+		return getattr(_current, name)
+
+	def __setattr__(self, name, value):
+		raise AttributeError(
+		    f"La configuración es inmutable; usa update_config({name}=...)")
+
+
+Config = _ConfigProxy()
+
+
+def reload_config(path: str = None) -> Tuple[bool, list, Set[str]]:
+	"""Vuelve a leer el .env, lo valida y aplica solo las opciones que cambiaron.
+
+	Devuelve (válido, errores, claves cambiadas). Si la nueva configuración no
+	es válida no se aplica nada y se mantiene la anterior. Solo se comparan los
+	valores del archivo entre sí, así que un token renovado en memoria no se
+	pisa salvo que el propio HIFE_AUTH_TOKEN del .env haya cambiado.
+	"""
+	global _current, _file_settings
+	file_values = read_env_file(path or ENV_FILE)
+	# Igual que al arrancar: lo exportado en el entorno tiene prioridad
+	for key in file_values.keys() & _startup_environ.keys():
+		if file_values[key] != _startup_environ[key]:
+			logger.warning(
+			    f"{key} está definido en el entorno del proceso; se ignora el valor del .env"
+			)
+	settings = read_settings({**file_values, **_startup_environ})
+
+	with _write_lock:
+		changed = {
+		    key
+		    for key, value in settings.items()
+		    if _file_settings.get(key) != value
+		}
+		candidate = ConfigSnapshot.build({
+		    **_current.settings(),
+		    **{key: settings[key]
+		       for key in changed}
+		})
+		is_valid, errors = candidate.validate()
+		if not is_valid:
+			return False, errors, set()
+
+		_current = candidate
+		_file_settings = settings
+	return True, [], changed
+
+
+# Cargar la configuración inicial desde el entorno (.env ya volcado por load_dotenv)
+_file_settings = read_settings(os.environ)
+_current = ConfigSnapshot.build(_file_settings)
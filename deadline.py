@@ -0,0 +1,58 @@
+"""
+Plazo único de principio a fin para una compra.
+
+Cada compra lleva un `Deadline` (la salida del autobús menos un margen) que se
+pasa a todas las llamadas a la API. Los timeouts HTTP, las esperas entre
+reintentos y la renovación del token usan solo lo que queda de ese plazo, en
+lugar de su propio máximo fijo. Cuando no queda tiempo se lanza
+`DeadlineExceeded` y la compra se abandona.
+"""
+import math
+import time
+
+# Por debajo de este margen (s) no merece la pena empezar una petición
+MIN_REQUEST_SECONDS = 1.0
+
+
+class DeadlineExceeded(Exception):
+	"""Ya no queda tiempo para completar el trabajo antes del plazo"""
+
+
+class Deadline:
+	"""Instante límite (timestamp) con ayudas para timeouts y esperas"""
+
+	__slots__ = ('at', )
+
+	def __init__(self, at: float):
+		self.at = at
+
+	@property
+	def remaining(self) -> float:
+		return self.at - time.time()
+
+	@property
+	def expired(self) -> bool:
+		"""No queda tiempo ni para una petición más"""
+		return self.remaining < MIN_REQUEST_SECONDS
+
+	def timeout(self, cap: float) -> float:
+		"""Timeout para la próxima petición: `cap` o lo que quede del plazo si es menos"""
+		remaining = self.remaining
+		if remaining < MIN_REQUEST_SECONDS:
+			raise DeadlineExceeded(
+			    f"Plazo agotado ({max(remaining, 0):.1f} s restantes)")
+		return min(cap, remaining)
+
+	def sleep(self, seconds: float):
+		"""Espera `seconds` si cabe en el plazo (con tiempo para otra petición)"""
+		if seconds + MIN_REQUEST_SECONDS > self.remaining:
+			raise DeadlineExceeded(
+			    f"No queda tiempo para esperar {seconds:.0f} s y reintentar")
+		time.sleep(seconds)
+
+	def __repr__(self):
+		return f"Deadline({self.remaining:.1f} s)"
+
+
+# Sin plazo: timeouts y esperas normales (búsquedas fuera de una compra)
+NO_DEADLINE = Deadline(math.inf)
@@ -0,0 +1,108 @@
+"""
+Peticiones "hedged" para lecturas idempotentes.
+
+La latencia de algunas lecturas tiene una cola larga: de vez en cuando una
+petición tarda decenas de segundos mientras que repetirla responde en menos de
+uno. `Hedger.call()` lanza la petición y, si no ha respondido cuando se supera
+el percentil configurado de las latencias observadas, lanza una segunda igual;
+gana la primera que responda bien. Un cubo de fichas limita las peticiones
+extra a un porcentaje de las normales, así que la carga adicional está acotada
+aunque la API vaya lenta de forma sostenida.
+
+Solo para peticiones sin efectos (GET): la perdedora sigue hasta terminar y su
+respuesta se descarta.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Callable, TypeVar
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Latencias recientes con las que se calcula el percentil
+WINDOW = 100
+# Con menos muestras se usa FALLBACK_DELAY
+MIN_SAMPLES = 10
+FALLBACK_DELAY = 2.0
+MIN_DELAY = 0.1
+# Fichas acumulables: ráfaga máxima de peticiones extra
+MAX_TOKENS = 3.0
+
+
+class Hedger:
+	"""Segunda petición tras el percentil `percentile` de latencia, con un máximo de `max_percent` % extra"""
+
+	def __init__(self, pool: Executor, percentile: float, max_percent: float):
+		self.pool = pool
+		self.percentile = percentile
+		self.ratio = max_percent / 100
+		self.latencies = deque(maxlen=WINDOW)
+		# La primera petición lenta ya puede cubrirse
+		self.tokens = 1.0
+		self.sent = 0
+		self.hedged = 0
+		self.hedge_wins = 0
+		self.lock = threading.Lock()
+
+	def delay(self) -> float:
+		"""Segundos de espera antes de lanzar la segunda petición"""
+		with self.lock:
+			samples = sorted(self.latencies)
+		if len(samples) < MIN_SAMPLES:
+			return FALLBACK_DELAY
+		index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+		return max(MIN_DELAY, samples[index])
+
+	def _take_token(self) -> bool:
+		with self.lock:
+			if self.tokens < 1:
+				return False
+			self.tokens -= 1
+			self.hedged += 1
+			return True
+
+	def call(self, request: Callable[[], T]) -> T:
+		"""Ejecuta `request()` (idempotente) con una segunda copia si la primera se retrasa"""
+		with self.lock:
+			self.sent += 1
+			self.tokens = min(MAX_TOKENS, self.tokens + self.ratio)
+
+		started = time.perf_counter()
+		first = self.pool.submit(request)
+		done, _ = wait([first], timeout=self.delay())
+		if done or not self._take_token():
+			result = first.result()
+			self._record(time.perf_counter() - started)
+			return result
+
+		logger.debug("Petición lenta: se lanza una segunda copia")
+		tracing.set_attribute('http.hedged', True)
+		second = self.pool.submit(request)
+		pending = {first, second}
+		error = None
+		while pending:
+			done, pending = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				try:
+					result = future.result()
+				except Exception as e:
+					# Si una falla, todavía puede responder la otra
+					error = e
+					continue
+				if future is second:
+					with self.lock:
+						self.hedge_wins += 1
+				tracing.set_attribute('http.hedge_won', future is second)
+				self._record(time.perf_counter() - started)
+				return result
+		raise error
+
+	def _record(self, elapsed: float):
+		with self.lock:
+			self.latencies.append(elapsed)
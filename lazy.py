@@ -0,0 +1,88 @@
+"""
+Carga diferida de dependencias pesadas.
+
+rich, questionary y python-telegram-bot tardan cientos de milisegundos en
+importarse en las placas ARM pequeñas. Estos proxies retrasan el import hasta
+el primer uso real, de forma que los comandos de un solo uso y los reinicios
+desde start_bot.sh solo pagan por lo que necesitan.
+"""
+import importlib
+import re
+import sys
+
+# Etiquetas de markup de rich: [red], [/red], [bold cyan], [/]...
+_MARKUP = re.compile(r'\[/?[a-z][a-z0-9 _#=.,-]*\]|\[/\]')
+
+
+class LazyObject:
+	"""Proxy que resuelve el objeto real con `factory()` en el primer acceso."""
+
+	__slots__ = ('_factory', '_target')
+
+	def __init__(self, factory):
+		self._factory = factory
+		self._target = None
+
+	def _resolve(self):
+		if self._target is None:
+			self._target = self._factory()
+		return self._target
+
+	def __getattr__(self, name):
+		return getattr(self._resolve(), name)
+
+	def __call__(self, *args, **kwargs):
+		return self._resolve()(*args, **kwargs)
+
+
+def lazy_import(module_name: str, attr: str = None) -> LazyObject:
+	"""Devuelve un proxy del módulo (o de uno de sus atributos) sin importarlo aún."""
+
+	def factory():
+		module = importlib.import_module(module_name)
+		return getattr(module, attr) if attr else module
+
+	return LazyObject(factory)
+
+
+def lazy_console(**kwargs) -> LazyObject:
+	"""Devuelve un proxy de rich.console.Console que se crea en el primer print."""
+
+	def factory():
+		from rich.console import Console
+		return Console(**kwargs)
+
+	return LazyObject(factory)
+
+
+def strip_markup(text: str) -> str:
+	"""Texto sin las etiquetas de markup de rich"""
+	return _MARKUP.sub('', text)
+
+
+class PlainConsole:
+	"""Sustituto mínimo de rich.console.Console: texto sin markup, sin importar rich"""
+
+	def __init__(self, file=None):
+		self.file = file
+
+	def print(self, *objects, sep: str = ' ', end: str = '\n', **kwargs):
+		text = sep.join(
+		    strip_markup(obj) if isinstance(obj, str) else str(obj)
+		    for obj in objects)
+		file = self.file or sys.stdout
+		file.write(text + end)
+		file.flush()
+
+
+def service_console(**kwargs) -> LazyObject:
+	"""Como lazy_console(), pero con RUN_MODE=service devuelve una PlainConsole."""
+
+	def factory():
+		from config import Config
+		if Config.RUN_MODE == 'service':
+			return PlainConsole()
+		from rich.console import Console
+		return Console(**kwargs)
+
+	return LazyObject(factory)
@@ -0,0 +1,163 @@
+"""
+Logging y salida de consola sin bloquear el event loop.
+
+`start_logging()` deja en el logger raíz un único QueueHandler: quien registra
+un mensaje solo lo encola, y un hilo (QueueListener) lo formatea y lo escribe
+en la consola, en bot_output.log o en el archivo JSON Lines opcional. Los
+`console.print` de las compras pasan por la misma cola con `QueuedConsole`, de
+modo que el orden entre log y consola se conserva y el renderizado de rich no
+ocurre dentro de una compra.
+
+Sin el listener arrancado (comandos de un uso, benchmarks) todo se escribe
+directamente, como antes.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+from lazy import strip_markup
+
+# Rotación del archivo JSON Lines
+JSON_MAX_BYTES = 10 * 1024 * 1024
+JSON_BACKUP_COUNT = 3
+
+_queue = queue.Queue(-1)
+_listener = None
+_lock = threading.Lock()
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+	"""QueueHandler para un listener en el mismo proceso: conserva exc_info (tracebacks de rich)"""
+
+	def prepare(self, record):
+		# Solo se resuelven los argumentos (pueden cambiar después de encolar);
+		# el formato se aplica en el hilo del listener
+		record.msg = record.getMessage()
+		record.args = None
+		return record
+
+
+class _ConsoleFilter(logging.Filter):
+	"""Deja pasar solo los registros de consola (`only=True`) o todos menos ellos"""
+
+	def __init__(self, only: bool):
+		super().__init__()
+		self.only = only
+
+	def filter(self, record):
+		return hasattr(record, 'console_objects') == self.only
+
+
+class ConsoleHandler(logging.Handler):
+	"""Escribe en su consola los `print` encolados por QueuedConsole"""
+
+	def emit(self, record):
+		try:
+			record.console.print(*record.console_objects, **record.console_kwargs)
+		except Exception:
+			self.handleError(record)
+
+
+class JsonLinesFormatter(logging.Formatter):
+	"""Un objeto JSON por registro: fecha, nivel, logger, hilo y mensaje"""
+
+	def format(self, record):
+		entry = {
+		    'ts': datetime.datetime.fromtimestamp(record.created).isoformat(
+		        timespec='milliseconds'),
+		    'level': record.levelname,
+		    'logger': record.name,
+		    'thread': record.threadName,
+		    'message': record.getMessage(),
+		}
+		if hasattr(record, 'console_objects'):
+			entry['console'] = True
+		if record.exc_info:
+			entry['exc'] = self.formatException(record.exc_info)
+		return json.dumps(entry, ensure_ascii=False)
+
+
+def json_file_handler(path: str) -> logging.Handler:
+	handler = logging.handlers.RotatingFileHandler(path,
+	                                               maxBytes=JSON_MAX_BYTES,
+	                                               backupCount=JSON_BACKUP_COUNT,
+	                                               encoding='utf-8')
+	handler.setFormatter(JsonLinesFormatter())
+	return handler
+
+
+def start_logging(handler: logging.Handler,
+                  json_path: str = None,
+                  level: int = logging.INFO):
+	"""Sustituye los handlers del logger raíz por la cola y arranca el listener.
+
+	`handler` escribe los registros de log normales (consola/archivo); los
+	`print` de QueuedConsole van a su propia consola y, como todo lo demás, al
+	archivo JSON Lines si se indica `json_path`.
+	"""
+	global _listener
+	with _lock:
+		if _listener is not None:
+			return
+		handler.addFilter(_ConsoleFilter(only=False))
+		console_handler = ConsoleHandler()
+		console_handler.addFilter(_ConsoleFilter(only=True))
+		handlers = [handler, console_handler]
+		if json_path:
+			handlers.append(json_file_handler(json_path))
+
+		root = logging.getLogger()
+		for existing in list(root.handlers):
+			root.removeHandler(existing)
+		root.addHandler(_LocalQueueHandler(_queue))
+		root.setLevel(level)
+
+		_listener = logging.handlers.QueueListener(_queue,
+		                                           *handlers,
+		                                           respect_handler_level=True)
+		_listener.start()
+		atexit.register(stop_logging)
+
+
+def stop_logging():
+	"""Vacía la cola y detiene el listener (lo pendiente se escribe antes de salir)"""
+	global _listener
+	with _lock:
+		if _listener is None:
+			return
+		_listener.stop()
+		_listener = None
+
+
+_console_logger = logging.getLogger('console')
+
+
+class QueuedConsole:
+	"""Proxy de consola: con el listener activo, `print()` solo encola"""
+
+	__slots__ = ('target', )
+
+	def __init__(self, target):
+		self.target = target
+
+	def print(self, *objects, **kwargs):
+		if _listener is None:
+			self.target.print(*objects, **kwargs)
+			return
+		# Texto para el archivo JSON; la consola recibe los objetos originales
+		text = ' '.join(
+		    strip_markup(obj) if isinstance(obj, str) else type(obj).__name__
+		    for obj in objects)
+		_console_logger.info(text,
+		                     extra={
+		                         'console': self.target,
+		                         'console_objects': objects,
+		                         'console_kwargs': kwargs
+		                     })
+
+	def __getattr__(self, name):
+		return getattr(self.target, name)
@@ -0,0 +1,193 @@
+"""
+Vigilancia del event loop: retraso, bloqueos y latido.
+
+Una tarea del propio loop se despierta cada TICK_SECONDS y mide cuánto tarde
+llega (lag). Un hilo aparte comprueba que esa tarea sigue despertándose: si el
+loop lleva más de `warn_ms` sin hacerlo, alguien lo está bloqueando (una
+llamada a requests dentro de un handler, por ejemplo) y se registra la pila
+del hilo del loop en ese momento, que señala la llamada culpable.
+
+El latido se escribe desde el loop en un archivo (y a systemd si el bot se
+ejecuta con Type=notify), así que deja de actualizarse si el loop se cuelga:
+`start_bot.sh watchdog` o systemd pueden reiniciar el proceso. Opcionalmente
+un endpoint HTTP local (/health) responde 200 o 503 desde su propio hilo,
+también con el loop bloqueado.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+TICK_SECONDS = 0.5
+HEARTBEAT_SECONDS = 10
+# Líneas de la pila que se registran al detectar un bloqueo
+STACK_LINES = 12
+
+
+def _sd_notify(message: bytes):
+	"""Aviso a systemd (READY=1, WATCHDOG=1) si el bot corre como servicio Type=notify"""
+	address = os.environ.get('NOTIFY_SOCKET')
+	if not address:
+		return
+	if address.startswith('@'):
+		address = '\0' + address[1:]
+	try:
+		with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+			sock.sendto(message, address)
+	except OSError as e:
+		logger.debug(f"No se pudo avisar a systemd: {e}")
+
+
+class LoopMonitor:
+	"""Mide el lag del loop, detecta bloqueos y mantiene el latido"""
+
+	def __init__(self,
+	             warn_ms: int,
+	             stall_seconds: float,
+	             heartbeat_file: str = '',
+	             health_port: int = 0):
+		self.warn = warn_ms / 1000
+		self.stall_seconds = stall_seconds
+		self.heartbeat_file = heartbeat_file
+		self.health_port = health_port
+		self.lag = 0.0
+		self.max_lag = 0.0
+		self.blocked = 0
+		self.last_tick = time.monotonic()
+		self._loop_thread = None
+		self._task = None
+		self._stop = threading.Event()
+		self._watchdog = None
+		self._server = None
+
+	def start(self):
+		"""Arranca la tarea de medida (llamar desde el event loop) y el hilo vigilante"""
+		self._loop_thread = threading.get_ident()
+		self.last_tick = time.monotonic()
+		self._task = asyncio.get_running_loop().create_task(self._tick())
+		self._watchdog = threading.Thread(target=self._watch,
+		                                  name='loop-watchdog',
+		                                  daemon=True)
+		self._watchdog.start()
+		if self.health_port:
+			self._start_health_server()
+		_sd_notify(b'READY=1')
+
+	async def stop(self):
+		self._stop.set()
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+		if self._server is not None:
+			self._server.shutdown()
+		if self.heartbeat_file:
+			try:
+				os.remove(self.heartbeat_file)
+			except OSError:
+				pass
+
+	@property
+	def healthy(self) -> bool:
+		return time.monotonic() - self.last_tick < self.stall_seconds
+
+	def status(self) -> dict:
+		return {
+		    'pid': os.getpid(),
+		    'time': time.time(),
+		    'healthy': self.healthy,
+		    'since_tick_ms': round((time.monotonic() - self.last_tick) * 1000),
+		    'lag_ms': round(self.lag * 1000, 1),
+		    'max_lag_ms': round(self.max_lag * 1000, 1),
+		    'blocked': self.blocked,
+		}
+
+	async def _tick(self):
+		last_beat = 0.0
+		while True:
+			expected = time.monotonic() + TICK_SECONDS
+			await asyncio.sleep(TICK_SECONDS)
+			now = time.monotonic()
+			self.lag = max(0.0, now - expected)
+			self.max_lag = max(self.max_lag, self.lag)
+			self.last_tick = now
+			if self.lag >= self.warn:
+				logger.warning(f"Event loop bloqueado {self.lag * 1000:.0f} ms "
+				               f"(máximo {self.max_lag * 1000:.0f} ms)")
+			if now - last_beat >= HEARTBEAT_SECONDS:
+				last_beat = now
+				self._beat()
+
+	def _beat(self):
+		_sd_notify(b'WATCHDOG=1')
+		if not self.heartbeat_file:
+			return
+		try:
+			# Escritura atómica: el script nunca lee un latido a medias
+			tmp = f"{self.heartbeat_file}.tmp"
+			with open(tmp, 'w') as f:
+				json.dump(self.status(), f)
+			os.replace(tmp, self.heartbeat_file)
+		except OSError as e:
+			logger.warning(f"No se pudo escribir el latido: {e}")
+
+	def _watch(self):
+		reported = False
+		while not self._stop.wait(TICK_SECONDS):
+			stalled = time.monotonic() - self.last_tick - TICK_SECONDS
+			if stalled < self.warn:
+				reported = False
+				continue
+			if reported:
+				continue
+			# Una vez por bloqueo: la pila del loop señala la llamada bloqueante
+			reported = True
+			self.blocked += 1
+			frame = sys._current_frames().get(self._loop_thread)
+			stack = ''.join(
+			    traceback.format_stack(frame)[-STACK_LINES:]) if frame else ''
+			logger.warning(
+			    f"Event loop sin responder desde hace {stalled * 1000:.0f} ms; "
+			    f"ejecutando:\n{stack}")
+
+	def _start_health_server(self):
+		from http.server import BaseHTTPRequestHandler, HTTPServer
+
+		monitor = self
+
+		class HealthHandler(BaseHTTPRequestHandler):
+
+			def do_GET(self):
+				if self.path.rstrip('/') not in ('', '/health'):
+					self.send_error(404)
+					return
+				body = json.dumps(monitor.status()).encode()
+				self.send_response(200 if monitor.healthy else 503)
+				self.send_header('Content-Type', 'application/json')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				pass
+
+		try:
+			self._server = HTTPServer(('127.0.0.1', self.health_port),
+			                          HealthHandler)
+		except OSError as e:
+			logger.error(
+			    f"No se pudo abrir el endpoint de salud en el puerto {self.health_port}: {e}")
+			return
+		threading.Thread(target=self._server.serve_forever,
+		                 name='health-http',
+		                 daemon=True).start()
+		logger.info(f"Endpoint de salud: http://127.0.0.1:{self.health_port}/health")
@@ -0,0 +1,66 @@
+"""
+Caché de resoluciones DNS para los hosts de la API.
+
+requests/urllib3 resuelven el nombre del host en cada conexión nueva. Con la
+caché instalada, las resoluciones de los hosts indicados se reutilizan durante
+`ttl` segundos, de modo que abrir una conexión justo antes de comprar no
+depende de un DNS lento. El resto de hosts no se ven afectados.
+"""
+import socket
+import threading
+import time
+from typing import Iterable
+
+_original_getaddrinfo = socket.getaddrinfo
+
+
+class DnsCache:
+	"""getaddrinfo con caché (TTL) solo para un conjunto de hosts"""
+
+	def __init__(self, ttl: float):
+		self.ttl = ttl
+		self.hosts = set()
+		self._cache = {}
+		self.lock = threading.Lock()
+
+	def getaddrinfo(self, host, port, *args, **kwargs):
+		if host not in self.hosts:
+			return _original_getaddrinfo(host, port, *args, **kwargs)
+
+		key = (host, port, args, tuple(sorted(kwargs.items())))
+		now = time.monotonic()
+		with self.lock:
+			cached = self._cache.get(key)
+		if cached is not None and cached[0] > now:
+			return cached[1]
+
+		result = _original_getaddrinfo(host, port, *args, **kwargs)
+		with self.lock:
+			self._cache[key] = (now + self.ttl, result)
+		return result
+
+	def clear(self):
+		with self.lock:
+			self._cache.clear()
+
+
+_installed = None
+
+
+def install_dns_cache(hosts: Iterable[str], ttl: float) -> DnsCache:
+	"""Activa la caché para `hosts` (se puede llamar de nuevo para cambiarlos o cambiar el TTL)"""
+	global _installed
+	if _installed is None:
+		_installed = DnsCache(ttl)
+		socket.getaddrinfo = _installed.getaddrinfo
+	_installed.ttl = ttl
+	_installed.hosts = set(host for host in hosts if host)
+	_installed.clear()
+	return _installed
+
+
+def uninstall_dns_cache():
+	global _installed
+	if _installed is not None:
+		socket.getaddrinfo = _original_getaddrinfo
+		_installed = None
@@ -0,0 +1,169 @@
+"""
+Cola de salida de mensajes de Telegram.
+
+Todos los envíos y ediciones pasan por una única cola que respeta los límites
+de Telegram (por chat y globales), reintenta tras un `RetryAfter` (429) o un
+error de red y fusiona los avisos repetidos que siguen pendientes en uno solo.
+"""
+import asyncio
+import datetime
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Límites de Telegram: ~1 mensaje/s por chat y ~30 mensajes/s en total
+PER_CHAT_INTERVAL = 1.0
+GLOBAL_PER_SECOND = 25
+MAX_RETRIES = 3
+
+
+class _Outgoing:
+	__slots__ = ('method', 'kwargs', 'futures', 'coalesce_key', 'count')
+
+	def __init__(self, method, kwargs, future, coalesce_key):
+		self.method = method
+		self.kwargs = kwargs
+		self.futures = [future]
+		self.coalesce_key = coalesce_key
+		self.count = 1
+
+
+class Outbox:
+	"""Cola única de mensajes salientes con control de flood"""
+
+	def __init__(self,
+	             bot,
+	             per_chat_interval: float = PER_CHAT_INTERVAL,
+	             global_per_second: int = GLOBAL_PER_SECOND,
+	             max_retries: int = MAX_RETRIES):
+		self.bot = bot
+		self.per_chat_interval = per_chat_interval
+		self.global_per_second = global_per_second
+		self.max_retries = max_retries
+		self._queue = None
+		self._worker = None
+		self._pending = {}
+		self._last_sent = {}
+		self._recent = deque()
+
+	@property
+	def depth(self) -> int:
+		return self._queue.qsize() if self._queue is not None else 0
+
+	async def send(self, chat_id, text: str, coalesce_key: str = None,
+	               **kwargs):
+		"""Encola un send_message y espera al Message enviado.
+
+		Los envíos con el mismo `coalesce_key` que aún no han salido se fusionan
+		en un único mensaje con el número de repeticiones.
+		"""
+		return await self._enqueue('send_message',
+		                           dict(chat_id=chat_id, text=text, **kwargs),
+		                           coalesce_key)
+
+	async def edit(self, chat_id, message_id, text: str, **kwargs):
+		"""Encola un edit_message_text; las ediciones pendientes del mismo mensaje se sustituyen por la última"""
+		return await self._enqueue(
+		    'edit_message_text',
+		    dict(chat_id=chat_id, message_id=message_id, text=text, **kwargs),
+		    f"edit|{chat_id}|{message_id}")
+
+	async def stop(self):
+		if self._worker is not None:
+			self._worker.cancel()
+			try:
+				await self._worker
+			except asyncio.CancelledError:
+				pass
+			self._worker = None
+
+	async def _enqueue(self, method: str, kwargs: dict, coalesce_key: str):
+		loop = asyncio.get_running_loop()
+		if self._queue is None:
+			self._queue = asyncio.Queue()
+		if self._worker is None or self._worker.done():
+			self._worker = loop.create_task(self._run())
+
+		future = loop.create_future()
+		pending = self._pending.get(coalesce_key) if coalesce_key else None
+		if pending is not None:
+			pending.futures.append(future)
+			if method == 'edit_message_text':
+				pending.kwargs = kwargs
+			else:
+				pending.count += 1
+		else:
+			item = _Outgoing(method, kwargs, future, coalesce_key)
+			if coalesce_key:
+				self._pending[coalesce_key] = item
+			self._queue.put_nowait(item)
+		return await future
+
+	async def _run(self):
+		while True:
+			item = await self._queue.get()
+			if item.coalesce_key:
+				self._pending.pop(item.coalesce_key, None)
+			try:
+				result = await self._deliver(item)
+			except Exception as e:
+				for future in item.futures:
+					if not future.done():
+						future.set_exception(e)
+			else:
+				for future in item.futures:
+					if not future.done():
+						future.set_result(result)
+			finally:
+				self._queue.task_done()
+
+	async def _throttle(self, chat_id):
+		# Límite por chat
+		last = self._last_sent.get(chat_id)
+		if last is not None:
+			wait = self.per_chat_interval - (time.monotonic() - last)
+			if wait > 0:
+				await asyncio.sleep(wait)
+		# Límite global (ventana deslizante de 1 s)
+		while len(self._recent) >= self.global_per_second:
+			wait = 1.0 - (time.monotonic() - self._recent[0])
+			if wait > 0:
+				await asyncio.sleep(wait)
+			self._recent.popleft()
+
+	async def _deliver(self, item: _Outgoing):
+		from telegram.error import BadRequest, NetworkError, RetryAfter
+
+		kwargs = dict(item.kwargs)
+		if item.count > 1:
+			kwargs['text'] = f"{kwargs['text']}\n\n(×{item.count} avisos iguales)"
+
+		chat_id = kwargs.get('chat_id')
+		for attempt in range(self.max_retries + 1):
+			await self._throttle(chat_id)
+			now = time.monotonic()
+			self._last_sent[chat_id] = now
+			self._recent.append(now)
+			try:
+				return await getattr(self.bot, item.method)(**kwargs)
+			except RetryAfter as e:
+				if attempt == self.max_retries:
+					raise
+				retry_after = e.retry_after
+				if isinstance(retry_after, datetime.timedelta):
+					retry_after = retry_after.total_seconds()
+				logger.warning(
+				    f"Telegram flood control: reintentando en {retry_after}s")
+				await asyncio.sleep(retry_after)
+			except BadRequest:
+				# Hereda de NetworkError pero no es transitorio
+				raise
+			except NetworkError as e:
+				if attempt == self.max_retries:
+					raise
+				delay = 2**attempt
+				logger.warning(
+				    f"Error de red enviando a Telegram ({e}), reintentando en {delay}s")
+				await asyncio.sleep(delay)
@@ -0,0 +1,127 @@
+"""
+Perfilado opcional de compras y revisiones del horario.
+
+Con PROFILE_MODE=cprofile las funciones decoradas con `@profiled(nombre)` se
+ejecutan bajo cProfile y cada llamada deja un archivo .pstats en PROFILE_DIR
+(se conservan los PROFILE_KEEP más recientes de cada nombre). Con
+PROFILE_MEMORY=true se añade un resumen de tracemalloc (.alloc.txt) con las
+líneas que más memoria reservaron durante la llamada.
+
+La decisión se toma al importar: con el perfilado desactivado el decorador
+devuelve la función original, sin ningún coste. Los .pstats se pueden ver con
+`python -m pstats` o convertir en flamegraph con herramientas como snakeviz.
+"""
+import cProfile
+import functools
+import glob
+import inspect
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Líneas del resumen de tracemalloc
+TOP_ALLOCATIONS = 25
+
+# Un solo perfil activo a la vez (cProfile no admite perfiles anidados ni, desde
+# Python 3.12, simultáneos entre hilos); las llamadas solapadas no se perfilan
+_active = threading.Lock()
+
+
+def _rotate(directory: str, name: str, keep: int):
+	"""Borra los perfiles de `name` más antiguos y deja los `keep` más recientes"""
+	# Los nombres llevan fecha y hora, así que el orden alfabético es el temporal
+	stems = sorted({
+	    path.split('.', 1)[0]
+	    for path in os.listdir(directory) if path.startswith(f"{name}-")
+	})
+	for stem in stems[:-keep] if keep > 0 else []:
+		for path in glob.glob(os.path.join(directory, f"{stem}.*")):
+			os.remove(path)
+
+
+class _Profile:
+	"""Contexto de una llamada perfilada"""
+
+	def __init__(self, name: str):
+		self.name = name
+		self.profile = None
+		self.started_tracemalloc = False
+
+	def __enter__(self):
+		if not _active.acquire(blocking=False):
+			return self
+		self.profile = cProfile.Profile()
+		if Config.PROFILE_MEMORY and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self.started_tracemalloc = True
+		self.started = time.perf_counter()
+		self.profile.enable()
+		return self
+
+	def __exit__(self, *exc):
+		if self.profile is None:
+			return False
+		self.profile.disable()
+		try:
+			self._write()
+		except OSError as e:
+			logger.warning(f"No se pudo guardar el perfil de {self.name}: {e}")
+		finally:
+			if self.started_tracemalloc:
+				tracemalloc.stop()
+			_active.release()
+		return False
+
+	def _write(self):
+		elapsed_ms = (time.perf_counter() - self.started) * 1000
+		directory = Config.PROFILE_DIR
+		os.makedirs(directory, exist_ok=True)
+		stem = os.path.join(
+		    directory, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-"
+		    f"{time.time_ns() % 10**9:09d}")
+		self.profile.dump_stats(f"{stem}.pstats")
+
+		if tracemalloc.is_tracing():
+			snapshot = tracemalloc.take_snapshot()
+			current, peak = tracemalloc.get_traced_memory()
+			with open(f"{stem}.alloc.txt", 'w', encoding='utf-8') as f:
+				f.write(f"{self.name}: {elapsed_ms:.1f} ms, memoria actual "
+				        f"{current / 1024:.1f} KiB, pico {peak / 1024:.1f} KiB\n\n")
+				for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+					f.write(f"{stat}\n")
+
+		_rotate(directory, self.name, Config.PROFILE_KEEP)
+		logger.info(f"Perfil guardado: {stem}.pstats ({elapsed_ms:.1f} ms)")
+
+
+def profiled(name: str):
+	"""Perfila cada llamada a la función decorada si PROFILE_MODE lo activa"""
+
+	def decorator(func):
+		if Config.PROFILE_MODE != 'cprofile':
+			return func
+
+		if inspect.iscoroutinefunction(func):
+
+			@functools.wraps(func)
+			async def async_wrapper(*args, **kwargs):
+				# Incluye lo que otras tareas ejecuten durante los await
+				with _Profile(name):
+					return await func(*args, **kwargs)
+
+			return async_wrapper
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with _Profile(name):
+				return func(*args, **kwargs)
+
+		return wrapper
+
+	return decorator
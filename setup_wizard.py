@@ -2,13 +2,14 @@ import os
 import re
 import requests
 from getpass import getpass
-from rich.console import Console
 from auth import get_hife_token
-from rich.panel import Panel
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.text import Text
-import questionary
+from lazy import lazy_console, lazy_import
+
+# rich y questionary se cargan en el primer uso para que importar las
+# utilidades del asistente (validaciones, generación de .env) sea barato
+Panel = lazy_import('rich.panel', 'Panel')
+Table = lazy_import('rich.table', 'Table')
+questionary = lazy_import('questionary')
 """
 HIFE BOT - Asistente de configuración
 
@@ -26,7 +27,7 @@ Licencia: MIT
 Versión: 1.0
 """
 
-console = Console()
+console = lazy_console()
 
 
 def print_header(text, icon="📋"):
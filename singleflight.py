@@ -0,0 +1,41 @@
+"""
+Ejecución única de tareas asíncronas por clave.
+
+Mientras una tarea con una clave está en curso, las peticiones con la misma
+clave no lanzan otra: esperan a la que ya corre y reciben su mismo resultado.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable, Tuple
+
+
+class SingleFlight:
+	"""Agrupa llamadas concurrentes con la misma clave en una sola ejecución"""
+
+	def __init__(self):
+		self._running = {}
+
+	def __contains__(self, key: Hashable) -> bool:
+		return key in self._running
+
+	async def do(self, key: Hashable,
+	             factory: Callable[[], Awaitable]) -> Tuple[object, bool]:
+		"""Ejecuta `factory()` salvo que ya haya una con `key` en curso.
+
+		Devuelve (resultado, compartido): `compartido` es True si la llamada se
+		unió a una ejecución ya en marcha.
+		"""
+		task = self._running.get(key)
+		if task is not None:
+			# shield: cancelar al que espera no cancela la tarea del primero
+			return await asyncio.shield(task), True
+
+		task = asyncio.ensure_future(factory())
+		self._running[key] = task
+		try:
+			return await asyncio.shield(task), False
+		finally:
+			if task.done():
+				self._running.pop(key, None)
+			else:
+				# Cancelado el primero: la tarea sigue para los que esperan
+				task.add_done_callback(lambda _: self._running.pop(key, None))
@@ -12,14 +12,35 @@
 LOG_FILE="bot_output.log"
 PID_FILE="bot.pid"
 
+# Valor de una variable en .env (última línea que la define, sin comillas)
+env_value() {
+    grep -E "^[[:space:]]*$1[[:space:]]*=" .env 2>/dev/null | tail -n 1 \
+        | cut -d= -f2- | tr -d '\r' | sed -e 's/^[[:space:]]*//' -e 's/[[:space:]]*$//' \
+        -e 's/^"\(.*\)"$/\1/' -e "s/^'\(.*\)'$/\1/"
+}
+
+# Latido que escribe el bot y antigüedad máxima en segundos antes de que el
+# watchdog lo considere colgado. Igual que el bot, el entorno tiene prioridad
+# sobre el .env (vacío = el bot no escribe latido y solo se vigila el proceso)
+if [ -z "${HEARTBEAT_FILE+x}" ]; then
+    if grep -qE "^[[:space:]]*HEARTBEAT_FILE[[:space:]]*=" .env 2>/dev/null; then
+        HEARTBEAT_FILE="$(env_value HEARTBEAT_FILE)"
+    else
+        HEARTBEAT_FILE="bot.heartbeat"
+    fi
+fi
+HEARTBEAT_MAX_AGE="${HEARTBEAT_MAX_AGE:-90}"
+
 # Función para mostrar mensaje de uso
 usage() {
-    echo "Uso: $0 {start|stop|status|log}"
+    echo "Uso: $0 {start|stop|status|log|watchdog}"
     echo ""
-    echo "  start  - Inicia el bot en segundo plano"
-    echo "  stop   - Detiene el bot"
-    echo "  status - Muestra el estado del bot"
-    echo "  log    - Muestra los últimos logs en tiempo real"
+    echo "  start    - Inicia el bot en segundo plano"
+    echo "  stop     - Detiene el bot"
+    echo "  status   - Muestra el estado del bot"
+    echo "  log      - Muestra los últimos logs en tiempo real"
+    echo "  watchdog - Reinicia el bot si se ha caído o ha dejado de latir"
+    echo "             (pensado para cron: */2 * * * * cd $(pwd) && $0 watchdog)"
     echo ""
 }
 
@@ -123,6 +144,37 @@ show_status() {
     fi
 }
 
+# Función para reiniciar el bot si está caído o colgado
+watchdog_bot() {
+    # Sin archivo PID el bot se detuvo a propósito (o nunca se inició)
+    if [ ! -f "$PID_FILE" ]; then
+        return
+    fi
+
+    pid=$(cat "$PID_FILE")
+    reason=""
+    if ! ps -p "$pid" > /dev/null; then
+        reason="el proceso $pid no está en ejecución"
+    elif [ -f "$HEARTBEAT_FILE" ]; then
+        modified=$(stat -c %Y "$HEARTBEAT_FILE" 2>/dev/null || stat -f %m "$HEARTBEAT_FILE")
+        age=$(( $(date +%s) - modified ))
+        if [ "$age" -gt "$HEARTBEAT_MAX_AGE" ]; then
+            reason="el latido no se actualiza desde hace ${age}s"
+        fi
+    fi
+
+    if [ -n "$reason" ]; then
+        echo "$(date '+%Y-%m-%d %H:%M:%S') Watchdog: $reason, reiniciando el bot"
+        # Conservar el log anterior: incluye la pila del bloqueo, si la hubo
+        if [ -f "$LOG_FILE" ]; then
+            cp "$LOG_FILE" "$LOG_FILE.prev"
+        fi
+        stop_bot
+        rm -f "$PID_FILE" "$HEARTBEAT_FILE"
+        start_bot
+    fi
+}
+
 # Función para mostrar logs
 show_log() {
     if [ -f "$LOG_FILE" ]; then
@@ -146,6 +198,9 @@ case "$1" in
     log)
         show_log
         ;;
+    watchdog)
+        watchdog_bot
+        ;;
     *)
         usage
         ;;
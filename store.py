@@ -0,0 +1,184 @@
+"""
+Almacén local (SQLite) del bot.
+
+Guarda los listados de viajes precalentados por la tarea nocturna para que las
+búsquedas del día siguiente no dependan de la API de HIFE en hora punta, los
+botones pendientes del registro de callbacks (ver callbacks.py) y el resultado
+de cada compra para no repetirla y la última comprobación de cada ID de viaje
+configurado (con su tarifa).
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class LocalStore:
+	"""Acceso a la base de datos local, seguro entre hilos (una conexión + lock)"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self.lock = threading.Lock()
+		self.conn = sqlite3.connect(path, check_same_thread=False)
+		with self.lock, self.conn:
+			self.conn.execute("""
+			    CREATE TABLE IF NOT EXISTS trips (
+			        origin TEXT NOT NULL,
+			        dest TEXT NOT NULL,
+			        trip_date TEXT NOT NULL,
+			        payload TEXT NOT NULL,
+			        fetched_at REAL NOT NULL,
+			        PRIMARY KEY (origin, dest, trip_date)
+			    )""")
+			self.conn.execute("""
+			    CREATE TABLE IF NOT EXISTS callbacks (
+			        token TEXT PRIMARY KEY,
+			        group_id TEXT NOT NULL,
+			        payload TEXT NOT NULL,
+			        expires_at REAL NOT NULL
+			    )""")
+			self.conn.execute(
+			    "CREATE INDEX IF NOT EXISTS callbacks_group ON callbacks (group_id)")
+			self.conn.execute("""
+			    CREATE TABLE IF NOT EXISTS trip_checks (
+			        schedule_id TEXT PRIMARY KEY,
+			        departure_time TEXT,
+			        going_rate TEXT,
+			        valid INTEGER NOT NULL,
+			        checked_at REAL NOT NULL
+			    )""")
+			self.conn.execute("""
+			    CREATE TABLE IF NOT EXISTS purchases (
+			        purchase_key TEXT PRIMARY KEY,
+			        outcome TEXT NOT NULL,
+			        updated_at REAL NOT NULL
+			    )""")
+
+	def get_trips(self,
+	              origin,
+	              dest,
+	              date_str: str,
+	              max_age_seconds: float = None) -> Optional[list]:
+		"""Listado guardado para la ruta y fecha (DD-MM-YYYY), o None si no hay o está caducado"""
+		with self.lock:
+			row = self.conn.execute(
+			    "SELECT payload, fetched_at FROM trips "
+			    "WHERE origin = ? AND dest = ? AND trip_date = ?",
+			    (str(origin), str(dest), date_str)).fetchone()
+		if row is None:
+			return None
+		payload, fetched_at = row
+		if max_age_seconds is not None and time.time() - fetched_at > max_age_seconds:
+			return None
+		return json.loads(payload)
+
+	def put_trips(self, origin, dest, date_str: str, trips: list):
+		with self.lock, self.conn:
+			self.conn.execute(
+			    "INSERT OR REPLACE INTO trips "
+			    "(origin, dest, trip_date, payload, fetched_at) VALUES (?, ?, ?, ?, ?)",
+			    (str(origin), str(dest), date_str,
+			     json.dumps(trips, separators=(',', ':')), time.time()))
+
+	def purge_trips_before(self, cutoff_timestamp: float):
+		"""Elimina listados descargados antes de `cutoff_timestamp`"""
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM trips WHERE fetched_at < ?",
+			                  (cutoff_timestamp, ))
+
+	def put_callbacks(self, group_id: str, entries: list, expires_at: float):
+		"""Guarda los botones de un grupo: `entries` es una lista de (token, dict)"""
+		with self.lock, self.conn:
+			self.conn.executemany(
+			    "INSERT OR REPLACE INTO callbacks "
+			    "(token, group_id, payload, expires_at) VALUES (?, ?, ?, ?)",
+			    [(token, group_id, json.dumps(payload,
+			                                  separators=(',', ':')), expires_at)
+			     for token, payload in entries])
+
+	def get_callback(self, token: str) -> Optional[tuple]:
+		"""(dict, group_id, expires_at) del botón, o None si no existe"""
+		with self.lock:
+			row = self.conn.execute(
+			    "SELECT payload, group_id, expires_at FROM callbacks WHERE token = ?",
+			    (token, )).fetchone()
+		if row is None:
+			return None
+		payload, group_id, expires_at = row
+		return json.loads(payload), group_id, expires_at
+
+	def delete_callback_group(self, group_id: str) -> int:
+		"""Elimina los botones de un grupo y devuelve cuántos había"""
+		with self.lock, self.conn:
+			return self.conn.execute("DELETE FROM callbacks WHERE group_id = ?",
+			                         (group_id, )).rowcount
+
+	def purge_callbacks_before(self, cutoff_timestamp: float):
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM callbacks WHERE expires_at < ?",
+			                  (cutoff_timestamp, ))
+
+	def get_purchase(self, purchase_key: str) -> Optional[str]:
+		"""Último resultado registrado para la compra ('pending', 'success', ...) o None"""
+		with self.lock:
+			row = self.conn.execute(
+			    "SELECT outcome FROM purchases WHERE purchase_key = ?",
+			    (purchase_key, )).fetchone()
+		return row[0] if row is not None else None
+
+	def put_purchase(self, purchase_key: str, outcome: str):
+		with self.lock, self.conn:
+			self.conn.execute(
+			    "INSERT OR REPLACE INTO purchases (purchase_key, outcome, updated_at) "
+			    "VALUES (?, ?, ?)", (purchase_key, outcome, time.time()))
+
+	def claim_purchase(self, purchase_key: str,
+	                   pending_seconds: float) -> Optional[str]:
+		"""Marca la compra como 'pending' si nadie la ha hecho ni la está haciendo.
+
+		Devuelve None si se reclamó, o el resultado que lo impide: 'success' o un
+		'pending' de hace menos de `pending_seconds` (otra compra en curso, u otra
+		que se interrumpió sin saber si llegó a pagarse). Es una sola sentencia,
+		atómica también entre procesos (bot y cli.py).
+		"""
+		now = time.time()
+		with self.lock, self.conn:
+			claimed = self.conn.execute(
+			    "INSERT INTO purchases (purchase_key, outcome, updated_at) "
+			    "VALUES (?, 'pending', ?) "
+			    "ON CONFLICT (purchase_key) DO UPDATE SET "
+			    "outcome = 'pending', updated_at = excluded.updated_at "
+			    "WHERE outcome != 'success' AND "
+			    "NOT (outcome = 'pending' AND updated_at >= ?)",
+			    (purchase_key, now, now - pending_seconds)).rowcount
+			if claimed:
+				return None
+			return self.conn.execute(
+			    "SELECT outcome FROM purchases WHERE purchase_key = ?",
+			    (purchase_key, )).fetchone()[0]
+
+	def purge_purchases_before(self, cutoff_timestamp: float):
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM purchases WHERE updated_at < ?",
+			                  (cutoff_timestamp, ))
+
+	def get_trip_check(self, schedule_id) -> Optional[tuple]:
+		"""(hora de salida, tarifa, válido) de la última comprobación del ID, o None"""
+		with self.lock:
+			row = self.conn.execute(
+			    "SELECT departure_time, going_rate, valid FROM trip_checks "
+			    "WHERE schedule_id = ?", (str(schedule_id), )).fetchone()
+		if row is None:
+			return None
+		departure_time, going_rate, valid = row
+		return departure_time, going_rate, bool(valid)
+
+	def put_trip_check(self, schedule_id, departure_time: Optional[str],
+	                   going_rate: Optional[str], valid: bool):
+		with self.lock, self.conn:
+			self.conn.execute(
+			    "INSERT OR REPLACE INTO trip_checks "
+			    "(schedule_id, departure_time, going_rate, valid, checked_at) "
+			    "VALUES (?, ?, ?, ?, ?)", (str(schedule_id), departure_time,
+			                               going_rate, int(valid), time.time()))
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del bot están en la raíz del repositorio (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def config():
+	"""update_config() para el test; al terminar se restaura el snapshot anterior"""
+	import config as config_module
+
+	previous = config_module._current, config_module._file_settings
+	yield config_module.update_config
+	with config_module._write_lock:
+		config_module._current, config_module._file_settings = previous
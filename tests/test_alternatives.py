@@ -0,0 +1,67 @@
+import pytest
+
+import androidapi
+from androidapi import rank_alternative_trips
+
+
+@pytest.fixture(autouse=True)
+def bonus(config):
+	config(BONUS_ID='19', HIFE_GOING_RATE='')
+
+
+def trip(trip_id, departure, disabled=False, rate='600'):
+	return {
+	    'id': trip_id,
+	    'departure_time': departure,
+	    'tripPrices': {
+	        'going': [{
+	            'bonusTypeId': 19,
+	            'rate': rate,
+	            'disabled': disabled
+	        }]
+	    }
+	}
+
+
+def test_prefers_available_rate_then_nearest():
+	trips = [
+	    trip(1, '07:30'),
+	    trip(2, '08:10', disabled=True),
+	    trip(3, '08:20'),
+	    trip(4, '08:00'),
+	]
+	ranked = rank_alternative_trips(trips, '08:00', 30, 3)
+	assert [alt['id'] for alt in ranked] == [3, 1, 2]
+	assert ranked[0] == {
+	    'id': 3,
+	    'departure_time': '08:20',
+	    'going_rate': '600',
+	    'rate_available': True,
+	    'delta_minutes': 20
+	}
+	assert ranked[1]['delta_minutes'] == -30
+
+
+def test_excludes_requested_time_out_of_tolerance_and_malformed():
+	trips = [
+	    trip(1, '08:00'),
+	    trip(2, '09:00'),
+	    {'departure_time': '08:05'},
+	    trip(3, 'mañana'),
+	]
+	assert rank_alternative_trips(trips, '08:00', 30, 3) == []
+
+
+def test_limit_and_disabled_options():
+	trips = [trip(i, f"08:{i:02d}") for i in range(1, 6)]
+	assert len(rank_alternative_trips(trips, '08:00', 30, 2)) == 2
+	assert rank_alternative_trips(trips, '08:00', 0, 3) == []
+	assert rank_alternative_trips(trips, '08:00', 30, 0) == []
+	assert rank_alternative_trips(trips, 'no es hora', 30, 3) == []
+
+
+def test_going_rate_override(config):
+	config(HIFE_GOING_RATE='512')
+	ranked = rank_alternative_trips([trip(1, '08:10')], '08:00', 30, 3)
+	assert ranked[0]['going_rate'] == '512'
+	assert androidapi._bonus_rate_available(trip(1, '08:10'))
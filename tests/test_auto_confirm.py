@@ -0,0 +1,43 @@
+import datetime
+
+import androidapi
+from androidapi import AUTO_CONFIRM_PURCHASE_SECONDS, _auto_confirm_time
+
+
+def _trip_in(minutes):
+	departure = datetime.datetime.now() + datetime.timedelta(minutes=minutes)
+	return {
+	    'type': 'ida',
+	    'date': departure.strftime("%Y-%m-%d"),
+	    'time': departure.strftime("%H:%M"),
+	}
+
+
+def test_disabled_without_auto_minutes(config):
+	config(AUTO_CONFIRM_MINUTES=0)
+	assert _auto_confirm_time(_trip_in(120)) is None
+
+
+def test_uses_configured_minutes_when_they_fit(config):
+	config(AUTO_CONFIRM_MINUTES=10)
+	when = _auto_confirm_time(_trip_in(120))
+	wait = (when - datetime.datetime.now()).total_seconds()
+	assert 9 * 60 < wait <= 10 * 60
+
+
+def test_late_notice_leaves_time_to_buy(config):
+	# Aviso tardío: la compra automática debe caber antes del plazo de compra
+	config(AUTO_CONFIRM_MINUTES=60, PURCHASE_DEADLINE_MARGIN_MINUTES=5)
+	data = _trip_in(20)
+	when = _auto_confirm_time(data)
+	purchase_deadline = androidapi._purchase_deadline(data['date'],
+	                                                  data['time']).at
+	assert purchase_deadline - when.timestamp() >= AUTO_CONFIRM_PURCHASE_SECONDS
+
+
+def test_skipped_when_no_time_is_left(config):
+	config(AUTO_CONFIRM_MINUTES=60, PURCHASE_DEADLINE_MARGIN_MINUTES=10)
+	data = _trip_in(5)
+	assert _auto_confirm_time(data) is None
+	assert 'Ya no da tiempo' in androidapi._confirmation_text(
+	    data, None, auto_skipped=True)
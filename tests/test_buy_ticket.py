@@ -0,0 +1,148 @@
+import json
+import threading
+
+import pytest
+import requests
+
+import androidapi
+
+
+def _response(status, body=None):
+	response = requests.Response()
+	response.status_code = status
+	response._content = json.dumps(body).encode() if body is not None else b''
+	response.url = 'https://hife.test'
+	return response
+
+
+class FakeSession:
+	"""Responde por ruta con la siguiente respuesta de su lista (la última se repite)"""
+
+	def __init__(self, routes):
+		self.routes = {path: list(responses) for path, responses in routes.items()}
+		self.calls = []
+		self.lock = threading.Lock()
+
+	def _respond(self, method, url, json=None):
+		path = next(path for path in self.routes if path in url)
+		with self.lock:
+			self.calls.append((method, path, json))
+			responses = self.routes[path]
+			return responses.pop(0) if len(responses) > 1 else responses[0]
+
+	def get(self, url, headers=None, timeout=None):
+		return self._respond('GET', url)
+
+	def post(self, url, headers=None, json=None, timeout=None):
+		return self._respond('POST', url, json)
+
+	def paths(self, method=None):
+		return [p for m, p, _ in self.calls if method in (None, m)]
+
+
+OK_ROUTES = {
+    '/bonus/available': [_response(200, [{'id': 501}])],
+    '/travelers': [_response(200, {})],
+    '/proceed-reservation': [_response(200, {})],
+    '/payment/bonus-item': [_response(200, {'success': True})],
+    '/route/operation': [_response(200, {'token_id': ['tok']})],
+}
+
+
+@pytest.fixture
+def session(monkeypatch):
+
+	def install(**overrides):
+		fake = FakeSession({**OK_ROUTES, **overrides})
+		monkeypatch.setattr(androidapi.automator, 'session', fake)
+		return fake
+
+	return install
+
+
+class _Lines(list):
+
+	def print(self, text='', *args, **kwargs):
+		self.append(str(text))
+
+
+@pytest.fixture
+def console_lines(monkeypatch):
+	lines = _Lines()
+	monkeypatch.setattr(androidapi.console, 'target', lines)
+	return lines
+
+
+def _buy(**kwargs):
+	return androidapi.automator.buy_ticket(123, '2026-05-04', 'ida', 'R1',
+	                                       **kwargs)
+
+
+def test_expired_token_is_renewed_for_both_branches(session, monkeypatch):
+	# La consulta del bono sale antes de renovar el token: también recibe 401
+	fake = session(**{
+	    '/bonus/available': [_response(401), _response(200, [{'id': 501}])],
+	    '/route/operation': [_response(401), _response(200, {'token_id': 'tok'})],
+	})
+	refreshed = []
+	monkeypatch.setattr(androidapi.automator, 'refresh_token',
+	                    lambda deadline=None: refreshed.append(1) or True)
+	assert _buy() is True
+	assert refreshed == [1]
+	assert fake.paths('GET') == ['/bonus/available', '/bonus/available']
+	assert fake.paths('POST').count('/route/operation') == 2
+
+
+def test_bonus_failure_is_reported_as_a_bonus_error(session, console_lines):
+	fake = session(**{'/bonus/available': [_response(500)]})
+	assert _buy() is False
+	assert any('Error consultando el bono' in line for line in console_lines)
+	assert not any('operación' in line and '✗' in line
+	               for line in console_lines)
+	# No se asignan viajeros ni se paga sin bono
+	assert '/travelers' not in fake.paths()
+	assert '/payment/bonus-item' not in fake.paths()
+
+
+def test_operation_failure_does_not_wait_for_payment(session, console_lines):
+	fake = session(**{'/route/operation': [_response(422, {'error': 'x'})]})
+	assert _buy() is False
+	assert any('Error en operación' in line for line in console_lines)
+	assert not any('bono' in line for line in console_lines)
+	assert '/travelers' not in fake.paths()
+
+
+def _travelers(fake):
+	return next(body for method, path, body in fake.calls
+	            if path == '/travelers')['travelers']['1']
+
+
+def test_group_purchase_assigns_a_bonus_per_traveler(session):
+	fake = session(**{
+	    '/bonus/available': [_response(200, [{
+	        'id': n
+	    } for n in (501, 502, 503, 504)])]
+	})
+	assert _buy(quantity=3) is True
+	operation = next(body for method, path, body in fake.calls
+	                 if path == '/route/operation')
+	assert operation['quantity'] == 3
+	travelers = _travelers(fake)
+	assert sorted(travelers) == ['1', '2', '3']
+	bonuses = [traveler['form_bonus'] for traveler in travelers.values()]
+	assert sorted(bonuses) == ['501', '502', '503']
+	# Una sola operación para todo el grupo
+	assert fake.paths('POST').count('/payment/bonus-item') == 1
+
+
+def test_group_purchase_refused_without_enough_bonuses(session):
+	fake = session(**{
+	    '/bonus/available': [_response(200, [{
+	        'id': 501
+	    }, {
+	        'id': 502
+	    }])]
+	})
+	assert _buy(quantity=3) is False
+	assert '/travelers' not in fake.paths()
+	assert '/payment/bonus-item' not in fake.paths()
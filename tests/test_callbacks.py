@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from callbacks import CallbackRegistry, PurchaseIntent
+from store import LocalStore
+
+BUY = PurchaseIntent('buy', 'ida', '07:00', '2026-05-04')
+CANCEL = PurchaseIntent('cancel', 'ida', '07:00', '2026-05-04')
+
+
+@pytest.fixture
+def store(tmp_path):
+	return LocalStore(str(tmp_path / 'store.db'))
+
+
+def test_tokens_fit_in_callback_data():
+	_, tokens = CallbackRegistry().register([BUY, CANCEL])
+	assert len(set(tokens)) == 2
+	assert all(len(token.encode()) <= 64 for token in tokens)
+
+
+def test_first_tap_wins_and_replay_is_rejected():
+	registry = CallbackRegistry()
+	_, (buy, cancel) = registry.register([BUY, CANCEL])
+	assert registry.consume(buy) == BUY
+	assert registry.consume(buy) is None
+	# El resto de botones del mismo mensaje también quedan invalidados
+	assert registry.consume(cancel) is None
+	assert registry.consume('desconocido') is None
+
+
+def test_revoke_invalidates_group():
+	registry = CallbackRegistry()
+	group, (buy, _) = registry.register([BUY, CANCEL])
+	assert registry.revoke(group)
+	assert not registry.revoke(group)
+	assert registry.consume(buy) is None
+
+
+def test_expired_entries_are_rejected():
+	registry = CallbackRegistry()
+	_, (buy, ) = registry.register([BUY], expires_at=time.time() - 1)
+	assert registry.consume(buy) is None
+
+
+def test_ttl_caps_expiry(monkeypatch):
+	registry = CallbackRegistry(ttl_seconds=60)
+	_, (buy, ) = registry.register([BUY], expires_at=time.time() + 3600)
+	later = time.time() + 61
+	monkeypatch.setattr('callbacks.time.time', lambda: later)
+	assert registry.consume(buy) is None
+
+
+def test_evicted_entry_falls_back_to_store(store):
+	registry = CallbackRegistry(store, max_entries=2)
+	_, (first, ) = registry.register([BUY])
+	registry.register([CANCEL])
+	registry.register([CANCEL])
+	assert first not in registry._entries
+	assert registry.consume(first) == BUY
+	assert registry.consume(first) is None
+
+
+def test_evicted_without_store_is_lost():
+	registry = CallbackRegistry(max_entries=1)
+	_, (first, ) = registry.register([BUY])
+	registry.register([CANCEL])
+	assert registry.consume(first) is None
+
+
+def test_survives_restart(store):
+	_, (buy, cancel) = CallbackRegistry(store).register([BUY, CANCEL])
+	restarted = CallbackRegistry(store)
+	assert restarted.consume(cancel) == CANCEL
+	assert restarted.consume(buy) is None
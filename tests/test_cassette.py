@@ -0,0 +1,62 @@
+import json
+
+import requests
+
+from cassette import REDACTED, CassetteAdapter, sanitize, sanitize_url
+
+
+def test_sanitize_hides_sensitive_fields_at_any_depth():
+	value = {
+	    'Authorization': 'Bearer abc',
+	    'data': [{
+	        'password': 'x',
+	        'name': 'ok'
+	    }],
+	    'nested': {
+	        'Refresh_Token': 'r'
+	    },
+	}
+	assert sanitize(value) == {
+	    'Authorization': REDACTED,
+	    'data': [{
+	        'password': REDACTED,
+	        'name': 'ok'
+	    }],
+	    'nested': {
+	        'Refresh_Token': REDACTED
+	    },
+	}
+	# No modifica el original
+	assert value['Authorization'] == 'Bearer abc'
+
+
+def test_sanitize_url_hides_sensitive_query():
+	url = sanitize_url('https://h/api/trips?origin=15&token=abc&date=')
+	assert 'abc' not in url
+	assert 'origin=15' in url
+	assert 'date=' in url
+
+
+def test_replay_in_recorded_order(tmp_path):
+	path = tmp_path / 'hife.jsonl'
+	entries = [{
+	    'key': 'GET /api/trips',
+	    'status': 200,
+	    'headers': {
+	        'content-type': 'application/json'
+	    },
+	    'body': {
+	        'n': n
+	    },
+	    'elapsed': 5
+	} for n in (1, 2)]
+	path.write_text('\n'.join(json.dumps(e) for e in entries) + '\n')
+
+	session = requests.Session()
+	session.mount('https://', CassetteAdapter(str(path), 'replay', 'zero'))
+	bodies = [
+	    session.get('https://h/api/trips?origin=15').json()['n']
+	    for _ in range(3)
+	]
+	# Las respuestas se consumen en orden y la última se repite
+	assert bodies == [1, 2, 2]
@@ -0,0 +1,83 @@
+import argparse
+import datetime
+import types
+
+import pytest
+
+import cli
+from store import LocalStore
+
+TOMORROW = (datetime.date.today() +
+            datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+KEY_ARGS = ('ida', '07:00', TOMORROW)
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+	import androidapi
+	fake = types.SimpleNamespace(module=androidapi,
+	                             store=LocalStore(str(tmp_path / 'store.db')),
+	                             lookups=[],
+	                             bought=[],
+	                             paid=lambda bought: True)
+	monkeypatch.setattr(androidapi, '_store', fake.store)
+	monkeypatch.setattr(androidapi, '_configured_trip', lambda *args: None)
+	monkeypatch.setattr(androidapi.automator, 'get_trip_id',
+	                    lambda *args, **kwargs: fake.lookups.append(kwargs) or
+	                    (123, 'R1'))
+	monkeypatch.setattr(androidapi.automator, 'buy_ticket',
+	                    lambda *args, **kwargs: fake.bought.append(args[0]) or
+	                    fake.paid(fake.bought))
+	return fake
+
+
+def _buy(dry_run=False):
+	args = argparse.Namespace(type='ida',
+	                          date=TOMORROW,
+	                          time='07:00',
+	                          quantity=1,
+	                          dry_run=dry_run)
+	return cli.cmd_buy(args)
+
+
+def test_buys_once(bot):
+	assert _buy()['outcome'] == 'success'
+	assert _buy()['outcome'] == 'already_bought'
+	assert bot.bought == [123]
+
+
+def test_refuses_while_another_purchase_is_pending(bot):
+	bot.store.put_purchase(bot.module._purchase_key(*KEY_ARGS), 'pending')
+	result = _buy()
+	assert (result['ok'], result['outcome']) == (False, 'unknown')
+	assert bot.bought == []
+
+
+def test_dry_run_leaves_no_record(bot):
+	assert _buy(dry_run=True)['outcome'] == 'dry_run'
+	assert bot.store.get_purchase(bot.module._purchase_key(*KEY_ARGS)) is None
+	assert bot.bought == []
+
+
+def test_trip_is_looked_up_live(bot):
+	assert _buy()['outcome'] == 'success'
+	assert [kwargs['use_cache'] for kwargs in bot.lookups] == [False]
+
+
+def test_configured_trip_is_used_first(bot, monkeypatch):
+	monkeypatch.setattr(bot.module, '_configured_trip',
+	                    lambda *args: ('999', 'R9'))
+	assert _buy()['schedule_id'] == '999'
+	assert bot.lookups == []
+	assert bot.bought == ['999']
+
+
+def test_failed_configured_trip_is_retried_with_the_listed_one(
+    bot, monkeypatch):
+	monkeypatch.setattr(bot.module, '_configured_trip',
+	                    lambda *args: ('999', 'R9'))
+	bot.paid = lambda bought: len(bought) > 1
+	result = _buy()
+	assert (result['outcome'], result['schedule_id']) == ('success', 123)
+	assert bot.bought == ['999', 123]
+	assert bot.store.get_trip_check('999') == ('07:00', 'R9', False)
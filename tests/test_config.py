@@ -0,0 +1,66 @@
+import pytest
+
+import config as config_module
+from config import Config, reload_config
+
+ENV = ("TELEGRAM_TOKEN=t\nTELEGRAM_USER_ID=1\nHIFE_AUTH_TOKEN=x\n"
+       "ORIGIN_ID=1\nORIGIN_STOP_CODE=01\nDESTINATION_ID=2\n"
+       "DESTINATION_STOP_CODE=02\nOUTWARD_TIME_DEFAULT=07:00\n")
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch, config):
+	monkeypatch.setattr(config_module, '_startup_environ', {})
+	path = tmp_path / '.env'
+	path.write_text(ENV + "OUTWARD_TIME_MONDAY=06:45\n")
+	reload_config(str(path))
+	return path
+
+
+def test_reload_applies_changes(env_file):
+	assert Config.OUTWARD_TIME_MONDAY == '06:45'
+	env_file.write_text(ENV + "OUTWARD_TIME_MONDAY=06:15\n")
+	valid, errors, changed = reload_config(str(env_file))
+	assert (valid, errors) == (True, [])
+	assert 'OUTWARD_TIME_MONDAY' in changed
+	assert Config.schedule[0]['ida'] == '06:15'
+
+
+def test_removed_line_falls_back_to_default(env_file, monkeypatch):
+	# Lo que load_dotenv volcó en os.environ al arrancar no cuenta
+	monkeypatch.setenv('OUTWARD_TIME_MONDAY', '06:45')
+	env_file.write_text(ENV)
+	valid, errors, changed = reload_config(str(env_file))
+	assert valid, errors
+	assert 'OUTWARD_TIME_MONDAY' in changed
+	assert Config.OUTWARD_TIME_MONDAY is None
+	assert Config.schedule[0]['ida'] == '07:00'
+
+
+def test_removed_line_falls_back_to_startup_environment(env_file, monkeypatch):
+	monkeypatch.setattr(config_module, '_startup_environ',
+	                    {'OUTWARD_TIME_MONDAY': '08:00'})
+	env_file.write_text(ENV)
+	reload_config(str(env_file))
+	assert Config.OUTWARD_TIME_MONDAY == '08:00'
+
+
+def test_invalid_file_keeps_previous_config(env_file):
+	env_file.write_text(ENV + "OUTWARD_TIME_MONDAY=06:45\nWATCH_ACTION=nope\n")
+	valid, errors, changed = reload_config(str(env_file))
+	assert not valid
+	assert any('WATCH_ACTION' in e for e in errors)
+	assert changed == set()
+	assert Config.WATCH_ACTION == 'notify'
+
+
+def test_environment_wins_over_env_file_on_reload(env_file, monkeypatch):
+	# Como load_dotenv al arrancar: lo exportado por la shell o systemd manda
+	monkeypatch.setattr(config_module, '_startup_environ',
+	                    {'OUTWARD_TIME_MONDAY': '08:00'})
+	env_file.write_text(ENV + "OUTWARD_TIME_MONDAY=06:15\nBONUS_ID=20\n")
+	valid, errors, changed = reload_config(str(env_file))
+	assert valid, errors
+	assert Config.OUTWARD_TIME_MONDAY == '08:00'
+	# El resto del .env se sigue aplicando
+	assert Config.BONUS_ID == '20'
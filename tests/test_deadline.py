@@ -0,0 +1,44 @@
+import math
+
+import pytest
+
+import deadline as deadline_module
+from deadline import MIN_REQUEST_SECONDS, NO_DEADLINE, Deadline, DeadlineExceeded
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	now = [1000.0]
+	monkeypatch.setattr(deadline_module.time, 'time', lambda: now[0])
+	monkeypatch.setattr(deadline_module.time, 'sleep',
+	                    lambda seconds: now.__setitem__(0, now[0] + seconds))
+	return now
+
+
+def test_timeout_is_capped_by_remaining_time(clock):
+	deadline = Deadline(1012.0)
+	assert deadline.timeout(30) == 12.0
+	assert deadline.timeout(5) == 5
+
+
+def test_timeout_raises_when_no_request_fits(clock):
+	deadline = Deadline(1000.0 + MIN_REQUEST_SECONDS / 2)
+	assert deadline.expired
+	with pytest.raises(DeadlineExceeded):
+		deadline.timeout(30)
+
+
+def test_sleep_only_if_a_request_still_fits(clock):
+	deadline = Deadline(1010.0)
+	deadline.sleep(5)
+	assert clock[0] == 1005.0
+	with pytest.raises(DeadlineExceeded):
+		deadline.sleep(5)
+	# No ha esperado inútilmente antes de rendirse
+	assert clock[0] == 1005.0
+
+
+def test_no_deadline_never_expires(clock):
+	assert math.isinf(NO_DEADLINE.remaining)
+	assert not NO_DEADLINE.expired
+	assert NO_DEADLINE.timeout(30) == 30
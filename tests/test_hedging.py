@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import hedging
+from hedging import MAX_TOKENS, Hedger
+
+
+@pytest.fixture
+def pool(monkeypatch):
+	# Sin muestras suficientes se espera FALLBACK_DELAY: que sea corto
+	monkeypatch.setattr(hedging, 'FALLBACK_DELAY', 0.05)
+	with ThreadPoolExecutor(max_workers=4) as executor:
+		yield executor
+
+
+def _requests(*behaviours):
+	"""Petición cuya n-ésima llamada sigue behaviours[n]: (espera, resultado o excepción)"""
+	calls = iter(behaviours)
+	lock = threading.Lock()
+
+	def request():
+		with lock:
+			wait, outcome = next(calls)
+		time.sleep(wait)
+		if isinstance(outcome, Exception):
+			raise outcome
+		return outcome
+
+	return request
+
+
+def test_fast_request_is_not_hedged(pool):
+	hedger = Hedger(pool, 95, 10)
+	assert hedger.call(_requests((0, 'a'))) == 'a'
+	assert (hedger.sent, hedger.hedged) == (1, 0)
+	assert len(hedger.latencies) == 1
+
+
+def test_slow_request_is_hedged_and_second_wins(pool):
+	hedger = Hedger(pool, 95, 10)
+	assert hedger.call(_requests((1, 'lenta'), (0, 'rápida'))) == 'rápida'
+	assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+
+
+def test_failed_copy_falls_back_to_the_other(pool):
+	hedger = Hedger(pool, 95, 10)
+	request = _requests((0.2, ConnectionError('caída')), (0.5, 'ok'))
+	assert hedger.call(request) == 'ok'
+
+
+def test_both_failing_raises(pool):
+	hedger = Hedger(pool, 95, 10)
+	request = _requests((0.2, ConnectionError('1')), (0, ConnectionError('2')))
+	with pytest.raises(ConnectionError):
+		hedger.call(request)
+
+
+def test_extra_requests_are_capped(pool):
+	hedger = Hedger(pool, 95, 0)
+	hedger.call(_requests((0.2, 'a'), (0.2, 'b')))
+	# Sin fichas la petición lenta se espera sin copia
+	assert hedger.call(_requests((0.2, 'c'))) == 'c'
+	assert (hedger.sent, hedger.hedged) == (2, 1)
+
+
+def test_tokens_accumulate_up_to_the_cap(pool):
+	hedger = Hedger(pool, 95, 100)
+	for _ in range(10):
+		hedger.call(_requests((0, 'a')))
+	assert hedger.tokens == MAX_TOKENS
+
+
+def test_reload_keeps_observed_latencies(config):
+	import androidapi
+	automator = androidapi.automator
+	config(HEDGE_PERCENTILE=95)
+	automator.configure_hedging()
+	automator._hedger.latencies.extend([0.5] * 20)
+
+	config(HEDGE_PERCENTILE=90, HEDGE_MAX_PERCENT=5)
+	automator.configure_hedging()
+	assert automator._hedger.percentile == 90
+	assert automator._hedger.ratio == 0.05
+	assert len(automator._hedger.latencies) == 20
+
+	config(HEDGE_PERCENTILE=0)
+	automator.configure_hedging()
+	assert automator._hedger is None
@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+import outbox as outbox_module
+from outbox import Outbox
+
+
+class FakeBot:
+	"""Registra las llamadas; `failures` son excepciones a lanzar antes de responder"""
+
+	def __init__(self, failures=()):
+		self.calls = []
+		self.failures = list(failures)
+
+	async def _call(self, method, **kwargs):
+		self.calls.append((method, kwargs, time.monotonic()))
+		if self.failures:
+			raise self.failures.pop(0)
+		return kwargs
+
+	async def send_message(self, **kwargs):
+		return await self._call('send_message', **kwargs)
+
+	async def edit_message_text(self, **kwargs):
+		return await self._call('edit_message_text', **kwargs)
+
+
+def run(coro):
+	return asyncio.run(coro)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+	"""Las esperas de los reintentos se registran pero no se esperan"""
+	waits = []
+	real_sleep = asyncio.sleep
+
+	async def sleep(seconds):
+		waits.append(seconds)
+		await real_sleep(0)
+
+	monkeypatch.setattr(outbox_module.asyncio, 'sleep', sleep)
+	return waits
+
+
+def test_pending_repeats_are_coalesced():
+
+	async def scenario():
+		bot = FakeBot()
+		outbox = Outbox(bot, per_chat_interval=0)
+		results = await asyncio.gather(
+		    outbox.send(1, 'Error', coalesce_key='error'),
+		    outbox.send(1, 'Error', coalesce_key='error'),
+		    outbox.send(1, 'Error', coalesce_key='error'),
+		    outbox.send(1, 'Otro'))
+		await outbox.stop()
+		return bot.calls, results
+
+	calls, results = run(scenario())
+	texts = [kwargs['text'] for _, kwargs, _ in calls]
+	assert texts == ['Error\n\n(×3 avisos iguales)', 'Otro']
+	# Todos los que pidieron el aviso reciben el mensaje enviado
+	assert results[0] is results[1] is results[2]
+
+
+def test_pending_edits_are_replaced_by_the_last():
+
+	async def scenario():
+		bot = FakeBot()
+		outbox = Outbox(bot, per_chat_interval=0)
+		await asyncio.gather(*(outbox.edit(1, 42, f"Quedan {n} min")
+		                       for n in (3, 2, 1)))
+		await outbox.stop()
+		return bot.calls
+
+	calls = run(scenario())
+	assert [(m, kwargs['text']) for m, kwargs, _ in calls] == [
+	    ('edit_message_text', 'Quedan 1 min')
+	]
+
+
+def test_messages_to_a_chat_are_spaced():
+
+	async def scenario():
+		bot = FakeBot()
+		outbox = Outbox(bot, per_chat_interval=0.05)
+		await asyncio.gather(*(outbox.send(1, str(n)) for n in range(3)))
+		await outbox.send(2, 'otro chat')
+		await outbox.stop()
+		return bot.calls
+
+	calls = run(scenario())
+	times = [at for _, _, at in calls[:3]]
+	assert all(b - a >= 0.045 for a, b in zip(times, times[1:]))
+
+
+def test_global_limit_per_second(no_backoff):
+
+	async def scenario():
+		bot = FakeBot()
+		outbox = Outbox(bot, per_chat_interval=0, global_per_second=2)
+		await asyncio.gather(*(outbox.send(n, str(n)) for n in range(3)))
+		await outbox.stop()
+		return len(bot.calls)
+
+	assert run(scenario()) == 3
+	# El tercero tuvo que esperar a que saliera de la ventana de 1 s
+	assert no_backoff and 0 < no_backoff[0] <= 1
+
+
+# PTB avisa de que retry_after pasará a ser timedelta (Outbox acepta ambos)
+@pytest.mark.filterwarnings('ignore:.*retry_after')
+def test_retry_after_is_honoured(no_backoff):
+
+	async def scenario():
+		bot = FakeBot(failures=[RetryAfter(7)])
+		outbox = Outbox(bot, per_chat_interval=0)
+		result = await outbox.send(1, 'hola')
+		await outbox.stop()
+		return result, len(bot.calls)
+
+	result, attempts = run(scenario())
+	assert result['text'] == 'hola'
+	assert attempts == 2
+	assert 7 in no_backoff
+
+
+def test_network_errors_retry_with_backoff_then_give_up(no_backoff):
+
+	async def scenario():
+		bot = FakeBot(failures=[NetworkError('caída')] * 3)
+		outbox = Outbox(bot, per_chat_interval=0, max_retries=2)
+		with pytest.raises(NetworkError):
+			await outbox.send(1, 'hola')
+		await outbox.stop()
+		return len(bot.calls)
+
+	assert run(scenario()) == 3
+	assert no_backoff == [1, 2]
+
+
+def test_bad_request_is_not_retried(no_backoff):
+
+	async def scenario():
+		bot = FakeBot(failures=[BadRequest('Message is not modified')])
+		outbox = Outbox(bot, per_chat_interval=0)
+		with pytest.raises(BadRequest):
+			await outbox.edit(1, 42, 'igual')
+		# El worker sigue atendiendo la cola
+		sent = await outbox.send(1, 'siguiente')
+		await outbox.stop()
+		return len(bot.calls), sent
+
+	attempts, sent = run(scenario())
+	assert attempts == 2
+	assert sent['text'] == 'siguiente'
@@ -0,0 +1,109 @@
+import asyncio
+import datetime
+import types
+
+import pytest
+
+import androidapi
+from store import LocalStore
+
+TOMORROW = (datetime.date.today() +
+            datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class _JobQueue:
+
+	def __init__(self):
+		self.jobs = []
+
+	def run_once(self, callback, when, data=None, name=None):
+		self.jobs.append(name)
+		return name
+
+
+class _Outbox:
+
+	def __init__(self):
+		self.sent = []
+
+	async def send(self, chat_id, text, **kwargs):
+		self.sent.append(text)
+
+
+@pytest.fixture
+def purchase(tmp_path, monkeypatch):
+	store = LocalStore(str(tmp_path / 'store.db'))
+	monkeypatch.setattr(androidapi, '_store', store)
+	monkeypatch.setattr(androidapi, '_outbox', _Outbox())
+	# El .env da el ID como texto; el listado de la API, como número
+	monkeypatch.setattr(androidapi, '_configured_trip',
+	                    lambda *args: ('123', 'R1'))
+	bought = []
+
+	def buy_ticket(schedule_id, date_str, trip_type, going_rate, **kwargs):
+		bought.append(schedule_id)
+		return len(bought) > 1
+
+	monkeypatch.setattr(androidapi.automator, 'buy_ticket', buy_ticket)
+
+	def run(listed, trips=()):
+		monkeypatch.setattr(androidapi.automator, 'get_trip_id',
+		                    lambda *args, **kwargs: listed)
+		monkeypatch.setattr(androidapi.automator, 'fetch_trips',
+		                    lambda *args, **kwargs: list(trips))
+		run.job_queue = _JobQueue()
+		context = types.SimpleNamespace(bot=None, job_queue=run.job_queue)
+		asyncio.run(
+		    androidapi._process_purchase(context, 'ida', '07:00', TOMORROW,
+		                                 None, False))
+		return bought, store.get_trip_check('123')
+
+	return run
+
+
+def test_same_trip_keeps_configured_id(purchase):
+	bought, check = purchase((123, 'R1'))
+	assert bought == ['123']
+	assert check is None
+
+
+def test_different_trip_replaces_configured_id(purchase):
+	bought, check = purchase((456, 'R1'))
+	assert bought == ['123', 456]
+	assert check == ('07:00', 'R1', False)
+
+
+def test_lookup_error_keeps_configured_id(purchase):
+	bought, check = purchase({'error': 'server_error', 'status_code': 503})
+	assert bought == ['123']
+	assert check is None
+
+
+def _trip(enabled):
+	return {
+	    'id': 123,
+	    'departure_time': '07:00',
+	    'tripPrices': {
+	        'going': [{
+	            'bonusTypeId': 19,
+	            'disabled': not enabled
+	        }]
+	    }
+	}
+
+
+@pytest.fixture
+def watching(config, monkeypatch):
+	config(AVAILABILITY_WATCH=True, BONUS_ID='19')
+	monkeypatch.setattr(androidapi, '_active_watches', {})
+
+
+def test_sold_out_trip_is_watched_after_failed_purchase(purchase, watching):
+	purchase((123, 'R1'), trips=[_trip(enabled=False)])
+	assert purchase.job_queue.jobs == [f"watch|ida|07:00|{TOMORROW}"]
+	assert 'Vigilando disponibilidad' in androidapi._outbox.sent[-1]
+
+
+def test_failed_purchase_with_seats_is_not_watched(purchase, watching):
+	purchase((123, 'R1'), trips=[_trip(enabled=True)])
+	assert purchase.job_queue.jobs == []
@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+import types
+
+import pytest
+
+from store import LocalStore
+
+KEY = '1|2026-05-04|ida|07:00'
+
+
+@pytest.fixture
+def store(tmp_path):
+	return LocalStore(str(tmp_path / 'store.db'))
+
+
+def test_claim_is_exclusive(store):
+	assert store.claim_purchase(KEY, 3600) is None
+	assert store.claim_purchase(KEY, 3600) == 'pending'
+	# Otro proceso con su propia conexión ve el mismo registro
+	assert LocalStore(store.path).claim_purchase(KEY, 3600) == 'pending'
+
+
+def test_claim_after_outcomes(store):
+	store.put_purchase(KEY, 'failed')
+	assert store.claim_purchase(KEY, 3600) is None
+	store.put_purchase(KEY, 'success')
+	assert store.claim_purchase(KEY, 3600) == 'success'
+
+
+def test_old_pending_can_be_claimed(store):
+	store.put_purchase(KEY, 'pending')
+	assert store.claim_purchase(KEY, 0) is None
+
+
+class _Outbox:
+
+	def __init__(self):
+		self.sent = []
+
+	async def send(self, chat_id, text, **kwargs):
+		self.sent.append(text)
+
+
+@pytest.fixture
+def bot(store, monkeypatch):
+	import androidapi
+	monkeypatch.setattr(androidapi, '_store', store)
+	outbox = _Outbox()
+	monkeypatch.setattr(androidapi, '_outbox', outbox)
+	purchases = []
+
+	async def fake_purchase(context, *args):
+		purchases.append(args)
+		return 'success'
+
+	monkeypatch.setattr(androidapi, '_process_purchase', fake_purchase)
+	return androidapi, outbox, purchases
+
+
+def _purchase(androidapi):
+	context = types.SimpleNamespace(bot=None)
+	return asyncio.run(
+	    androidapi.process_purchase(context, 'ida', '07:00', '2026-05-04'))
+
+
+def test_interrupted_purchase_is_not_repeated(bot, store):
+	androidapi, outbox, purchases = bot
+	store.put_purchase(androidapi._purchase_key('ida', '07:00', '2026-05-04'),
+	                   'pending')
+	assert _purchase(androidapi) == 'unknown'
+	assert purchases == []
+	assert 'Compra sin confirmar' in outbox.sent[0]
+
+
+def test_purchase_recorded_once(bot, store):
+	androidapi, outbox, purchases = bot
+	assert _purchase(androidapi) == 'success'
+	assert _purchase(androidapi) == 'success'
+	assert len(purchases) == 1
+	assert 'Billete ya comprado' in outbox.sent[-1]
+
+
+class _FailingOutbox(_Outbox):
+
+	async def send(self, chat_id, text, **kwargs):
+		from telegram.error import NetworkError
+		raise NetworkError('Telegram caído')
+
+
+def test_paid_purchase_survives_failed_notice(store, monkeypatch):
+	import androidapi
+	monkeypatch.setattr(androidapi, '_store', store)
+	monkeypatch.setattr(androidapi, '_outbox', _FailingOutbox())
+	monkeypatch.setattr(androidapi, '_configured_trip',
+	                    lambda *args: ('123', 'R1'))
+	bought = []
+	monkeypatch.setattr(androidapi.automator, 'buy_ticket',
+	                    lambda *args, **kwargs: bought.append(args) or True)
+	tomorrow = (datetime.date.today() +
+	            datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+	context = types.SimpleNamespace(bot=None)
+	outcome = asyncio.run(
+	    androidapi.process_purchase(context, 'ida', '07:00', tomorrow))
+	assert outcome == 'success'
+	assert len(bought) == 1
+	key = androidapi._purchase_key('ida', '07:00', tomorrow)
+	assert store.get_purchase(key) == 'success'
+	# El cron, la vigilancia o un botón alternativo no pueden volver a comprarlo
+	assert store.claim_purchase(key, 3600) == 'success'
@@ -0,0 +1,89 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def run(coro):
+	return asyncio.run(coro)
+
+
+def test_concurrent_calls_share_one_execution():
+
+	async def scenario():
+		flight = SingleFlight()
+		calls = []
+		release = asyncio.Event()
+
+		async def work():
+			calls.append(1)
+			await release.wait()
+			return 'ok'
+
+		first = asyncio.ensure_future(flight.do('k', work))
+		await asyncio.sleep(0)
+		assert 'k' in flight
+		second = asyncio.ensure_future(flight.do('k', work))
+		await asyncio.sleep(0)
+		release.set()
+		return await first, await second, calls, 'k' in flight
+
+	first, second, calls, running = run(scenario())
+	assert first == ('ok', False)
+	assert second == ('ok', True)
+	assert calls == [1]
+	assert not running
+
+
+def test_sequential_calls_run_again():
+
+	async def scenario():
+		flight = SingleFlight()
+		counter = iter(range(10))
+
+		async def work():
+			return next(counter)
+
+		return await flight.do('k', work), await flight.do('k', work)
+
+	assert run(scenario()) == ((0, False), (1, False))
+
+
+def test_exception_reaches_every_waiter():
+
+	async def scenario():
+		flight = SingleFlight()
+
+		async def work():
+			await asyncio.sleep(0)
+			raise ValueError('fallo')
+
+		results = await asyncio.gather(flight.do('k', work),
+		                               flight.do('k', work),
+		                               return_exceptions=True)
+		return results, 'k' in flight
+
+	results, running = run(scenario())
+	assert all(isinstance(r, ValueError) for r in results)
+	assert not running
+
+
+def test_cancelled_waiter_does_not_cancel_the_work():
+
+	async def scenario():
+		flight = SingleFlight()
+		release = asyncio.Event()
+
+		async def work():
+			await release.wait()
+			return 'ok'
+
+		first = asyncio.ensure_future(flight.do('k', work))
+		await asyncio.sleep(0)
+		second = asyncio.ensure_future(flight.do('k', work))
+		await asyncio.sleep(0)
+		first.cancel()
+		await asyncio.sleep(0)
+		release.set()
+		return await second
+
+	assert run(scenario()) == ('ok', True)
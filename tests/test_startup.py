@@ -0,0 +1,19 @@
+import statistics
+
+import pytest
+
+import bench_startup
+
+RUNS = 3
+
+
+@pytest.mark.parametrize('module', list(bench_startup.DEFAULT_BUDGETS_MS))
+def test_import_within_budget(module):
+	samples = []
+	loaded = []
+	for _ in range(RUNS):
+		ms, loaded = bench_startup.measure_import(module)
+		samples.append(ms)
+	assert not loaded, f"{module} importa dependencias pesadas: {loaded}"
+	budget = bench_startup.DEFAULT_BUDGETS_MS[module]
+	assert statistics.median(samples) <= budget
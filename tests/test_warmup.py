@@ -0,0 +1,64 @@
+import datetime
+
+from store import LocalStore
+from warmup import diff_timetables, warm_trips_cache, warmup_targets
+
+MONDAY = datetime.date(2026, 5, 4)
+
+
+def route_ids(trip_type):
+	return ('1', '2') if trip_type == 'ida' else ('2', '1')
+
+
+def test_diff_timetables():
+	before = [{'departure_time': '07:00', 'id': 1}, {'departure_time': '08:00', 'id': 2}]
+	after = [{'departure_time': '08:00', 'id': 3}, {'departure_time': '09:00', 'id': 4}]
+	assert diff_timetables(before, after) == [
+	    'nuevo 09:00', 'eliminado 07:00', '08:00 cambia de ID 2 -> 3'
+	]
+	assert diff_timetables(None, after) == []
+	assert diff_timetables(after, after) == []
+
+
+def test_warmup_targets_groups_times_per_route_and_day():
+	schedule = {1: {'ida': '07:00', 'vuelta': '15:00'}, 2: {'ida': None}}
+	targets = warmup_targets(schedule, route_ids, 2, MONDAY)
+	assert targets == [('1', '2', '05-05-2026', ['07:00']),
+	                   ('2', '1', '05-05-2026', ['15:00'])]
+
+
+class FakeAutomator:
+
+	def __init__(self, listings):
+		self.listings = listings
+
+	def fetch_trips(self, origin, dest, date_str):
+		return self.listings[(origin, dest)]
+
+
+def test_warm_trips_cache_reports_changes_and_errors(tmp_path):
+	store = LocalStore(str(tmp_path / 'store.db'))
+	store.put_trips('1', '2', '05-05-2026', [{'departure_time': '07:00', 'id': 1}])
+	automator = FakeAutomator({
+	    ('1', '2'): [{'departure_time': '07:30', 'id': 9}],
+	    ('2', '1'): {'error': 'server_error'},
+	})
+	schedule = {1: {'ida': '07:00', 'vuelta': '15:00'}}
+
+	summary = warm_trips_cache(automator, store, schedule, route_ids, 1, 2,
+	                           today=MONDAY)
+
+	assert summary['fetched'] == 1
+	assert summary['errors'] == 1
+	assert 'nuevo 07:30' in summary['changes'][0]
+	assert any('07:00 no existe' in change for change in summary['changes'])
+
+
+def test_local_zone_follows_dst(config):
+	import androidapi
+	config(TIMEZONE='Europe/Madrid')
+	zone = androidapi._local_zone()
+	winter = datetime.datetime(2026, 1, 15, 3, 30, tzinfo=zone)
+	summer = datetime.datetime(2026, 7, 15, 3, 30, tzinfo=zone)
+	assert winter.utcoffset() == datetime.timedelta(hours=1)
+	assert summer.utcoffset() == datetime.timedelta(hours=2)
@@ -0,0 +1,66 @@
+import pytest
+
+import watcher
+from watcher import RequestBudget, next_poll_interval
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	now = [1000.0]
+	monkeypatch.setattr(watcher.time, 'monotonic', lambda: now[0])
+	return now
+
+
+def test_budget_allows_per_minute_then_refills(clock):
+	budget = RequestBudget(6)
+	assert all(budget.try_acquire() for _ in range(6))
+	assert not budget.try_acquire()
+	assert budget.wait_time() == pytest.approx(10.0)
+
+	clock[0] += 10
+	assert budget.try_acquire()
+	assert not budget.try_acquire()
+
+
+def test_budget_never_exceeds_capacity(clock):
+	budget = RequestBudget(2)
+	clock[0] += 3600
+	assert budget.try_acquire()
+	assert budget.try_acquire()
+	assert not budget.try_acquire()
+
+
+def test_budget_has_at_least_one_token():
+	assert RequestBudget(0).try_acquire()
+
+
+@pytest.mark.parametrize('seconds, expected', [
+    (3600, 360),
+    (100_000, 600),
+    (60, 30),
+    (0, 30),
+])
+def test_poll_interval_is_bounded_fraction(seconds, expected):
+	assert next_poll_interval(seconds, 30, 600) == expected
+
+
+def test_available_trip_requires_enabled_bonus_rate(config):
+	import androidapi
+	config(BONUS_ID='19', HIFE_GOING_RATE='')
+
+	def trip(disabled):
+		return {
+		    'id': 7,
+		    'departure_time': '08:00',
+		    'tripPrices': {
+		        'going': [{
+		            'bonusTypeId': 19,
+		            'rate': '600',
+		            'disabled': disabled
+		        }]
+		    }
+		}
+
+	assert androidapi._available_trip([trip(True)], '08:00') is None
+	assert androidapi._available_trip([trip(False)], '09:00') is None
+	assert androidapi._available_trip([trip(False)], '08:00') == (7, '600')
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from workqueue import DeadlineQueue
+
+
+def run(coro):
+	return asyncio.run(coro)
+
+
+def test_earliest_deadline_runs_first():
+
+	async def scenario():
+		queue = DeadlineQueue(workers=1, max_depth=10)
+		order = []
+
+		def job(name):
+
+			async def run_job():
+				order.append(name)
+				return name
+
+			return run_job
+
+		now = time.time()
+		futures = [
+		    queue.submit(now + 300, job('tarde')),
+		    queue.submit(now + 60, job('pronto')),
+		    queue.submit(now + 120, job('medio')),
+		]
+		results = await asyncio.gather(*futures)
+		await queue.stop()
+		return order, results
+
+	order, results = run(scenario())
+	assert order == ['pronto', 'medio', 'tarde']
+	assert results == ['tarde', 'pronto', 'medio']
+
+
+def test_same_deadline_keeps_arrival_order():
+
+	async def scenario():
+		queue = DeadlineQueue(workers=1)
+		order = []
+		at = time.time() + 60
+
+		def job(n):
+
+			async def run_job():
+				order.append(n)
+
+			return run_job
+
+		await asyncio.gather(*(queue.submit(at, job(n)) for n in range(5)))
+		await queue.stop()
+		return order
+
+	assert run(scenario()) == [0, 1, 2, 3, 4]
+
+
+def test_full_queue_rejects():
+
+	async def scenario():
+		queue = DeadlineQueue(workers=1, max_depth=2)
+		release = asyncio.Event()
+
+		async def blocked():
+			await release.wait()
+
+		at = time.time() + 60
+		queue.submit(at, blocked)
+		await asyncio.sleep(0)
+		# El worker ya ha sacado el primero: caben otros dos en espera
+		queue.submit(at, blocked)
+		queue.submit(at, blocked)
+		depth = queue.depth
+		with pytest.raises(asyncio.QueueFull):
+			queue.submit(at, blocked)
+		release.set()
+		await queue.stop()
+		return depth
+
+	assert run(scenario()) == 3
+
+
+def test_expired_job_runs_fallback():
+
+	async def scenario():
+		queue = DeadlineQueue(workers=1)
+		calls = []
+
+		async def purchase():
+			calls.append('run')
+			return 'run'
+
+		async def expired():
+			calls.append('expired')
+			return 'expired'
+
+		result = await queue.submit(time.time() - 1, purchase, expired)
+		without_fallback = await queue.submit(time.time() - 1, purchase)
+		await queue.stop()
+		return result, without_fallback, calls
+
+	assert run(scenario()) == ('expired', None, ['expired'])
+
+
+def test_error_reaches_future_and_worker_survives():
+
+	async def scenario():
+		queue = DeadlineQueue(workers=1)
+		at = time.time() + 60
+
+		async def fail():
+			raise RuntimeError('fallo')
+
+		async def ok():
+			return 'ok'
+
+		failed = queue.submit(at, fail)
+		after = queue.submit(at + 1, ok)
+		with pytest.raises(RuntimeError):
+			await failed
+		result = await after
+		await queue.stop()
+		return result, queue.depth
+
+	assert run(scenario()) == ('ok', 0)
@@ -0,0 +1,283 @@
+"""
+Trazas de cada compra, del botón de Telegram al billete.
+
+Implementación mínima con el modelo de OpenTelemetry (traza, spans anidados,
+atributos, estado) sin dependencias nuevas. Los spans terminados se exportan
+desde un hilo en segundo plano a un archivo JSON Lines (TRACING=file) o a un
+colector OTLP/HTTP en formato JSON (TRACING=otlp). Con TRACING vacío `span()`
+no crea nada.
+
+El span activo viaja en un contextvar; para las funciones que se ejecutan en
+otro hilo (executor) hay que pasarlas por `bind()`. Igual que el perfilado, el
+modo se lee al arrancar: desactivado, `traced()` devuelve la función original.
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from requests.adapters import BaseAdapter
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'hife-bot'
+
+# Spans por lote y segundos máximos entre exportaciones
+EXPORT_BATCH = 64
+EXPORT_INTERVAL = 2.0
+MAX_PENDING = 2048
+
+_current = contextvars.ContextVar('hife_span', default=None)
+
+
+class Span:
+	__slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start_ns',
+	             'end_ns', 'attributes', 'status', 'status_message')
+
+	def __init__(self, name: str, parent: 'Span' = None, attributes=None):
+		self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+		self.span_id = os.urandom(8).hex()
+		self.parent_id = parent.span_id if parent else None
+		self.name = name
+		self.start_ns = time.time_ns()
+		self.end_ns = None
+		self.attributes = dict(attributes or {})
+		self.status = 'UNSET'
+		self.status_message = ''
+
+	def set_attribute(self, key: str, value):
+		if value is not None:
+			self.attributes[key] = value
+
+	def set_error(self, message: str):
+		self.status = 'ERROR'
+		self.status_message = message
+
+	def end(self):
+		if self.end_ns is None:
+			self.end_ns = time.time_ns()
+			_exporter().export(self)
+
+	def to_otlp(self) -> dict:
+		span = {
+		    'traceId': self.trace_id,
+		    'spanId': self.span_id,
+		    'name': self.name,
+		    'kind': 1,
+		    'startTimeUnixNano': str(self.start_ns),
+		    'endTimeUnixNano': str(self.end_ns),
+		    'attributes': [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+		    'status': {
+		        'code': {'UNSET': 0, 'OK': 1, 'ERROR': 2}[self.status],
+		        'message': self.status_message
+		    },
+		}
+		if self.parent_id:
+			span['parentSpanId'] = self.parent_id
+		return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+	if isinstance(value, bool):
+		return {'key': key, 'value': {'boolValue': value}}
+	if isinstance(value, int):
+		return {'key': key, 'value': {'intValue': str(value)}}
+	if isinstance(value, float):
+		return {'key': key, 'value': {'doubleValue': value}}
+	return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def current_span() -> Optional[Span]:
+	return _current.get()
+
+
+@contextlib.contextmanager
+def span(name: str, parent: Span = None, **attributes):
+	"""Span hijo del activo (o de `parent`); las excepciones lo marcan como error"""
+	if not Config.TRACING:
+		yield None
+		return
+	current = Span(name, parent or _current.get(), attributes)
+	token = _current.set(current)
+	try:
+		yield current
+	except BaseException as e:
+		current.set_error(f"{type(e).__name__}: {e}")
+		raise
+	finally:
+		_current.reset(token)
+		current.end()
+
+
+def traced(name: str):
+	"""Envuelve la función decorada en un span `name` si TRACING está activo"""
+
+	def decorator(func):
+		if not Config.TRACING:
+			return func
+
+		if inspect.iscoroutinefunction(func):
+
+			@functools.wraps(func)
+			async def async_wrapper(*args, **kwargs):
+				with span(name):
+					return await func(*args, **kwargs)
+
+			return async_wrapper
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with span(name):
+				return func(*args, **kwargs)
+
+		return wrapper
+
+	return decorator
+
+
+def set_attribute(key: str, value):
+	"""Añade un atributo al span activo, si lo hay"""
+	current = _current.get()
+	if current is not None:
+		current.set_attribute(key, value)
+
+
+def set_error(message: str):
+	"""Marca como error el span activo (para errores que se capturan y no se propagan)"""
+	current = _current.get()
+	if current is not None:
+		current.set_error(message)
+
+
+def bind(func):
+	"""`func` ejecutándose en el contexto (span activo) actual, para otro hilo"""
+	if not Config.TRACING:
+		return func
+	context = contextvars.copy_context()
+	return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def route_template(path: str) -> str:
+	"""/route/1/2/01-01-2030/trips -> /route/{id}/{id}/{id}/trips (nombres de span estables)"""
+	return re.sub(r'/[^/]*\d[^/]*', '/{id}', path)
+
+
+class TracingAdapter(BaseAdapter):
+	"""Adaptador de transporte: un span por petición HTTP con método, ruta y código de estado"""
+
+	def __init__(self, inner: BaseAdapter):
+		super().__init__()
+		self.inner = inner
+
+	def send(self, request, **kwargs):
+		path = route_template(urlsplit(request.url).path)
+		with span(f"HIFE {request.method} {path}",
+		          **{
+		              'http.method': request.method,
+		              'http.route': path
+		          }) as current:
+			response = self.inner.send(request, **kwargs)
+			if current is not None:
+				current.set_attribute('http.status_code', response.status_code)
+				if response.status_code >= 400:
+					current.set_error(f"HTTP {response.status_code}")
+			return response
+
+	def close(self):
+		self.inner.close()
+
+
+class _Exporter:
+	"""Exporta los spans terminados por lotes desde un hilo propio"""
+
+	def __init__(self):
+		self.queue = queue.Queue(maxsize=MAX_PENDING)
+		self.thread = threading.Thread(target=self._run,
+		                               name='trace-exporter',
+		                               daemon=True)
+		self.thread.start()
+
+	def export(self, finished: Span):
+		try:
+			self.queue.put_nowait(finished)
+		except queue.Full:
+			# Nunca frenar una compra por las trazas
+			pass
+
+	def _run(self):
+		while True:
+			batch = [self.queue.get()]
+			deadline = time.monotonic() + EXPORT_INTERVAL
+			while len(batch) < EXPORT_BATCH:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					break
+				try:
+					batch.append(self.queue.get(timeout=remaining))
+				except queue.Empty:
+					break
+			try:
+				self._write(batch)
+			except Exception as e:
+				logger.warning(f"No se pudieron exportar {len(batch)} spans: {e}")
+
+	def _write(self, batch: list):
+		spans = [s.to_otlp() for s in batch]
+		if Config.TRACING == 'otlp':
+			import requests
+			payload = {
+			    'resourceSpans': [{
+			        'resource': {
+			            'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]
+			        },
+			        'scopeSpans': [{
+			            'scope': {
+			                'name': SERVICE_NAME
+			            },
+			            'spans': spans
+			        }]
+			    }]
+			}
+			requests.post(f"{Config.OTLP_ENDPOINT.rstrip('/')}/v1/traces",
+			              json=payload,
+			              timeout=10).raise_for_status()
+		else:
+			with open(Config.TRACE_FILE, 'a', encoding='utf-8') as f:
+				for item in spans:
+					f.write(json.dumps(item, ensure_ascii=False, separators=(',', ':')))
+					f.write('\n')
+
+
+_exporter_instance = None
+_exporter_lock = threading.Lock()
+
+
+def _exporter() -> _Exporter:
+	global _exporter_instance
+	if _exporter_instance is None:
+		with _exporter_lock:
+			if _exporter_instance is None:
+				_exporter_instance = _Exporter()
+	return _exporter_instance
+
+
+def flush(timeout: float = 5.0):
+	"""Espera (como mucho `timeout` s) a que se exporten los spans pendientes"""
+	if _exporter_instance is None:
+		return
+	deadline = time.monotonic() + timeout
+	while not _exporter_instance.queue.empty() and time.monotonic() < deadline:
+		time.sleep(0.05)
+	# El último lote puede seguir escribiéndose
+	time.sleep(min(EXPORT_INTERVAL, max(0.0, deadline - time.monotonic())))
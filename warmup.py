@@ -0,0 +1,103 @@
+"""
+Precalentado nocturno de la caché de viajes.
+
+Descarga los listados de viajes de todas las rutas configuradas para los
+próximos días con paralelismo acotado y los guarda en el almacén local, de
+forma que las búsquedas, prefetches y alternativas del día siguiente se
+resuelven sin tocar la API en hora punta. Registra los cambios de horario que
+detecta respecto al listado anterior.
+"""
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Los listados más antiguos que esto se eliminan del almacén en cada pasada
+PURGE_AFTER_DAYS = 7
+
+
+def diff_timetables(previous: list, current: list) -> list:
+	"""Cambios entre dos listados de viajes: horas nuevas, eliminadas o con otro ID"""
+	if previous is None:
+		return []
+	before = {t.get('departure_time'): t.get('id') for t in previous}
+	after = {t.get('departure_time'): t.get('id') for t in current}
+	changes = []
+	for departure in sorted(set(after) - set(before)):
+		changes.append(f"nuevo {departure}")
+	for departure in sorted(set(before) - set(after)):
+		changes.append(f"eliminado {departure}")
+	for departure in sorted(set(before) & set(after)):
+		if before[departure] != after[departure]:
+			changes.append(
+			    f"{departure} cambia de ID {before[departure]} -> {after[departure]}")
+	return changes
+
+
+def warmup_targets(schedule: dict, route_ids, days: int, today: datetime.date):
+	"""(origen, destino, fecha DD-MM-YYYY, [horas configuradas]) para los próximos `days` días"""
+	targets = {}
+	for offset in range(1, days + 1):
+		day = today + datetime.timedelta(days=offset)
+		times = schedule.get(day.weekday())
+		if not times:
+			continue
+		for trip_type, time_value in times.items():
+			if not time_value:
+				continue
+			origin, dest = route_ids(trip_type)
+			key = (str(origin), str(dest), day.strftime("%d-%m-%Y"))
+			targets.setdefault(key, []).append(time_value)
+	return [(origin, dest, date_str, times)
+	        for (origin, dest, date_str), times in targets.items()]
+
+
+def warm_trips_cache(automator,
+                     store,
+                     schedule: dict,
+                     route_ids,
+                     days: int,
+                     max_workers: int,
+                     today: datetime.date = None) -> dict:
+	"""Descarga y guarda los listados de los próximos días. Devuelve un resumen"""
+	today = today or datetime.date.today()
+	targets = warmup_targets(schedule, route_ids, days, today)
+	summary = {'fetched': 0, 'errors': 0, 'changes': []}
+	if not targets:
+		return summary
+
+	def warm(target):
+		origin, dest, date_str, times = target
+		previous = store.get_trips(origin, dest, date_str)
+		trips = automator.fetch_trips(origin, dest, date_str)
+		return target, previous, trips
+
+	with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+		for target, previous, trips in pool.map(warm, targets):
+			origin, dest, date_str, times = target
+			if isinstance(trips, dict):
+				summary['errors'] += 1
+				logger.warning(
+				    f"Precalentado fallido {origin}->{dest} {date_str}: {trips.get('error')}"
+				)
+				continue
+
+			summary['fetched'] += 1
+			for change in diff_timetables(previous, trips):
+				message = f"Cambio de horario {origin}->{dest} {date_str}: {change}"
+				summary['changes'].append(message)
+				logger.warning(message)
+
+			departures = {t.get('departure_time') for t in trips}
+			for time_value in times:
+				if time_value not in departures:
+					message = (f"El horario configurado {time_value} no existe "
+					           f"{origin}->{dest} {date_str}")
+					summary['changes'].append(message)
+					logger.warning(message)
+
+	store.purge_trips_before(
+	    (datetime.datetime.now() -
+	     datetime.timedelta(days=PURGE_AFTER_DAYS)).timestamp())
+	return summary
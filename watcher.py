@@ -0,0 +1,52 @@
+"""
+Vigilancia de disponibilidad para viajes no encontrados o llenos.
+
+Las vigilancias sondean el endpoint de viajes de la ruta con un intervalo que
+se estrecha a medida que se acerca la salida. Todas comparten un único
+presupuesto de peticiones para no castigar la API de HIFE aunque haya varias
+activas a la vez.
+"""
+import threading
+import time
+
+# Fracción del tiempo restante hasta la salida usada como intervalo de sondeo
+POLL_FRACTION = 0.1
+
+
+class RequestBudget:
+	"""Cubo de tokens compartido: como máximo `per_minute` peticiones por minuto"""
+
+	def __init__(self, per_minute: int):
+		self.capacity = max(1, per_minute)
+		self.rate = self.capacity / 60.0
+		self.tokens = float(self.capacity)
+		self.updated = time.monotonic()
+		self.lock = threading.Lock()
+
+	def _refill(self):
+		now = time.monotonic()
+		self.tokens = min(self.capacity,
+		                  self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	def try_acquire(self) -> bool:
+		"""Consume un token si hay alguno disponible"""
+		with self.lock:
+			self._refill()
+			if self.tokens >= 1:
+				self.tokens -= 1
+				return True
+			return False
+
+	def wait_time(self) -> float:
+		"""Segundos hasta que haya un token disponible"""
+		with self.lock:
+			self._refill()
+			return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def next_poll_interval(seconds_to_departure: float, min_interval: float,
+                       max_interval: float) -> float:
+	"""Intervalo de sondeo: ~10% del tiempo restante, acotado a [min, max]"""
+	interval = seconds_to_departure * POLL_FRACTION
+	return max(min_interval, min(max_interval, interval))
@@ -0,0 +1,105 @@
+"""
+Cola de trabajo de compras por orden de salida (earliest deadline first).
+
+Las compras no se ejecutan en el callback que las pide: se encolan con la hora
+de salida del viaje como plazo y un número fijo de workers las atiende empezando
+por la salida más próxima. La cola tiene un tamaño máximo (si está llena se
+rechaza la compra en lugar de acumular trabajo) y las peticiones cuya salida ya
+ha pasado cuando les llega el turno se descartan sin ejecutarse.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 2
+MAX_DEPTH = 20
+
+
+class _Job:
+	__slots__ = ('deadline', 'seq', 'run', 'expired', 'future')
+
+	def __init__(self, deadline, seq, run, expired, future):
+		self.deadline = deadline
+		self.seq = seq
+		self.run = run
+		self.expired = expired
+		self.future = future
+
+	def __lt__(self, other):
+		return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class DeadlineQueue:
+	"""Cola de prioridad por plazo con workers acotados"""
+
+	def __init__(self, workers: int = WORKERS, max_depth: int = MAX_DEPTH):
+		self.workers = max(1, workers)
+		self.max_depth = max(1, max_depth)
+		self._queue = None
+		self._tasks = []
+		self._seq = itertools.count()
+		self.running = 0
+
+	@property
+	def depth(self) -> int:
+		"""Trabajos en espera más los que se están ejecutando"""
+		waiting = self._queue.qsize() if self._queue is not None else 0
+		return waiting + self.running
+
+	def submit(self,
+	           deadline: float,
+	           run: Callable[[], Awaitable],
+	           expired: Callable[[], Awaitable] = None) -> asyncio.Future:
+		"""Encola `run()` con plazo `deadline` (timestamp) y devuelve un future con su resultado.
+
+		Si el plazo ha pasado cuando le toca el turno se ejecuta `expired()` en su
+		lugar. Lanza asyncio.QueueFull si la cola está llena.
+		"""
+		loop = asyncio.get_running_loop()
+		if self._queue is None:
+			self._queue = asyncio.PriorityQueue(maxsize=self.max_depth)
+		self._tasks = [task for task in self._tasks if not task.done()]
+		while len(self._tasks) < self.workers:
+			self._tasks.append(loop.create_task(self._work()))
+
+		future = loop.create_future()
+		self._queue.put_nowait(
+		    _Job(deadline, next(self._seq), run, expired, future))
+		return future
+
+	async def stop(self):
+		for task in self._tasks:
+			task.cancel()
+		for task in self._tasks:
+			try:
+				await task
+			except asyncio.CancelledError:
+				pass
+		self._tasks = []
+
+	async def _work(self):
+		while True:
+			job = await self._queue.get()
+			self.running += 1
+			try:
+				if job.deadline <= time.time():
+					logger.warning("Compra descartada: la salida ya ha pasado")
+					result = await job.expired() if job.expired else None
+				else:
+					result = await job.run()
+			except Exception as e:
+				logger.exception("Error en un trabajo de la cola de compras")
+				if not job.future.done():
+					job.future.set_exception(e)
+					# Ya registrado: que nadie lo espere no debe generar otro aviso
+					job.future.exception()
+			else:
+				if not job.future.done():
+					job.future.set_result(result)
+			finally:
+				self.running -= 1
+				self._queue.task_done()